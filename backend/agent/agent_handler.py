@@ -3,15 +3,18 @@ from __future__ import annotations
 import re
 import time
 from dataclasses import dataclass
-from typing import Any, Callable, Optional
+from typing import Any, Callable, Iterator, Optional
 
+from asgiref.sync import sync_to_async
 from django.core.exceptions import ImproperlyConfigured
-
-from .guardrails import validate_llm_message
-from .llm_factory import build_llm_runnable
-from .observability import record_counter, record_timing
-from .prompts import build_llm_prompt
-from .retrieval import RetrievalResult, search_catalog
+from django.db import close_old_connections
+
+from .guardrails import check_partial_llm_message, validate_llm_message
+from .llm_cache import lookup_completion, store_completion
+from .llm_factory import StubLLM, build_llm_runnable
+from .observability import elapsed_ms, record_counter, record_timing
+from .prompts import build_llm_prompt, estimate_tokens
+from .retrieval import RETRIEVAL_BUDGET_MS, RetrievalResult, search_catalog, search_catalog_raced
 from .tools import (
     tool_add_to_cart,
     tool_filter_catalog,
@@ -97,30 +100,43 @@ def _extract_isbn(message: str) -> Optional[str]:
     return cleaned or None
 
 
+_FILTER_PATTERNS = {
+    "categoria": r"\bcategoria\s*[:=]\s*([^,;\n]+)",
+    "autor": r"\bautor\s*[:=]\s*([^,;\n]+)",
+    "editorial": r"\beditorial\s*[:=]\s*([^,;\n]+)",
+    "precio_min": r"\bprecio_min\s*[:=]\s*([0-9]+(?:\.[0-9]+)?)",
+    "precio_max": r"\bprecio_max\s*[:=]\s*([0-9]+(?:\.[0-9]+)?)",
+}
+_STOCK_WORDS = r"\b(?:disponible|agotado)\b"
+
+
 def _extract_filters(message: str) -> dict[str, Any]:
     filters: dict[str, Any] = {}
 
     def _capture(pattern: str) -> Optional[str]:
         m = re.search(pattern, message, re.IGNORECASE)
-        return m.group(1).strip() if m else None
+        if not m:
+            return None
+        # "categoria: Fantasia disponible" -> "Fantasia" (stock words are their own filter).
+        return re.sub(_STOCK_WORDS, "", m.group(1), flags=re.IGNORECASE).strip() or None
 
-    categoria = _capture(r"\bcategoria\s*[:=]\s*([^,;\n]+)")
+    categoria = _capture(_FILTER_PATTERNS["categoria"])
     if categoria:
         filters["categoria"] = categoria
 
-    autor = _capture(r"\bautor\s*[:=]\s*([^,;\n]+)")
+    autor = _capture(_FILTER_PATTERNS["autor"])
     if autor:
         filters["autor"] = autor
 
-    editorial = _capture(r"\beditorial\s*[:=]\s*([^,;\n]+)")
+    editorial = _capture(_FILTER_PATTERNS["editorial"])
     if editorial:
         filters["editorial"] = editorial
 
-    precio_min = _capture(r"\bprecio_min\s*[:=]\s*([0-9]+(?:\.[0-9]+)?)")
+    precio_min = _capture(_FILTER_PATTERNS["precio_min"])
     if precio_min is not None:
         filters["precio_min"] = precio_min
 
-    precio_max = _capture(r"\bprecio_max\s*[:=]\s*([0-9]+(?:\.[0-9]+)?)")
+    precio_max = _capture(_FILTER_PATTERNS["precio_max"])
     if precio_max is not None:
         filters["precio_max"] = precio_max
 
@@ -132,6 +148,16 @@ def _extract_filters(message: str) -> dict[str, Any]:
     return filters
 
 
+def _residual_query(message: str) -> str:
+    """Free text left after removing filter clauses (used to rank filtered results)."""
+
+    text = message
+    for pattern in _FILTER_PATTERNS.values():
+        text = re.sub(pattern, " ", text, flags=re.IGNORECASE)
+    text = re.sub(_STOCK_WORDS, " ", text, flags=re.IGNORECASE)
+    return re.sub(r"[\s,;]+", " ", text).strip()
+
+
 def _coerce_bullets(message: str, *, min_bullets: int = 2, max_bullets: int = 5) -> str:
     text = (message or "").strip()
     if not text:
@@ -169,42 +195,17 @@ def _coerce_bullets(message: str, *, min_bullets: int = 2, max_bullets: int = 5)
     return "\n".join(f"- {item}" for item in bullets)
 
 
-def handle_agent_message(
-    message: Optional[str],
+def _run_retrieval(
+    cleaned: str,
     *,
-    k: int = 5,
-    prefer_vector: bool = True,
-    use_llm: bool = True,
-    include_trace: bool = False,
-    retrieval_fn: Optional[Callable[..., RetrievalResult]] = None,
-    llm: Optional[Any] = None,
-    byo_api_key: Optional[str] = None,
-    request_id: Optional[str] = None,
-) -> AgentResponse:
-    """Minimal conversational handler.
-
-    Responsibilities:
-    - Validate/normalize the user message.
-    - Run retrieval (vector + fallback ORM) to produce results.
-    - Produce a stable JSON response contract for the API layer.
-
-    Notes:
-    - This function intentionally does NOT depend on DRF.
-    - LLM usage is best-effort: it only generates the `message` field.
-      The `results` list always comes from retrieval (source of truth).
-    """
-
-    cleaned = _clean_message(message)
-    if cleaned == "":
-        return AgentResponse(
-            message="Mensaje vacío. Escribe qué libro buscas.",
-            results=[],
-            actions=[],
-            trace={"degraded": True} if include_trace else None,
-            error="invalid_request",
-        )
-
-    retrieval_fn = retrieval_fn or search_catalog
+    k: int,
+    prefer_vector: bool,
+    retrieval_fn: Optional[Callable[..., RetrievalResult]],
+) -> tuple[RetrievalResult, Optional[dict[str, Any]], int]:
+    """Tool routing (lookup / filters) or plain retrieval. Returns (retrieval, tool_meta, retrieval_ms)."""
+
+    # With a retrieval budget, vector and keyword search race (see search_catalog_async).
+    retrieval_fn = retrieval_fn or (search_catalog_raced if RETRIEVAL_BUDGET_MS > 0 else search_catalog)
     retrieval: RetrievalResult
     tool_meta: Optional[dict[str, Any]] = None
 
@@ -231,19 +232,19 @@ def handle_agent_message(
     else:
         filters = _extract_filters(cleaned)
         if filters:
-            filtered = tool_filter_catalog(filters, k=k)
+            filtered = tool_filter_catalog(filters, k=k, query=_residual_query(cleaned))
+            source = (filtered.data or {}).get("source", "orm")
             retrieval = RetrievalResult(
                 query=cleaned,
                 k=k,
-                source="orm",
-                degraded=True,
+                source=source,
+                degraded=source != "vector",
                 results=(filtered.data or {}).get("results", []),
                 warnings=filtered.warnings,
             )
             tool_meta = {"name": "filter_catalog", "ok": filtered.ok, "filters": filters}
         else:
             retrieval = retrieval_fn(cleaned, k=k, prefer_vector=prefer_vector)
-    actions = _default_actions_from_results(retrieval.results)
 
     retrieval_ms = int((time.monotonic() - retrieval_started) * 1000)
     record_timing("agent.retrieval_ms", retrieval_ms)
@@ -254,88 +255,413 @@ def handle_agent_message(
     else:
         record_counter("agent.retrieval_orm")
 
-    llm_meta: dict[str, Any] = {}
-    final_message: str
-    llm_started = time.monotonic()
+    return retrieval, tool_meta, retrieval_ms
 
-    if not use_llm:
-        final_message = _build_fallback_message(
-            query=retrieval.query,
-            results_count=len(retrieval.results),
-            degraded=retrieval.degraded,
-            warnings=retrieval.warnings + ["LLM desactivado por el usuario"],
-        )
-        llm_meta = {"provider": "disabled", "error": "disabled"}
-    else:
-        try:
-            runnable = llm or build_llm_runnable(byo_api_key=byo_api_key)
-            prompt = build_llm_prompt(user_message=cleaned, retrieval=retrieval)
-            llm_resp = runnable.invoke(prompt)
-            final_message = (llm_resp or {}).get("content") or ""
-            record_counter("agent.llm_success")
-            llm_meta = {
-                "provider": (llm_resp or {}).get("provider"),
-                "model": (llm_resp or {}).get("model"),
-                "latency_ms": (llm_resp or {}).get("latency_ms"),
-                "error": (llm_resp or {}).get("error"),
-            }
-            guard = validate_llm_message(final_message)
-            if not guard.ok:
-                coerced = _coerce_bullets(final_message)
-                if coerced and validate_llm_message(coerced).ok:
-                    final_message = coerced
-                    llm_meta["coerced"] = True
-                else:
-                    raise RuntimeError(f"LLM guardrails failed: {','.join(guard.errors)}")
-        except ImproperlyConfigured as e:
-            record_counter("agent.llm_unconfigured")
-            final_message = _build_fallback_message(
-                query=retrieval.query,
-                results_count=len(retrieval.results),
-                degraded=retrieval.degraded,
-                warnings=retrieval.warnings + [str(e)],
-            )
-            llm_meta = {"error": str(e), "provider": "unconfigured"}
-        except Exception as e:
-            record_counter("agent.llm_failed")
-            final_message = _build_fallback_message(
-                query=retrieval.query,
-                results_count=len(retrieval.results),
-                degraded=retrieval.degraded,
-                warnings=retrieval.warnings + [f"LLM failed: {e}"],
-            )
-            llm_meta = {"error": str(e), "provider": "failed"}
 
+def _fallback_message(retrieval: RetrievalResult, warning: str) -> str:
+    return _build_fallback_message(
+        query=retrieval.query,
+        results_count=len(retrieval.results),
+        degraded=retrieval.degraded,
+        warnings=retrieval.warnings + [warning],
+    )
+
+
+def _apply_guardrails(content: str) -> tuple[str, bool]:
+    """Validate the final LLM text, coercing it into bullets if needed. Returns (message, coerced)."""
+
+    guard = validate_llm_message(content)
+    if guard.ok:
+        return content, False
+    coerced = _coerce_bullets(content)
+    if coerced and validate_llm_message(coerced).ok:
+        return coerced, True
+    raise RuntimeError(f"LLM guardrails failed: {','.join(guard.errors)}")
+
+
+def _build_trace(
+    *,
+    request_id: Optional[str],
+    retrieval: RetrievalResult,
+    retrieval_ms: int,
+    llm_ms: int,
+    llm_meta: dict[str, Any],
+    tool_meta: Optional[dict[str, Any]],
+) -> dict[str, Any]:
+    trace: dict[str, Any] = {
+        "request_id": request_id,
+        "query": retrieval.query,
+        "k": retrieval.k,
+        "source": retrieval.source,
+        "degraded": retrieval.degraded,
+        "warnings": retrieval.warnings,
+        "timings_ms": {
+            "retrieval": retrieval_ms,
+            "llm": llm_ms,
+        },
+        "llm": llm_meta,
+    }
+    if tool_meta is not None:
+        trace["tool"] = tool_meta
+    if getattr(retrieval, "race", None):
+        trace["retrieval_race"] = retrieval.race
+    return trace
+
+
+def _invalid_request(include_trace: bool) -> AgentResponse:
+    return AgentResponse(
+        message="Mensaje vacío. Escribe qué libro buscas.",
+        results=[],
+        actions=[],
+        trace={"degraded": True} if include_trace else None,
+        error="invalid_request",
+    )
+
+
+def _build_prompt(cleaned: str, retrieval: RetrievalResult) -> tuple[str, int]:
+    """Prompt plus its estimated token count (summed in `agent.llm_prompt_tokens_est`)."""
+
+    prompt = build_llm_prompt(user_message=cleaned, retrieval=retrieval)
+    prompt_tokens = estimate_tokens(prompt)
+    record_counter("agent.llm_prompts")
+    record_counter("agent.llm_prompt_tokens_est", prompt_tokens)
+    return prompt, prompt_tokens
+
+
+def _completion_from_response(llm_resp: Optional[dict[str, Any]], cache_key: Optional[str]) -> tuple[str, dict[str, Any]]:
+    """Guardrails + cache store for a fresh LLM response. Returns (message, llm_meta)."""
+
+    record_counter("agent.llm_success")
+    llm_meta = {
+        "provider": (llm_resp or {}).get("provider"),
+        "model": (llm_resp or {}).get("model"),
+        "latency_ms": (llm_resp or {}).get("latency_ms"),
+        "error": (llm_resp or {}).get("error"),
+    }
+    # Provider-reported usage, when the endpoint returns it (compare with prompt_tokens_est).
+    if (llm_resp or {}).get("prompt_tokens") is not None:
+        record_counter("agent.llm_usage_reported")
+        for field in ("prompt_tokens", "completion_tokens"):
+            if llm_resp.get(field) is not None:
+                llm_meta[field] = llm_resp[field]
+                record_counter(f"agent.llm_{field}", int(llm_resp[field]))
+    final_message, coerced = _apply_guardrails((llm_resp or {}).get("content") or "")
+    store_completion(cache_key, final_message, coerced=coerced)
+    if coerced:
+        llm_meta["coerced"] = True
+    return final_message, llm_meta
+
+
+def _completion_from_cache(runnable: Any, cached: dict[str, Any]) -> tuple[str, dict[str, Any]]:
+    llm_meta = {**_llm_identity(runnable), "latency_ms": 0, "error": None}
+    if cached.get("coerced"):
+        llm_meta["coerced"] = True
+    return cached["message"], llm_meta
+
+
+def _llm_failure(error: Exception, retrieval: RetrievalResult) -> tuple[str, dict[str, Any]]:
+    if isinstance(error, ImproperlyConfigured):
+        record_counter("agent.llm_unconfigured")
+        return _fallback_message(retrieval, str(error)), {"error": str(error), "provider": "unconfigured"}
+    record_counter("agent.llm_failed")
+    return _fallback_message(retrieval, f"LLM failed: {error}"), {"error": str(error), "provider": "failed"}
+
+
+def _finish_response(
+    *,
+    retrieval: RetrievalResult,
+    tool_meta: Optional[dict[str, Any]],
+    retrieval_ms: int,
+    llm_started: float,
+    final_message: str,
+    llm_meta: dict[str, Any],
+    include_trace: bool,
+    request_id: Optional[str],
+) -> AgentResponse:
     llm_ms = int((time.monotonic() - llm_started) * 1000)
     record_timing("agent.llm_total_ms", llm_ms)
 
     trace: Optional[dict[str, Any]] = None
     if include_trace:
-        trace = {
-            "request_id": request_id,
-            "query": retrieval.query,
-            "k": retrieval.k,
-            "source": retrieval.source,
-            "degraded": retrieval.degraded,
-            "warnings": retrieval.warnings,
-            "timings_ms": {
-                "retrieval": retrieval_ms,
-                "llm": llm_ms,
-            },
-            "llm": llm_meta,
-        }
-        if tool_meta is not None:
-            trace["tool"] = tool_meta
+        trace = _build_trace(
+            request_id=request_id,
+            retrieval=retrieval,
+            retrieval_ms=retrieval_ms,
+            llm_ms=llm_ms,
+            llm_meta=llm_meta,
+            tool_meta=tool_meta,
+        )
 
     return AgentResponse(
         message=final_message,
         results=retrieval.results,
-        actions=actions,
+        actions=_default_actions_from_results(retrieval.results),
         trace=trace,
         error=None,
     )
 
 
+def handle_agent_message(
+    message: Optional[str],
+    *,
+    k: int = 5,
+    prefer_vector: bool = True,
+    use_llm: bool = True,
+    include_trace: bool = False,
+    retrieval_fn: Optional[Callable[..., RetrievalResult]] = None,
+    llm: Optional[Any] = None,
+    byo_api_key: Optional[str] = None,
+    request_id: Optional[str] = None,
+) -> AgentResponse:
+    """Minimal conversational handler.
+
+    Responsibilities:
+    - Validate/normalize the user message.
+    - Run retrieval (vector + fallback ORM) to produce results.
+    - Produce a stable JSON response contract for the API layer.
+
+    Notes:
+    - This function intentionally does NOT depend on DRF.
+    - LLM usage is best-effort: it only generates the `message` field.
+      The `results` list always comes from retrieval (source of truth).
+    """
+
+    cleaned = _clean_message(message)
+    if cleaned == "":
+        return _invalid_request(include_trace)
+
+    retrieval, tool_meta, retrieval_ms = _run_retrieval(
+        cleaned, k=k, prefer_vector=prefer_vector, retrieval_fn=retrieval_fn
+    )
+
+    llm_meta: dict[str, Any]
+    final_message: str
+    llm_started = time.monotonic()
+
+    if not use_llm:
+        final_message = _fallback_message(retrieval, "LLM desactivado por el usuario")
+        llm_meta = {"provider": "disabled", "error": "disabled"}
+    else:
+        try:
+            runnable = llm or build_llm_runnable(byo_api_key=byo_api_key)
+            prompt, prompt_tokens = _build_prompt(cleaned, retrieval)
+            cache_key, cached, cache_status = lookup_completion(runnable, prompt, byo_api_key=byo_api_key)
+            if cached is not None:
+                final_message, llm_meta = _completion_from_cache(runnable, cached)
+            else:
+                final_message, llm_meta = _completion_from_response(runnable.invoke(prompt), cache_key)
+            llm_meta["prompt_tokens_est"] = prompt_tokens
+            if cache_status is not None:
+                llm_meta["cache"] = cache_status
+        except Exception as e:
+            final_message, llm_meta = _llm_failure(e, retrieval)
+
+    return _finish_response(
+        retrieval=retrieval,
+        tool_meta=tool_meta,
+        retrieval_ms=retrieval_ms,
+        llm_started=llm_started,
+        final_message=final_message,
+        llm_meta=llm_meta,
+        include_trace=include_trace,
+        request_id=request_id,
+    )
+
+
+def _run_retrieval_in_thread(*args: Any, **kwargs: Any) -> tuple[RetrievalResult, Optional[dict[str, Any]], int]:
+    # Executor threads outlive the request: release their DB connection like a request would.
+    try:
+        return _run_retrieval(*args, **kwargs)
+    finally:
+        close_old_connections()
+
+
+async def _ainvoke(runnable: Any, prompt: str) -> Optional[dict[str, Any]]:
+    if hasattr(runnable, "ainvoke"):
+        return await runnable.ainvoke(prompt)
+    return await sync_to_async(runnable.invoke, thread_sensitive=False)(prompt)
+
+
+async def handle_agent_message_async(
+    message: Optional[str],
+    *,
+    k: int = 5,
+    prefer_vector: bool = True,
+    use_llm: bool = True,
+    include_trace: bool = False,
+    retrieval_fn: Optional[Callable[..., RetrievalResult]] = None,
+    llm: Optional[Any] = None,
+    byo_api_key: Optional[str] = None,
+    request_id: Optional[str] = None,
+) -> AgentResponse:
+    """Async variant of `handle_agent_message` (same contract) for ASGI views.
+
+    Retrieval and cache I/O run in worker threads; the LLM call awaits `ainvoke`
+    (ChatOpenAI's async client), so one event loop can hold many chats waiting on
+    the LLM instead of one thread per chat.
+    """
+
+    cleaned = _clean_message(message)
+    if cleaned == "":
+        return _invalid_request(include_trace)
+
+    retrieval, tool_meta, retrieval_ms = await sync_to_async(_run_retrieval_in_thread, thread_sensitive=False)(
+        cleaned, k=k, prefer_vector=prefer_vector, retrieval_fn=retrieval_fn
+    )
+
+    llm_meta: dict[str, Any]
+    final_message: str
+    llm_started = time.monotonic()
+
+    if not use_llm:
+        final_message = _fallback_message(retrieval, "LLM desactivado por el usuario")
+        llm_meta = {"provider": "disabled", "error": "disabled"}
+    else:
+        try:
+            runnable = llm or build_llm_runnable(byo_api_key=byo_api_key)
+            prompt, prompt_tokens = _build_prompt(cleaned, retrieval)
+            cache_key, cached, cache_status = await sync_to_async(lookup_completion, thread_sensitive=False)(
+                runnable, prompt, byo_api_key=byo_api_key
+            )
+            if cached is not None:
+                final_message, llm_meta = _completion_from_cache(runnable, cached)
+            else:
+                llm_resp = await _ainvoke(runnable, prompt)
+                final_message, llm_meta = await sync_to_async(_completion_from_response, thread_sensitive=False)(
+                    llm_resp, cache_key
+                )
+            llm_meta["prompt_tokens_est"] = prompt_tokens
+            if cache_status is not None:
+                llm_meta["cache"] = cache_status
+        except Exception as e:
+            final_message, llm_meta = _llm_failure(e, retrieval)
+
+    return _finish_response(
+        retrieval=retrieval,
+        tool_meta=tool_meta,
+        retrieval_ms=retrieval_ms,
+        llm_started=llm_started,
+        final_message=final_message,
+        llm_meta=llm_meta,
+        include_trace=include_trace,
+        request_id=request_id,
+    )
+
+
+def _llm_chunks(runnable: Any, prompt: str) -> Iterator[str]:
+    # Runnables without `stream()` (custom test doubles) produce one chunk.
+    if hasattr(runnable, "stream"):
+        yield from runnable.stream(prompt)
+    else:
+        yield (runnable.invoke(prompt) or {}).get("content") or ""
+
+
+def _llm_identity(runnable: Any) -> dict[str, Any]:
+    if isinstance(runnable, StubLLM):
+        return {"provider": "stub", "model": "stub"}
+    config = getattr(runnable, "config", None)
+    return {"provider": getattr(config, "provider", None), "model": getattr(config, "model", None)}
+
+
+def stream_agent_message(
+    message: Optional[str],
+    *,
+    k: int = 5,
+    prefer_vector: bool = True,
+    use_llm: bool = True,
+    include_trace: bool = False,
+    retrieval_fn: Optional[Callable[..., RetrievalResult]] = None,
+    llm: Optional[Any] = None,
+    byo_api_key: Optional[str] = None,
+    request_id: Optional[str] = None,
+) -> Iterator[tuple[str, dict[str, Any]]]:
+    """Streaming variant of `handle_agent_message`; yields `(event, data)` pairs.
+
+    results  `{"results", "actions", "source", "degraded"}` as soon as retrieval is done.
+    token    `{"text"}` per LLM chunk. Streaming stops early once the partial text
+             breaks a guardrail that coercion cannot fix (JSON, code block, too long).
+    done     the `handle_agent_message` payload. Its `message` is final (coerced or
+             fallback); `replaced` tells the client it differs from the streamed text.
+
+    An empty message yields a single `done` event carrying `error`.
+    """
+
+    cleaned = _clean_message(message)
+    if cleaned == "":
+        yield "done", {**_invalid_request(include_trace).to_dict(), "replaced": True}
+        return
+
+    retrieval, tool_meta, retrieval_ms = _run_retrieval(
+        cleaned, k=k, prefer_vector=prefer_vector, retrieval_fn=retrieval_fn
+    )
+    actions = _default_actions_from_results(retrieval.results)
+    yield "results", {
+        "results": retrieval.results,
+        "actions": actions,
+        "source": retrieval.source,
+        "degraded": retrieval.degraded,
+    }
+
+    llm_meta: dict[str, Any] = {}
+    streamed: list[str] = []
+    final_message: str
+    llm_started = time.monotonic()
+
+    if not use_llm:
+        final_message = _fallback_message(retrieval, "LLM desactivado por el usuario")
+        llm_meta = {"provider": "disabled", "error": "disabled"}
+    else:
+        try:
+            runnable = llm or build_llm_runnable(byo_api_key=byo_api_key)
+            prompt, prompt_tokens = _build_prompt(cleaned, retrieval)
+            llm_meta = {**_llm_identity(runnable), "error": None, "streamed": True, "prompt_tokens_est": prompt_tokens}
+            cache_key, cached, cache_status = lookup_completion(runnable, prompt, byo_api_key=byo_api_key)
+            if cache_status is not None:
+                llm_meta["cache"] = cache_status
+            # A hit replays the stored (already validated) message as a single chunk.
+            chunks = iter([cached["message"]]) if cached is not None else _llm_chunks(runnable, prompt)
+            try:
+                for chunk in chunks:
+                    if not chunk:
+                        continue
+                    if not streamed:
+                        llm_meta["first_token_ms"] = elapsed_ms(llm_started)
+                        record_timing("agent.llm_first_token_ms", llm_meta["first_token_ms"])
+                    streamed.append(chunk)
+                    if not check_partial_llm_message("".join(streamed)).ok:
+                        # The final check below decides; no point paying for more tokens.
+                        llm_meta["truncated"] = True
+                        break
+                    yield "token", {"text": chunk}
+            finally:
+                close = getattr(chunks, "close", None)
+                if close is not None:
+                    close()
+            llm_meta["latency_ms"] = elapsed_ms(llm_started)
+            if cached is not None:
+                final_message, coerced = cached["message"], bool(cached.get("coerced"))
+            else:
+                final_message, coerced = _apply_guardrails("".join(streamed))
+                record_counter("agent.llm_success")
+                store_completion(cache_key, final_message, coerced=coerced)
+            if coerced:
+                llm_meta["coerced"] = True
+        except Exception as e:
+            final_message, llm_meta = _llm_failure(e, retrieval)
+
+    response = _finish_response(
+        retrieval=retrieval,
+        tool_meta=tool_meta,
+        retrieval_ms=retrieval_ms,
+        llm_started=llm_started,
+        final_message=final_message,
+        llm_meta=llm_meta,
+        include_trace=include_trace,
+        request_id=request_id,
+    )
+    yield "done", {**response.to_dict(), "replaced": final_message != "".join(streamed)}
+
+
 def _parse_int(value: Any, *, default: int) -> int:
     try:
         return int(value)
@@ -423,4 +749,10 @@ def handle_agent_action(
     )
 
 
-__all__ = ["AgentResponse", "handle_agent_message", "handle_agent_action"]
+__all__ = [
+    "AgentResponse",
+    "handle_agent_action",
+    "handle_agent_message",
+    "handle_agent_message_async",
+    "stream_agent_message",
+]
@@ -0,0 +1,58 @@
+"""Small helpers shared by the agent benchmark scripts (no Django required)."""
+from __future__ import annotations
+
+import math
+import time
+from typing import Any, Callable, Iterable
+
+
+def percentile(values: Iterable[float], pct: float) -> float:
+    """Nearest-rank percentile (pct in 0..100). Returns 0.0 for empty input."""
+
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100.0 * len(ordered)))
+    return float(ordered[min(rank, len(ordered)) - 1])
+
+
+def summarize_latencies(samples_ms: list[float]) -> dict[str, Any]:
+    total_ms = sum(samples_ms)
+    return {
+        "count": len(samples_ms),
+        "mean_ms": round(total_ms / len(samples_ms), 3) if samples_ms else 0.0,
+        "p50_ms": round(percentile(samples_ms, 50), 3),
+        "p95_ms": round(percentile(samples_ms, 95), 3),
+        "p99_ms": round(percentile(samples_ms, 99), 3),
+        "max_ms": round(max(samples_ms), 3) if samples_ms else 0.0,
+        "qps": round(len(samples_ms) / (total_ms / 1000.0), 2) if total_ms > 0 else 0.0,
+    }
+
+
+def time_calls(fn: Callable[[Any], Any], inputs: Iterable[Any]) -> tuple[list[float], list[Any]]:
+    """Call `fn` once per input; return (latencies in ms, outputs)."""
+
+    latencies: list[float] = []
+    outputs: list[Any] = []
+    for item in inputs:
+        started = time.perf_counter()
+        outputs.append(fn(item))
+        latencies.append((time.perf_counter() - started) * 1000.0)
+    return latencies, outputs
+
+
+def recall_at_k(expected: list[list[Any]], got: list[list[Any]], k: int) -> float:
+    """Mean fraction of `expected[i][:k]` present in `got[i][:k]`."""
+
+    if not expected:
+        return 0.0
+    total = 0.0
+    for truth, found in zip(expected, got):
+        truth_k = set(truth[:k])
+        if not truth_k:
+            continue
+        total += len(truth_k & set(found[:k])) / len(truth_k)
+    return round(total / len(expected), 4)
+
+
+__all__ = ["percentile", "summarize_latencies", "time_calls", "recall_at_k"]
@@ -0,0 +1,96 @@
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional
+
+_MISSING = object()
+
+
+class LRUCache:
+    """Bounded, thread-safe LRU cache (process-local) with optional TTL.
+
+    `max_size <= 0` disables the cache: `get` always misses and `set` is a no-op.
+    With `sliding=True` the TTL counts from the last `get` hit (idle expiry) and
+    `set` also drops expired entries from the cold end. `on_evict(value)` is called
+    (outside the lock) for every value that leaves the cache: evicted, expired,
+    replaced by `set` or dropped by `clear`.
+    """
+
+    def __init__(
+        self,
+        max_size: int,
+        *,
+        ttl_sec: Optional[float] = None,
+        sliding: bool = False,
+        on_evict: Optional[Callable[[Any], None]] = None,
+    ) -> None:
+        self.max_size = max_size
+        self.ttl_sec = ttl_sec if ttl_sec and ttl_sec > 0 else None
+        self.sliding = sliding
+        self.on_evict = on_evict
+        self._lock = threading.Lock()
+        self._data: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_size > 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        if not self.enabled:
+            return default
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is _MISSING:
+                return default
+            stored_at, value = entry
+            if self.ttl_sec is None or time.monotonic() - stored_at <= self.ttl_sec:
+                if self.sliding:
+                    self._data[key] = (time.monotonic(), value)
+                self._data.move_to_end(key)
+                return value
+            del self._data[key]
+        self._evicted([value])
+        return default
+
+    def set(self, key: Hashable, value: Any) -> None:
+        if not self.enabled:
+            return
+        evicted: list[Any] = []
+        with self._lock:
+            now = time.monotonic()
+            previous = self._data.get(key, _MISSING)
+            if previous is not _MISSING and previous[1] is not value:
+                evicted.append(previous[1])
+            self._data[key] = (now, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                evicted.append(self._data.popitem(last=False)[1][1])
+            if self.sliding and self.ttl_sec is not None:
+                # Least recently used first, so expired entries are all at the front.
+                while self._data:
+                    stored_at, _ = next(iter(self._data.values()))
+                    if now - stored_at <= self.ttl_sec:
+                        break
+                    evicted.append(self._data.popitem(last=False)[1][1])
+        self._evicted(evicted)
+
+    def clear(self) -> None:
+        with self._lock:
+            evicted = [value for _, value in self._data.values()]
+            self._data.clear()
+        self._evicted(evicted)
+
+    def _evicted(self, values: list[Any]) -> None:
+        if self.on_evict is None:
+            return
+        for value in values:
+            self.on_evict(value)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._data)
+
+
+__all__ = ["LRUCache"]
@@ -0,0 +1,154 @@
+"""Process-local circuit breaker for optional dependencies (the vector store).
+
+closed     calls go through; N consecutive failures (errors or calls slower than the
+           latency budget) open the circuit.
+open       calls are rejected with `CircuitOpenError` without touching the dependency,
+           so callers go straight to their fallback.
+half_open  after the cool-down one probe call is let through: success closes the
+           circuit, failure re-opens it for another cool-down.
+
+Transitions and rejections are counted in `METRICS` (`agent.circuit.<name>.*`); the
+current state is available from `snapshot()`.
+"""
+from __future__ import annotations
+
+import threading
+import time
+from typing import Any, Callable, Optional, TypeVar
+
+from .observability import elapsed_ms, log_event, record_counter
+from .vector_store import VectorStoreUnavailable
+
+T = TypeVar("T")
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(VectorStoreUnavailable):
+    """Raised instead of calling the dependency while the circuit is open."""
+
+
+class CircuitBreaker:
+    def __init__(
+        self,
+        name: str,
+        *,
+        failure_threshold: int = 5,
+        cooldown_sec: float = 30.0,
+        latency_budget_ms: int = 0,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.name = name
+        # failure_threshold <= 0 disables the breaker (every call goes through).
+        self.failure_threshold = failure_threshold
+        self.cooldown_sec = cooldown_sec
+        self.latency_budget_ms = latency_budget_ms
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._probe_in_flight = False
+        self._last_error: Optional[str] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.failure_threshold > 0
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state
+
+    def _transition(self, state: str, reason: str) -> None:
+        # Caller holds the lock.
+        previous, self._state = self._state, state
+        self._opened_at = self._clock() if state == OPEN else None
+        record_counter(f"agent.circuit.{self.name}.{state}")
+        log_event("agent.circuit_transition", circuit=self.name, previous=previous, state=state, reason=reason)
+
+    def allow(self) -> bool:
+        """True if a call may proceed now (claims the probe slot when half-open)."""
+
+        if not self.enabled:
+            return True
+        with self._lock:
+            if self._state == OPEN and self._clock() - (self._opened_at or 0.0) >= self.cooldown_sec:
+                self._transition(HALF_OPEN, "cooldown_elapsed")
+            if self._state == CLOSED:
+                return True
+            if self._state == HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+        record_counter(f"agent.circuit.{self.name}.rejected")
+        return False
+
+    def record_success(self, duration_ms: Optional[int] = None) -> None:
+        if self.latency_budget_ms > 0 and duration_ms is not None and duration_ms > self.latency_budget_ms:
+            self.record_failure(f"slow call: {duration_ms} ms > {self.latency_budget_ms} ms")
+            return
+        with self._lock:
+            self._failures = 0
+            self._probe_in_flight = False
+            if self._state != CLOSED:
+                self._transition(CLOSED, "probe_succeeded")
+
+    def record_failure(self, error: str) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            self._failures += 1
+            self._last_error = error
+            probe = self._state == HALF_OPEN
+            self._probe_in_flight = False
+            record_counter(f"agent.circuit.{self.name}.failure")
+            if probe:
+                self._transition(OPEN, "probe_failed")
+            elif self._state == CLOSED and self._failures >= self.failure_threshold:
+                self._transition(OPEN, f"{self._failures} consecutive failures")
+
+    def call(self, fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        """Run `fn` through the breaker; raises `CircuitOpenError` while open."""
+
+        if not self.allow():
+            raise CircuitOpenError(f"Vector search circuit open ({self._last_error}); using keyword search.")
+        started = time.monotonic()
+        try:
+            result = fn(*args, **kwargs)
+        except Exception as e:
+            self.record_failure(str(e))
+            raise
+        # A slow success is still returned; it only counts towards opening the circuit.
+        self.record_success(elapsed_ms(started))
+        return result
+
+    def snapshot(self) -> dict[str, Any]:
+        with self._lock:
+            retry_in = None
+            if self._state == OPEN and self._opened_at is not None:
+                retry_in = max(0.0, round(self.cooldown_sec - (self._clock() - self._opened_at), 3))
+            return {
+                "enabled": self.enabled,
+                "state": self._state,
+                "consecutive_failures": self._failures,
+                "failure_threshold": self.failure_threshold,
+                "cooldown_sec": self.cooldown_sec,
+                "latency_budget_ms": self.latency_budget_ms,
+                "retry_in_sec": retry_in,
+                "last_error": self._last_error,
+            }
+
+    def reset(self) -> None:
+        """Back to closed with no history (tests, manual recovery)."""
+
+        with self._lock:
+            self._state = CLOSED
+            self._failures = 0
+            self._opened_at = None
+            self._probe_in_flight = False
+            self._last_error = None
+
+
+__all__ = ["CLOSED", "HALF_OPEN", "OPEN", "CircuitBreaker", "CircuitOpenError"]
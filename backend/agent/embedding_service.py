@@ -0,0 +1,290 @@
+"""Shared embedding sidecar: one copy of the model per host instead of one per worker.
+
+    python -m agent.scripts.embedding_sidecar --socket /run/agent/embed.sock
+
+loads the configured embedding model once and serves it over a unix socket. Requests
+arriving concurrently from every gunicorn worker are micro-batched (up to `max_batch`
+texts or `max_wait_ms`) into a single `encode` call.
+
+Workers opt in with `AGENT_EMBEDDING_SOCKET=<path>`: `get_embedding_function` then
+returns an `EmbeddingServiceClient`, which loads the model in-process only while the
+socket is absent or the service fails (and goes back to the socket once it answers).
+
+Wire format, both directions: frames of 4-byte big-endian length + payload.
+
+    request   {"model": str, "normalize": bool, "texts": [str, ...]}     (JSON)
+    response  {"ok": true, "shape": [n, dim]} + one frame of float32 bytes
+              {"ok": false, "error": str}
+"""
+from __future__ import annotations
+
+import json
+import logging
+import os
+import queue
+import socket
+import socketserver
+import struct
+import threading
+import time
+from typing import Any, Callable, Optional
+
+import numpy as np
+
+from .observability import elapsed_ms, log_event, record_counter, record_timing
+
+EmbeddingFn = Callable[[list[str]], Any]
+
+EMBEDDING_SOCKET = os.getenv("AGENT_EMBEDDING_SOCKET", "").strip()
+EMBEDDING_SOCKET_TIMEOUT_SEC = float(os.getenv("AGENT_EMBEDDING_SOCKET_TIMEOUT_SEC", "10"))
+
+_HEADER = struct.Struct(">I")
+_MAX_FRAME = 256 * 1024 * 1024
+
+_logger = logging.getLogger("agent")
+
+
+class EmbeddingServiceError(RuntimeError):
+    pass
+
+
+def _recv_exact(sock: socket.socket, size: int) -> bytes:
+    chunks = bytearray()
+    while len(chunks) < size:
+        chunk = sock.recv(min(size - len(chunks), 1 << 20))
+        if not chunk:
+            raise ConnectionError("Embedding service closed the connection")
+        chunks.extend(chunk)
+    return bytes(chunks)
+
+
+def send_frame(sock: socket.socket, payload: bytes) -> None:
+    sock.sendall(_HEADER.pack(len(payload)) + payload)
+
+
+def recv_frame(sock: socket.socket) -> bytes:
+    (size,) = _HEADER.unpack(_recv_exact(sock, _HEADER.size))
+    if size > _MAX_FRAME:
+        raise EmbeddingServiceError(f"Frame too large: {size} bytes")
+    return _recv_exact(sock, size)
+
+
+class _Pending:
+    __slots__ = ("texts", "done", "vectors", "error")
+
+    def __init__(self, texts: list[str]) -> None:
+        self.texts = texts
+        self.done = threading.Event()
+        self.vectors: Optional[np.ndarray] = None
+        self.error: Optional[str] = None
+
+
+class MicroBatcher:
+    """Coalesces concurrent `submit` calls into one `embed_fn` call per batch."""
+
+    def __init__(self, embed_fn: EmbeddingFn, *, max_batch: int = 64, max_wait_ms: float = 5.0) -> None:
+        self.embed_fn = embed_fn
+        self.max_batch = max(1, max_batch)
+        self.max_wait_sec = max(0.0, max_wait_ms) / 1000.0
+        self._queue: queue.Queue[Optional[_Pending]] = queue.Queue()
+        self._thread = threading.Thread(target=self._loop, name="agent-embed-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, texts: list[str]) -> np.ndarray:
+        pending = _Pending(list(texts))
+        self._queue.put(pending)
+        pending.done.wait()
+        if pending.error is not None:
+            raise EmbeddingServiceError(pending.error)
+        return pending.vectors  # type: ignore[return-value]
+
+    def _collect(self, first: _Pending) -> tuple[list[_Pending], bool]:
+        batch, size = [first], len(first.texts)
+        deadline = time.monotonic() + self.max_wait_sec
+        while size < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is None:
+                return batch, True
+            batch.append(item)
+            size += len(item.texts)
+        return batch, False
+
+    def _loop(self) -> None:
+        while True:
+            first = self._queue.get()
+            if first is None:
+                return
+            batch, stop = self._collect(first)
+            texts = [text for item in batch for text in item.texts]
+            started = time.monotonic()
+            try:
+                vectors = np.asarray(self.embed_fn(texts), dtype=np.float32)
+                offset = 0
+                for item in batch:
+                    item.vectors = vectors[offset : offset + len(item.texts)]
+                    offset += len(item.texts)
+            except Exception as e:
+                for item in batch:
+                    item.error = str(e)
+            finally:
+                for item in batch:
+                    item.done.set()
+            record_counter("agent.embedding_service.batches")
+            record_counter("agent.embedding_service.texts", len(texts))
+            record_timing("agent.embedding_service.encode", elapsed_ms(started))
+            if stop:
+                return
+
+    def close(self) -> None:
+        self._queue.put(None)
+
+
+class _Handler(socketserver.BaseRequestHandler):
+    server: "EmbeddingServer"
+
+    def handle(self) -> None:
+        while True:
+            try:
+                request = json.loads(recv_frame(self.request))
+            except (ConnectionError, OSError):
+                return
+            except Exception as e:
+                send_frame(self.request, json.dumps({"ok": False, "error": f"Bad request: {e}"}).encode("utf-8"))
+                return
+            self._reply(request)
+
+    def _reply(self, request: dict[str, Any]) -> None:
+        error = self.server.check_request(request)
+        if error is None:
+            try:
+                vectors = self.server.batcher.submit([str(text) for text in request.get("texts") or []])
+            except EmbeddingServiceError as e:
+                error = str(e)
+        if error is not None:
+            send_frame(self.request, json.dumps({"ok": False, "error": error}).encode("utf-8"))
+            return
+        header = {"ok": True, "shape": list(vectors.shape)}
+        send_frame(self.request, json.dumps(header).encode("utf-8"))
+        send_frame(self.request, np.ascontiguousarray(vectors, dtype=np.float32).tobytes())
+
+
+class EmbeddingServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(
+        self,
+        socket_path: str,
+        embed_fn: EmbeddingFn,
+        *,
+        model_name: str,
+        normalize_embeddings: bool = True,
+        max_batch: int = 64,
+        max_wait_ms: float = 5.0,
+    ) -> None:
+        self.socket_path = socket_path
+        self.model_name = model_name
+        self.normalize_embeddings = normalize_embeddings
+        self.batcher = MicroBatcher(embed_fn, max_batch=max_batch, max_wait_ms=max_wait_ms)
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)  # stale socket from a previous run
+        super().__init__(socket_path, _Handler)
+        os.chmod(socket_path, 0o660)
+
+    def check_request(self, request: dict[str, Any]) -> Optional[str]:
+        # A worker configured for another model must not get these vectors.
+        if request.get("model") != self.model_name:
+            return f"Model mismatch: service has {self.model_name!r}, got {request.get('model')!r}"
+        if bool(request.get("normalize", True)) != self.normalize_embeddings:
+            return "Normalization mismatch"
+        return None
+
+    def server_close(self) -> None:
+        super().server_close()
+        self.batcher.close()
+        try:
+            os.unlink(self.socket_path)
+        except FileNotFoundError:
+            pass
+
+
+class EmbeddingServiceClient:
+    """Embedding function backed by the sidecar, with an in-process fallback.
+
+    Callable like `SentenceTransformerEmbedder` (and a Chroma embedding function).
+    `fallback` is only invoked (and its model only loaded) while the service is down.
+    """
+
+    def __init__(
+        self,
+        socket_path: str,
+        model_name: str,
+        *,
+        normalize_embeddings: bool = True,
+        timeout_sec: float = EMBEDDING_SOCKET_TIMEOUT_SEC,
+        fallback: Optional[EmbeddingFn] = None,
+    ) -> None:
+        self.socket_path = socket_path
+        self.model_name = model_name
+        self.normalize_embeddings = normalize_embeddings
+        self.timeout_sec = timeout_sec
+        self.fallback = fallback
+        self._service_up: Optional[bool] = None
+
+    def _request(self, texts: list[str]) -> np.ndarray:
+        payload = {"model": self.model_name, "normalize": self.normalize_embeddings, "texts": texts}
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(self.timeout_sec)
+            sock.connect(self.socket_path)
+            send_frame(sock, json.dumps(payload, ensure_ascii=False).encode("utf-8"))
+            header = json.loads(recv_frame(sock))
+            if not header.get("ok"):
+                raise EmbeddingServiceError(header.get("error") or "embedding service error")
+            data = recv_frame(sock)
+        return np.frombuffer(data, dtype=np.float32).reshape(header["shape"])
+
+    def _mark(self, up: bool, **fields: Any) -> None:
+        # Log transitions only: a dead sidecar must not log once per query.
+        if self._service_up is not up:
+            self._service_up = up
+            if up:
+                log_event("agent.embedding_service_up", socket=self.socket_path)
+            else:
+                _logger.warning({"event": "agent.embedding_service_down", "socket": self.socket_path, **fields})
+
+    def __call__(self, input: list[str]) -> list[list[float]]:  # noqa: A002 - Chroma protocol name
+        texts = list(input)
+        if not texts:
+            return []
+        error = "socket not found"
+        if os.path.exists(self.socket_path):
+            try:
+                vectors = self._request(texts)
+                self._mark(True)
+                record_counter("agent.embedding_service.request")
+                return vectors.tolist()
+            except (OSError, ValueError, EmbeddingServiceError) as e:
+                error = str(e)
+        self._mark(False, error=error)
+        record_counter("agent.embedding_service.fallback")
+        if self.fallback is None:
+            from .vector_store import VectorStoreUnavailable
+
+            raise VectorStoreUnavailable(f"Embedding service unavailable: {error}")
+        return self.fallback(texts)
+
+
+__all__ = [
+    "EMBEDDING_SOCKET",
+    "EmbeddingServer",
+    "EmbeddingServiceClient",
+    "EmbeddingServiceError",
+    "MicroBatcher",
+    "recv_frame",
+    "send_frame",
+]
@@ -48,4 +48,21 @@ def validate_llm_message(
     return GuardrailResult(ok=not errors, errors=errors)
 
 
-__all__ = ["GuardrailResult", "validate_llm_message"]
+def check_partial_llm_message(prefix: str, *, max_chars: int = 800) -> GuardrailResult:
+    """Checks that can already fail on a streaming prefix (and more text cannot fix).
+
+    Bullet counts are only meaningful on the final buffer, see `validate_llm_message`.
+    """
+
+    errors: list[str] = []
+    text = (prefix or "").strip()
+    if len(text) > max_chars:
+        errors.append("too_long")
+    if text.startswith("{") or text.startswith("["):
+        errors.append("looks_like_json")
+    if "```" in text:
+        errors.append("contains_code_block")
+    return GuardrailResult(ok=not errors, errors=errors)
+
+
+__all__ = ["GuardrailResult", "check_partial_llm_message", "validate_llm_message"]
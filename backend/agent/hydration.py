@@ -0,0 +1,182 @@
+"""Hydration of retrieval hits into one compact, uniform result schema.
+
+Vector hits carry the price/stock captured at index time, and ORM rows used to be
+serialized one model at a time with a lazy `categoria` load each. Every retrieval
+path now ends here: the result ids are fetched in a single `values()` query (joined
+to `categoria`) and each hit becomes a flat row with live fields:
+
+    libro_id, titulo, autor, isbn, precio, categoria, stock, editorial,
+    año_publicacion, descripcion  (+ `distance` / `score` when the source ranks)
+
+If the DB cannot be reached, rows are built from the index metadata instead and a
+warning is returned, so search keeps answering with the snapshot.
+"""
+from __future__ import annotations
+
+import os
+from typing import Any, Callable, Iterable, Optional
+
+from .observability import truncate_text
+
+# Max characters of `descripcion` in retrieval results (prompt/payload size).
+RESULT_DESCRIPTION_CHARS = int(os.getenv("AGENT_RESULT_DESCRIPTION_CHARS", "300"))
+
+_VALUE_FIELDS = (
+    "id",
+    "titulo",
+    "autor",
+    "isbn",
+    "precio",
+    "stock",
+    "editorial",
+    "año_publicacion",
+    "descripcion",
+    "categoria__nombre",
+)
+_RANK_FIELDS = ("distance", "score")
+
+SNAPSHOT_WARNING = "Live catalog data unavailable; showing indexed snapshot."
+
+
+def serialize_libro(libro: Any) -> dict[str, Any]:
+    """Flat row for a `Libro` instance (full description; used by lookups)."""
+
+    return {
+        "libro_id": libro.id,
+        "titulo": libro.titulo,
+        "autor": libro.autor,
+        "isbn": libro.isbn,
+        "precio": str(libro.precio) if getattr(libro, "precio", None) is not None else None,
+        "categoria": libro.categoria.nombre if getattr(libro, "categoria", None) else None,
+        "stock": libro.stock,
+        "editorial": getattr(libro, "editorial", None),
+        "año_publicacion": getattr(libro, "año_publicacion", None),
+        "descripcion": getattr(libro, "descripcion", None),
+    }
+
+
+def _compact(description: Any) -> Any:
+    if description is None:
+        return None
+    return truncate_text(description, max_len=RESULT_DESCRIPTION_CHARS)
+
+
+def _row_from_values(values: dict[str, Any]) -> dict[str, Any]:
+    return {
+        "libro_id": values["id"],
+        "titulo": values["titulo"],
+        "autor": values["autor"],
+        "isbn": values["isbn"],
+        "precio": str(values["precio"]) if values.get("precio") is not None else None,
+        "categoria": values.get("categoria__nombre"),
+        "stock": values.get("stock"),
+        "editorial": values.get("editorial"),
+        "año_publicacion": values.get("año_publicacion"),
+        "descripcion": _compact(values.get("descripcion")),
+    }
+
+
+def fetch_libro_rows(libro_ids: Iterable[int]) -> dict[int, dict[str, Any]]:
+    """Rows for `libro_ids` in one query (missing ids are simply absent)."""
+
+    from apps.libros.models import Libro
+
+    ids = list(dict.fromkeys(libro_ids))
+    if not ids:
+        return {}
+    qs = Libro.objects.filter(id__in=ids)
+    return {row["libro_id"]: row for row in rows_from_queryset(qs)}
+
+
+def rows_from_queryset(qs: Any, *, limit: Optional[int] = None) -> list[dict[str, Any]]:
+    """Uniform rows straight from a `Libro` queryset (one query, categoria joined)."""
+
+    values_qs = qs.values(*_VALUE_FIELDS)
+    if limit is not None:
+        values_qs = values_qs[:limit]
+    return [_row_from_values(values) for values in values_qs]
+
+
+def result_libro_id(item: dict[str, Any]) -> Optional[int]:
+    """`libro_id` of a flat row or a vector hit (`metadata.libro_id` or a `libro:<id>` id)."""
+
+    libro_id = item.get("libro_id")
+    if libro_id is None:
+        libro_id = (item.get("metadata") or {}).get("libro_id")
+    if libro_id is None and isinstance(item.get("id"), str) and item["id"].startswith("libro:"):
+        libro_id = item["id"].split(":", 1)[1]
+    try:
+        return int(libro_id) if libro_id is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def _row_from_metadata(item: dict[str, Any], libro_id: int) -> dict[str, Any]:
+    if "metadata" not in item and "titulo" in item:
+        return {**item, "libro_id": libro_id}
+    metadata = item.get("metadata") or {}
+    precio = metadata.get("precio")
+    return {
+        "libro_id": libro_id,
+        "titulo": metadata.get("titulo"),
+        "autor": metadata.get("autor"),
+        "isbn": metadata.get("isbn"),
+        "precio": str(precio) if precio is not None else None,
+        "categoria": metadata.get("categoria"),
+        "stock": metadata.get("stock"),
+        "editorial": metadata.get("editorial"),
+        "año_publicacion": metadata.get("anio_publicacion"),
+        "descripcion": None,
+    }
+
+
+def hydrate_results(
+    results: list[dict[str, Any]],
+    *,
+    fetch_fn: Optional[Callable[[list[int]], dict[int, dict[str, Any]]]] = None,
+) -> tuple[list[dict[str, Any]], list[str]]:
+    """Return (uniform rows in input order, warnings).
+
+    Hits whose book no longer exists are dropped; hits without a `libro_id` are kept
+    unchanged. Rank fields (`distance`, `score`) are preserved.
+    """
+
+    ids = [result_libro_id(item) for item in results]
+    wanted = [libro_id for libro_id in ids if libro_id is not None]
+    if not wanted:
+        return list(results), []
+
+    fetch_fn = fetch_fn or fetch_libro_rows
+    warnings: list[str] = []
+    try:
+        rows: Optional[dict[int, dict[str, Any]]] = fetch_fn(wanted)
+    except Exception:
+        rows = None
+        warnings.append(SNAPSHOT_WARNING)
+
+    out: list[dict[str, Any]] = []
+    for item, libro_id in zip(results, ids):
+        if libro_id is None:
+            out.append(item)
+            continue
+        if rows is None:
+            row = _row_from_metadata(item, libro_id)
+        elif libro_id in rows:
+            row = dict(rows[libro_id])
+        else:
+            continue
+        for field in _RANK_FIELDS:
+            if item.get(field) is not None:
+                row[field] = item[field]
+        out.append(row)
+    return out, warnings
+
+
+__all__ = [
+    "RESULT_DESCRIPTION_CHARS",
+    "fetch_libro_rows",
+    "hydrate_results",
+    "result_libro_id",
+    "rows_from_queryset",
+    "serialize_libro",
+]
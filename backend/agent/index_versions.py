@@ -0,0 +1,137 @@
+"""Versioned vector index directories behind a pointer file.
+
+Layout under VECTOR_DB_DIR (`build_vector_index --publish`):
+
+    current.json                     {"version": "20261016T120000Z", "generation": 7, ...}
+    versions/<version>/              complete artifact (collections + manifest.json)
+
+Publishing a build writes its directory first and then replaces `current.json`
+atomically, so readers see either the old or the new version, never a partial one.
+Workers notice the new generation through `PointerWatcher` (one `stat` every
+`interval_sec`) and swap collections in the background (see `agent.vector_store`).
+Without `current.json` the artifact lives directly in VECTOR_DB_DIR, as before.
+"""
+from __future__ import annotations
+
+import json
+import os
+import shutil
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Optional
+
+POINTER_FILE = "current.json"
+VERSIONS_DIR = "versions"
+
+
+def pointer_path(root: Path) -> Path:
+    return root / POINTER_FILE
+
+
+def version_dir(root: Path, version: str) -> Path:
+    return root / VERSIONS_DIR / version
+
+
+def new_version_name() -> str:
+    return datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+
+
+def read_pointer(root: Path) -> Optional[dict[str, Any]]:
+    path = pointer_path(root)
+    try:
+        pointer = json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+    if not isinstance(pointer, dict) or not pointer.get("version"):
+        return None
+    return pointer
+
+
+def list_versions(root: Path) -> list[str]:
+    base = root / VERSIONS_DIR
+    if not base.is_dir():
+        return []
+    return sorted(p.name for p in base.iterdir() if p.is_dir())
+
+
+def publish_version(root: Path, version: str, **extra: Any) -> dict[str, Any]:
+    """Point `current.json` at `versions/<version>` with the next generation number."""
+
+    if not (version_dir(root, version) / "manifest.json").exists():
+        raise FileNotFoundError(f"{version_dir(root, version)} has no manifest.json")
+    previous = read_pointer(root) or {}
+    pointer = {
+        "version": version,
+        "generation": int(previous.get("generation", 0)) + 1,
+        "previous": previous.get("version"),
+        "published_at_utc": datetime.now(timezone.utc).isoformat(),
+        **extra,
+    }
+    path = pointer_path(root)
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_text(json.dumps(pointer, ensure_ascii=False, indent=2), encoding="utf-8")
+    os.replace(tmp, path)
+    return pointer
+
+
+def prune_versions(root: Path, keep: int) -> list[str]:
+    """Delete old version directories, keeping the newest `keep` plus current/previous."""
+
+    pointer = read_pointer(root) or {}
+    protected = {pointer.get("version"), pointer.get("previous")}
+    versions = list_versions(root)
+    removable = [v for v in versions[: max(0, len(versions) - keep)] if v not in protected]
+    for version in removable:
+        shutil.rmtree(version_dir(root, version), ignore_errors=True)
+    return removable
+
+
+class PointerWatcher:
+    """Rate-limited change detection for `current.json` (mtime + size, then content)."""
+
+    def __init__(self, root: Path, *, interval_sec: float = 5.0) -> None:
+        self.root = root
+        self.interval_sec = interval_sec
+        self._lock = threading.Lock()
+        self._next_check = 0.0
+        self._stamp: Optional[tuple[int, int]] = None
+
+    def poll(self) -> Optional[dict[str, Any]]:
+        """The pointer if `current.json` changed since the previous check, else None."""
+
+        now = time.monotonic()
+        with self._lock:
+            if now < self._next_check:
+                return None
+            self._next_check = now + self.interval_sec
+            try:
+                stat = pointer_path(self.root).stat()
+                stamp = (stat.st_mtime_ns, stat.st_size)
+            except FileNotFoundError:
+                stamp = None
+            if stamp == self._stamp:
+                return None
+            self._stamp = stamp
+        return read_pointer(self.root) if stamp is not None else None
+
+    def reset(self) -> None:
+        """Forget the last stamp: the next due check re-reports the pointer (retry after a failed swap)."""
+
+        with self._lock:
+            self._stamp = None
+
+
+__all__ = [
+    "POINTER_FILE",
+    "VERSIONS_DIR",
+    "PointerWatcher",
+    "list_versions",
+    "new_version_name",
+    "pointer_path",
+    "prune_versions",
+    "publish_version",
+    "read_pointer",
+    "version_dir",
+]
@@ -0,0 +1,319 @@
+"""Incremental sync of the vector index with the `Libro` table.
+
+`Libro` signals enqueue the affected ids (`enqueue_libro_sync`); a background worker
+coalesces them into batches and applies `collection.upsert` / `collection.delete`.
+A book is only re-embedded when its indexed text changed: the SHA-256 of the text is
+stored in the metadata (`content_hash`) and compared before calling the encoder.
+Metadata-only changes (e.g. stock) reuse the stored embedding.
+
+Opt-in with AGENT_VECTOR_SYNC=true; otherwise enqueueing is a no-op and the artifact
+is only refreshed by a full rebuild.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Iterable, Optional
+
+from .lexical_index import normalize_text
+from .locks import file_lock
+from .observability import elapsed_ms, log_event, record_counter, record_timing
+from .vector_store import (
+    VectorStoreConfig,
+    get_embedding_function,
+    get_vector_collection,
+    load_vector_store_config,
+)
+
+VECTOR_SYNC_ENABLED = (os.getenv("AGENT_VECTOR_SYNC", "false") or "false").strip().lower() in {"1", "true", "yes"}
+VECTOR_SYNC_BATCH_SIZE = int(os.getenv("AGENT_VECTOR_SYNC_BATCH_SIZE", "64"))
+# Debounce window: bursts of admin edits are coalesced into one batch.
+VECTOR_SYNC_DELAY_SEC = float(os.getenv("AGENT_VECTOR_SYNC_DELAY_SEC", "2.0"))
+
+_logger = logging.getLogger("agent")
+
+
+def document_id(libro_id: Any) -> str:
+    return f"libro:{libro_id}"
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def libro_to_text(libro: Any) -> str:
+    """Indexed text for a book (same layout as `agent/notebooks/build_vector_db.ipynb`)."""
+
+    categoria = getattr(libro, "categoria", None)
+    categoria_nombre = getattr(categoria, "nombre", "") if categoria else ""
+    parts = [
+        f"Título: {libro.titulo or ''}",
+        f"Autor: {libro.autor or ''}",
+        f"Categoría: {categoria_nombre}" if categoria_nombre else None,
+        f"Editorial: {libro.editorial}" if libro.editorial else None,
+        f"Año: {libro.año_publicacion}" if libro.año_publicacion else None,
+        f"ISBN: {libro.isbn}" if libro.isbn else None,
+        f"Descripción: {libro.descripcion}" if libro.descripcion else None,
+        f"Precio: {libro.precio}" if libro.precio else None,
+    ]
+    return "\n".join(p for p in parts if p)
+
+
+def libro_to_document(libro: Any) -> tuple[str, str, dict[str, Any]]:
+    """(id, text, metadata) for a `Libro`; metadata carries the text's `content_hash`."""
+
+    text = libro_to_text(libro)
+    categoria = getattr(libro, "categoria", None)
+    metadata = {
+        "libro_id": libro.id,
+        "titulo": libro.titulo,
+        "autor": libro.autor,
+        "isbn": libro.isbn,
+        "categoria_id": getattr(libro, "categoria_id", None),
+        "categoria": getattr(categoria, "nombre", None) if categoria else None,
+        "editorial": libro.editorial,
+        "anio_publicacion": libro.año_publicacion,
+        "precio": str(libro.precio) if libro.precio is not None else None,
+        "stock": libro.stock,
+        # Filter fields for `where` clauses (see `retrieval.build_where`); price/stock ones
+        # are informational, filters on them are checked against live rows.
+        "categoria_key": normalize_text(getattr(categoria, "nombre", "")) if categoria else None,
+        "editorial_key": normalize_text(libro.editorial) if libro.editorial else None,
+        "precio_num": float(libro.precio) if libro.precio is not None else None,
+        "in_stock": bool(libro.stock and libro.stock > 0),
+        "content_hash": content_hash(text),
+    }
+    # Chroma rejects None metadata values.
+    return document_id(libro.id), text, {key: value for key, value in metadata.items() if value is not None}
+
+
+def _manifest_path(cfg: VectorStoreConfig) -> Path:
+    return cfg.manifest_path or (cfg.db_dir / "manifest.json")
+
+
+def write_json_atomic(path: Path, data: dict[str, Any]) -> None:
+    """Write JSON atomically (temp file + rename), so readers never see half a file."""
+
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_text(json.dumps(data, ensure_ascii=False, indent=2), encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def write_manifest(path: Path, manifest: dict[str, Any]) -> None:
+    write_json_atomic(path, manifest)
+
+
+def update_manifest_counts(cfg: VectorStoreConfig, documents_indexed: int) -> None:
+    path = _manifest_path(cfg)
+    # Read-modify-write across worker processes: serialize on a lock file next to it.
+    with file_lock(path.with_name(path.name + ".lock")):
+        try:
+            manifest = json.loads(path.read_text(encoding="utf-8")) if path.exists() else {}
+        except Exception:
+            manifest = {}
+        counts = manifest.get("counts") or {}
+        counts["documents_indexed"] = int(documents_indexed)
+        manifest["counts"] = counts
+        manifest["last_sync_utc"] = datetime.now(timezone.utc).isoformat()
+        write_manifest(path, manifest)
+
+
+def _load_libros(libro_ids: list[int]) -> dict[int, Any]:
+    from apps.libros.models import Libro
+
+    return {libro.id: libro for libro in Libro.objects.filter(id__in=libro_ids).select_related("categoria")}
+
+
+def sync_libros(
+    libro_ids: Iterable[int],
+    *,
+    collection: Any = None,
+    embed_fn: Optional[Callable[[list[str]], Any]] = None,
+    cfg: Optional[VectorStoreConfig] = None,
+) -> dict[str, int]:
+    """Bring the vector index in line with the DB for `libro_ids`.
+
+    Returns counts: `embedded` (text changed), `updated` (metadata only),
+    `unchanged` and `deleted`.
+    """
+
+    ids = sorted({int(i) for i in libro_ids})
+    stats = {"embedded": 0, "updated": 0, "unchanged": 0, "deleted": 0}
+    if not ids:
+        return stats
+
+    cfg = cfg or load_vector_store_config()
+    collection = collection if collection is not None else get_vector_collection()
+    libros = _load_libros(ids)
+
+    existing = collection.get(ids=[document_id(i) for i in ids], include=["metadatas", "embeddings"])
+    stored: dict[str, tuple[dict[str, Any], Any]] = {
+        row_id: (meta or {}, vector)
+        for row_id, meta, vector in zip(existing["ids"], existing["metadatas"], existing["embeddings"])
+    }
+
+    to_embed: list[tuple[str, str, dict[str, Any]]] = []
+    reuse: list[tuple[str, str, dict[str, Any], Any]] = []
+    for libro_id in ids:
+        libro = libros.get(libro_id)
+        if libro is None:
+            continue
+        doc_id, text, metadata = libro_to_document(libro)
+        previous = stored.get(doc_id)
+        if previous is None or previous[0].get("content_hash") != metadata["content_hash"]:
+            to_embed.append((doc_id, text, metadata))
+        elif previous[0] != metadata:
+            reuse.append((doc_id, text, metadata, previous[1]))
+        else:
+            stats["unchanged"] += 1
+
+    if to_embed:
+        embed_fn = embed_fn or get_embedding_function(cfg)
+        vectors = embed_fn([text for _, text, _ in to_embed])
+        collection.upsert(
+            ids=[doc_id for doc_id, _, _ in to_embed],
+            embeddings=[list(map(float, v)) for v in vectors],
+            documents=[text for _, text, _ in to_embed],
+            metadatas=[metadata for _, _, metadata in to_embed],
+        )
+        stats["embedded"] = len(to_embed)
+    if reuse:
+        collection.upsert(
+            ids=[doc_id for doc_id, _, _, _ in reuse],
+            embeddings=[list(map(float, vector)) for _, _, _, vector in reuse],
+            documents=[text for _, text, _, _ in reuse],
+            metadatas=[metadata for _, _, metadata, _ in reuse],
+        )
+        stats["updated"] = len(reuse)
+
+    to_delete = [document_id(i) for i in ids if i not in libros and document_id(i) in stored]
+    if to_delete:
+        collection.delete(ids=to_delete)
+        stats["deleted"] = len(to_delete)
+
+    if stats["embedded"] or stats["updated"] or stats["deleted"]:
+        update_manifest_counts(cfg, collection.count())
+        # Vector hits changed: drop cached search results computed before the sync.
+        from .result_cache import bump_catalog_version
+
+        bump_catalog_version()
+    return stats
+
+
+class VectorSyncWorker:
+    """Daemon thread that drains queued libro ids into `sync_libros` batches."""
+
+    def __init__(
+        self,
+        *,
+        sync_fn: Callable[[list[int]], dict[str, int]] = sync_libros,
+        batch_size: int = VECTOR_SYNC_BATCH_SIZE,
+        delay_sec: float = VECTOR_SYNC_DELAY_SEC,
+    ) -> None:
+        self._sync_fn = sync_fn
+        self.batch_size = max(1, batch_size)
+        self.delay_sec = max(0.0, delay_sec)
+        self._pending: set[int] = set()
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+
+    def pending(self) -> int:
+        with self._cond:
+            return len(self._pending)
+
+    def enqueue(self, libro_ids: Iterable[int]) -> None:
+        with self._cond:
+            self._pending.update(int(i) for i in libro_ids)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="agent-vector-sync", daemon=True)
+                self._thread.start()
+            self._cond.notify()
+
+    def _take_batch(self) -> list[int]:
+        with self._cond:
+            batch = sorted(self._pending)[: self.batch_size]
+            self._pending.difference_update(batch)
+            return batch
+
+    def flush(self) -> None:
+        """Process everything queued in the calling thread."""
+
+        while True:
+            batch = self._take_batch()
+            if not batch:
+                return
+            self._process(batch)
+
+    def _process(self, batch: list[int]) -> None:
+        started = time.monotonic()
+        try:
+            stats = self._sync_fn(batch)
+        except Exception as e:
+            # Dropped on purpose: a full rebuild reconciles anything missed here.
+            record_counter("agent.vector_sync_failed")
+            _logger.warning({"event": "agent.vector_sync_failed", "libros": len(batch), "error": str(e)})
+            return
+        record_timing("agent.vector_sync", elapsed_ms(started))
+        log_event("agent.vector_sync", libros=len(batch), duration_ms=elapsed_ms(started), **stats)
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+            time.sleep(self.delay_sec)
+            try:
+                self.flush()
+            finally:
+                _close_db_connections()
+
+
+def _close_db_connections() -> None:
+    try:
+        from django.db import connections
+
+        connections.close_all()
+    except Exception:  # pragma: no cover - Django not configured
+        return
+
+
+_worker: Optional[VectorSyncWorker] = None
+_worker_lock = threading.Lock()
+
+
+def get_sync_worker() -> VectorSyncWorker:
+    global _worker
+
+    with _worker_lock:
+        if _worker is None:
+            _worker = VectorSyncWorker()
+        return _worker
+
+
+def enqueue_libro_sync(libro_ids: Iterable[int]) -> None:
+    """Queue books for re-indexing (no-op unless AGENT_VECTOR_SYNC is enabled)."""
+
+    if not VECTOR_SYNC_ENABLED:
+        return
+    get_sync_worker().enqueue(libro_ids)
+
+
+__all__ = [
+    "VectorSyncWorker",
+    "content_hash",
+    "document_id",
+    "enqueue_libro_sync",
+    "get_sync_worker",
+    "libro_to_document",
+    "libro_to_text",
+    "sync_libros",
+    "update_manifest_counts",
+    "write_json_atomic",
+    "write_manifest",
+]
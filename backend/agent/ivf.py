@@ -0,0 +1,124 @@
+"""IVF-flat approximate nearest-neighbour index for the NumPy vector backend.
+
+Rows are partitioned into `nlist` clusters by spherical k-means (trained on a sample).
+A query scores the centroids, scans only the rows of the `nprobe` closest clusters
+and ranks them exactly, so cost per query is ~ nlist + N * nprobe / nlist dot
+products instead of N. `nprobe == nlist` degenerates to exact search.
+
+Stored next to the matrix as `<collection>.ivf.npz` (centroids + row assignments);
+the index type and parameters are recorded in the manifest under `ann`.
+"""
+from __future__ import annotations
+
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+
+from .numpy_store import normalize_rows, top_k_indices
+
+ASSIGN_CHUNK = 65536
+
+
+def ivf_path(db_dir: Path, collection: str) -> Path:
+    return db_dir / f"{collection}.ivf.npz"
+
+
+class IVFFlatIndex:
+    """Inverted lists over a fixed set of centroids (rows are referenced by position)."""
+
+    def __init__(self, centroids: np.ndarray, assignments: np.ndarray) -> None:
+        self.centroids = np.asarray(centroids, dtype=np.float32)
+        self.assignments = np.asarray(assignments, dtype=np.int32)
+        # Rows grouped by cluster: order[offsets[c]:offsets[c + 1]] are the rows of cluster c.
+        self.order = np.argsort(self.assignments, kind="stable")
+        counts = np.bincount(self.assignments, minlength=self.nlist)
+        self.offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+
+    @property
+    def nlist(self) -> int:
+        return int(self.centroids.shape[0])
+
+    def assign(self, vectors: np.ndarray) -> np.ndarray:
+        """Nearest centroid per row (vectors must be unit-normalized)."""
+
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if vectors.ndim == 1:
+            vectors = vectors.reshape(1, -1)
+        out = np.empty(vectors.shape[0], dtype=np.int32)
+        for start in range(0, vectors.shape[0], ASSIGN_CHUNK):
+            block = np.asarray(vectors[start : start + ASSIGN_CHUNK])
+            out[start : start + ASSIGN_CHUNK] = np.argmax(block @ self.centroids.T, axis=1)
+        return out
+
+    def with_assignments(self, assignments: np.ndarray) -> "IVFFlatIndex":
+        return IVFFlatIndex(self.centroids, assignments)
+
+    def candidates(self, query: np.ndarray, nprobe: int) -> np.ndarray:
+        lists = top_k_indices(self.centroids @ query, max(1, min(nprobe, self.nlist)))
+        return np.concatenate([self.order[self.offsets[c] : self.offsets[c + 1]] for c in lists])
+
+    def search(self, matrix: np.ndarray, query: np.ndarray, k: int, nprobe: int) -> tuple[np.ndarray, np.ndarray]:
+        """(row indices best first, their scores) for one unit-normalized query."""
+
+        rows = self.candidates(query, nprobe)
+        if rows.size == 0:
+            return rows, np.empty(0, dtype=np.float32)
+        rows.sort()  # sequential reads from the memory map
+        scores = np.asarray(matrix[rows] @ query)
+        top = top_k_indices(scores, k)
+        return rows[top], scores[top]
+
+    def save(self, path: Path) -> None:
+        tmp = path.with_name(path.name + ".tmp.npz")
+        np.savez(tmp, centroids=self.centroids, assignments=self.assignments)
+        tmp.replace(path)
+
+    @classmethod
+    def load(cls, path: Path) -> "IVFFlatIndex":
+        with np.load(path) as data:
+            return cls(data["centroids"], data["assignments"])
+
+
+def train_ivf(
+    matrix: np.ndarray,
+    nlist: int,
+    *,
+    iterations: int = 10,
+    sample_size: Optional[int] = None,
+    seed: int = 0,
+) -> IVFFlatIndex:
+    """Spherical k-means on a sample of `matrix`, then assign every row (in chunks)."""
+
+    n = int(matrix.shape[0])
+    if n == 0:
+        raise ValueError("Cannot train an IVF index on an empty matrix")
+    nlist = max(1, min(int(nlist), n))
+    rng = np.random.default_rng(seed)
+
+    sample_size = min(n, sample_size or max(nlist * 64, 10000))
+    sample_rows = np.sort(rng.choice(n, size=sample_size, replace=False))
+    sample = normalize_rows(np.asarray(matrix[sample_rows], dtype=np.float32))
+    centroids = sample[rng.choice(sample_size, size=nlist, replace=False)].copy()
+
+    for _ in range(max(1, iterations)):
+        labels = np.argmax(sample @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, labels, sample)
+        empty = np.flatnonzero(np.bincount(labels, minlength=nlist) == 0)
+        if empty.size:
+            # Re-seed empty clusters with random sample points.
+            sums[empty] = sample[rng.choice(sample_size, size=empty.size, replace=False)]
+        centroids = normalize_rows(sums)
+
+    index = IVFFlatIndex(centroids, np.zeros(0, dtype=np.int32))
+    return index.with_assignments(index.assign(matrix))
+
+
+def default_nlist(n: int) -> int:
+    """Rule of thumb: ~sqrt(N) clusters."""
+
+    return max(1, int(round(np.sqrt(max(n, 1)))))
+
+
+__all__ = ["IVFFlatIndex", "default_nlist", "ivf_path", "train_ivf"]
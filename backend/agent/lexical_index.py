@@ -0,0 +1,334 @@
+"""In-memory inverted index with BM25 scoring over the book catalog.
+
+Indexed fields: titulo, autor, editorial, descripcion, isbn (titulo/autor boosted).
+The index is built per process from the DB, eagerly by the warm-up or otherwise in a
+background thread on first use; requests never wait for it (`get_lexical_index`
+returns None until the first build finishes, and callers fall back to `icontains`).
+`Libro` signals update it incrementally, but only in the process that wrote. When the
+indexed text changed, the writer bumps the shared lexical version (`agent.result_cache`)
+after commit and other workers rebuild in the background, serving the previous index
+meanwhile; stock/price saves leave the version alone. Workers read the version at
+most once per second. The index is also rebuilt after AGENT_LEXICAL_INDEX_TTL_SEC. That covers writes that fire no
+signal (`QuerySet.update`) and per-process caches (LocMem) that never share versions.
+
+Besides ranked search it answers exact ISBN / exact author lookups, which lets
+hybrid retrieval skip the embedding step for those queries.
+"""
+from __future__ import annotations
+
+import logging
+import math
+import os
+import re
+import threading
+import time
+import unicodedata
+from collections import Counter
+from typing import Any, Iterable, Optional
+
+from .observability import elapsed_ms, log_event, record_counter
+
+LEXICAL_INDEX_TTL_SEC = float(os.getenv("AGENT_LEXICAL_INDEX_TTL_SEC", "600"))
+# How often a worker asks the shared cache for the lexical version.
+VERSION_CHECK_INTERVAL_SEC = 1.0
+
+_logger = logging.getLogger("agent")
+
+# Term-frequency multipliers per field.
+FIELD_WEIGHTS = {"titulo": 3, "autor": 2, "editorial": 1, "descripcion": 1, "isbn": 1}
+
+_STOPWORDS = frozenset(
+    "a al con de del el en la las lo los o para por que se sin su sus un una unos unas y "
+    "the of and to in on for".split()
+)
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def normalize_text(text: Any) -> str:
+    """Casefold and strip accents ("García" -> "garcia")."""
+
+    decomposed = unicodedata.normalize("NFKD", str(text or ""))
+    stripped = "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+    return re.sub(r"\s+", " ", stripped).strip().casefold()
+
+
+def tokenize(text: Any) -> list[str]:
+    return [tok for tok in _TOKEN_RE.findall(normalize_text(text)) if tok not in _STOPWORDS]
+
+
+def _isbn_key(value: Any) -> str:
+    return re.sub(r"[^0-9x]", "", normalize_text(value))
+
+
+class BM25Index:
+    """Thread-safe BM25 (Okapi) index keyed by integer `libro_id`."""
+
+    def __init__(self, *, k1: float = 1.2, b: float = 0.75) -> None:
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.RLock()
+        self._postings: dict[str, dict[int, int]] = {}
+        self._doc_terms: dict[int, Counter[str]] = {}
+        self._doc_len: dict[int, int] = {}
+        self._total_len = 0
+        self._by_isbn: dict[str, int] = {}
+        self._by_autor: dict[str, set[int]] = {}
+        self._doc_keys: dict[int, tuple[str, str]] = {}  # doc -> (isbn key, autor key)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._doc_len)
+
+    def upsert(self, doc_id: int, fields: dict[str, Any]) -> bool:
+        """Index (or re-index) a document. Returns False when its indexed text is unchanged."""
+
+        terms: Counter[str] = Counter()
+        for name, weight in FIELD_WEIGHTS.items():
+            for token in tokenize(fields.get(name)):
+                terms[token] += weight
+        isbn_key = _isbn_key(fields.get("isbn"))
+        autor_key = normalize_text(fields.get("autor"))
+
+        with self._lock:
+            if self._doc_terms.get(doc_id) == terms and self._doc_keys.get(doc_id) == (isbn_key, autor_key):
+                return False
+            self._remove_locked(doc_id)
+            for term, tf in terms.items():
+                self._postings.setdefault(term, {})[doc_id] = tf
+            length = sum(terms.values())
+            self._doc_terms[doc_id] = terms
+            self._doc_len[doc_id] = length
+            self._total_len += length
+            if isbn_key:
+                self._by_isbn[isbn_key] = doc_id
+            if autor_key:
+                self._by_autor.setdefault(autor_key, set()).add(doc_id)
+            self._doc_keys[doc_id] = (isbn_key, autor_key)
+        return True
+
+    def remove(self, doc_id: int) -> None:
+        with self._lock:
+            self._remove_locked(doc_id)
+
+    def _remove_locked(self, doc_id: int) -> None:
+        terms = self._doc_terms.pop(doc_id, None)
+        if terms is None:
+            return
+        for term in terms:
+            posting = self._postings.get(term)
+            if posting is not None:
+                posting.pop(doc_id, None)
+                if not posting:
+                    del self._postings[term]
+        self._total_len -= self._doc_len.pop(doc_id, 0)
+        isbn_key, autor_key = self._doc_keys.pop(doc_id, ("", ""))
+        if isbn_key and self._by_isbn.get(isbn_key) == doc_id:
+            del self._by_isbn[isbn_key]
+        if autor_key and autor_key in self._by_autor:
+            self._by_autor[autor_key].discard(doc_id)
+            if not self._by_autor[autor_key]:
+                del self._by_autor[autor_key]
+
+    def exact_match(self, query: str) -> Optional[list[int]]:
+        """Ids for an exact ISBN or exact author query, else None."""
+
+        with self._lock:
+            isbn_key = _isbn_key(query)
+            if len(isbn_key) >= 10 and isbn_key in self._by_isbn:
+                return [self._by_isbn[isbn_key]]
+            autor_ids = self._by_autor.get(normalize_text(query))
+            if autor_ids:
+                return sorted(autor_ids)
+        return None
+
+    def search(self, query: str, k: int) -> list[tuple[int, float]]:
+        """Top-k (doc_id, score) pairs, best first. Only documents sharing a term are scored."""
+
+        tokens = tokenize(query)
+        if not tokens or k <= 0:
+            return []
+
+        with self._lock:
+            n_docs = len(self._doc_len)
+            if n_docs == 0:
+                return []
+            avg_len = self._total_len / n_docs
+            scores: dict[int, float] = {}
+            for term in set(tokens):
+                posting = self._postings.get(term)
+                if not posting:
+                    continue
+                idf = math.log(1 + (n_docs - len(posting) + 0.5) / (len(posting) + 0.5))
+                for doc_id, tf in posting.items():
+                    norm = tf + self.k1 * (1 - self.b + self.b * self._doc_len[doc_id] / avg_len)
+                    scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.k1 + 1) / norm
+
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+        return ranked[:k]
+
+
+LEXICAL_FIELDS = ("id", "titulo", "autor", "editorial", "descripcion", "isbn")
+
+_index: Optional[BM25Index] = None
+# Lexical version read before the current index was built, and when (monotonic).
+_index_version: Optional[int] = None
+_index_built_at = 0.0
+_version_checked_at = 0.0
+_index_lock = threading.Lock()
+_build_thread: Optional[threading.Thread] = None
+
+
+def build_index(rows: Iterable[dict[str, Any]]) -> BM25Index:
+    index = BM25Index()
+    for row in rows:
+        index.upsert(int(row["id"]), row)
+    return index
+
+
+def _lexical_version() -> Optional[int]:
+    try:
+        from .result_cache import get_lexical_version
+
+        return get_lexical_version()
+    except Exception:
+        return None
+
+
+def _is_stale() -> bool:
+    global _version_checked_at
+
+    now = time.monotonic()
+    if LEXICAL_INDEX_TTL_SEC > 0 and now - _index_built_at > LEXICAL_INDEX_TTL_SEC:
+        return True
+    if now - _version_checked_at < VERSION_CHECK_INTERVAL_SEC:
+        return False
+    _version_checked_at = now
+    version = _lexical_version()
+    return version is not None and version != _index_version
+
+
+def rebuild_lexical_index() -> BM25Index:
+    """Build a fresh index from the DB in the calling thread and install it."""
+
+    global _index, _index_version, _index_built_at
+
+    from apps.libros.models import Libro
+
+    started = time.monotonic()
+    # Read the version first: a write during the build leaves the result stale, not current.
+    version = _lexical_version()
+    rows = Libro.objects.values(*LEXICAL_FIELDS).iterator(chunk_size=2000)
+    index = build_index(rows)
+    with _index_lock:
+        _index, _index_version, _index_built_at = index, version, time.monotonic()
+    log_event("agent.lexical_index_built", documents=len(index), duration_ms=elapsed_ms(started))
+    return index
+
+
+def _rebuild_in_background() -> None:
+    try:
+        rebuild_lexical_index()
+    except Exception as e:
+        record_counter("agent.lexical_index_build_failed")
+        _logger.warning({"event": "agent.lexical_index_build_failed", "error": str(e)})
+    finally:
+        try:
+            from django.db import connections
+
+            connections.close_all()
+        except Exception:  # pragma: no cover
+            pass
+
+
+def _start_rebuild() -> None:
+    global _build_thread
+
+    with _index_lock:
+        if _build_thread is not None and _build_thread.is_alive():
+            return
+        _build_thread = threading.Thread(target=_rebuild_in_background, name="agent-lexical-index", daemon=True)
+        _build_thread.start()
+
+
+def get_lexical_index(*, wait: bool = False) -> Optional[BM25Index]:
+    """Return the process-wide index; None while its first build is still running.
+
+    A missing or stale index is (re)built in a background thread and the current
+    one keeps serving. `wait=True` builds in the calling thread instead (warm-up,
+    benchmarks).
+    """
+
+    if _index is not None and not _is_stale():
+        return _index
+    if wait:
+        return rebuild_lexical_index()
+    _start_rebuild()
+    return _index
+
+
+def lexical_index_if_built() -> Optional[BM25Index]:
+    return _index
+
+
+def reset_lexical_index(index: Optional[BM25Index] = None) -> None:
+    """Replace (or drop, with None) the process-wide index. Used by tests and rebuilds.
+
+    A given index counts as current for the lexical version at the time of the call.
+    """
+
+    global _index, _index_version, _index_built_at
+    version = _lexical_version() if index is not None else None
+    with _index_lock:
+        _index, _index_version, _index_built_at = index, version, time.monotonic()
+
+
+def index_libro(libro: Any) -> bool:
+    """Incremental update from a saved `Libro` (no-op until the index is built).
+
+    Returns whether other workers need to rebuild: False when the indexed text did not
+    change (stock/price saves), True when it did or there is no index to compare with.
+    """
+
+    index = _index
+    if index is None:
+        return True
+    return index.upsert(int(libro.pk), {name: getattr(libro, name, None) for name in LEXICAL_FIELDS if name != "id"})
+
+
+def unindex_libro(libro_id: int) -> None:
+    index = _index
+    if index is not None:
+        index.remove(int(libro_id))
+
+
+def publish_lexical_change() -> None:
+    """Bump the shared lexical version after this process changed its index (on commit).
+
+    The writer already applied the change, so it adopts the new version instead of
+    rebuilding, unless it had missed an earlier bump from another worker.
+    """
+
+    global _index_version
+
+    from .result_cache import bump_lexical_version
+
+    version = bump_lexical_version()
+    with _index_lock:
+        if version is not None and _index is not None and _index_version == version - 1:
+            _index_version = version
+
+
+__all__ = [
+    "LEXICAL_INDEX_TTL_SEC",
+    "BM25Index",
+    "build_index",
+    "get_lexical_index",
+    "index_libro",
+    "lexical_index_if_built",
+    "normalize_text",
+    "publish_lexical_change",
+    "rebuild_lexical_index",
+    "reset_lexical_index",
+    "tokenize",
+    "unindex_libro",
+]
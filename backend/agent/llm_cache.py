@@ -0,0 +1,97 @@
+"""Completion cache for the LLM `message` (Django cache framework, alias `agent_llm`).
+
+`build_llm_prompt` is deterministic for a given user message and retrieval result,
+so an identical prompt gets the stored answer instead of another (paid) LLM call.
+Keys hash (provider, model, base_url, max_tokens, prompt); the stored value is the
+post-guardrail message, so hits skip validation/coercion too. Fallback messages
+are never stored.
+
+The prompt embeds the retrieved rows (price, stock, ...), so catalog changes yield
+new keys by themselves; stale entries just expire via TTL.
+
+Only `OpenAICompatibleLLM` is cached (the stub is free and test doubles must see
+every call). Requests that bring their own key (BYO) bypass the cache unless
+`AGENT_LLM_CACHE_ALLOW_BYO=true`: their answers would be paid by one user and
+served to others.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+from typing import Any, Optional
+
+from .llm_factory import OpenAICompatibleLLM
+from .observability import record_counter
+
+LLM_CACHE_ALIAS = os.getenv("AGENT_LLM_CACHE_ALIAS", "agent_llm")
+LLM_CACHE_TTL_SEC = int(os.getenv("AGENT_LLM_CACHE_TTL_SEC", "600"))
+LLM_CACHE_ALLOW_BYO = os.getenv("AGENT_LLM_CACHE_ALLOW_BYO", "false").strip().lower() in {"1", "true", "yes", "on"}
+
+
+def _get_cache():
+    from django.conf import settings
+    from django.core.cache import caches
+
+    aliases = getattr(settings, "CACHES", {})
+    for alias in (LLM_CACHE_ALIAS, "agent"):
+        if alias in aliases:
+            return caches[alias]
+    return caches["default"]
+
+
+def llm_cache_enabled() -> bool:
+    return LLM_CACHE_TTL_SEC > 0
+
+
+def completion_key(runnable: OpenAICompatibleLLM, prompt: str) -> str:
+    config = runnable.config
+    raw = json.dumps(
+        [config.provider, config.model, config.base_url, config.max_tokens, prompt],
+        ensure_ascii=False,
+    )
+    return f"agent:llm:{hashlib.sha256(raw.encode('utf-8')).hexdigest()}"
+
+
+def lookup_completion(
+    runnable: Any, prompt: str, *, byo_api_key: Optional[str] = None
+) -> tuple[Optional[str], Optional[dict[str, Any]], Optional[str]]:
+    """Return (key for `store_completion`, cached entry or None, status for the trace).
+
+    status: "hit" | "miss" | "bypass" (BYO key), or None when the runnable is not cached.
+    """
+
+    if not llm_cache_enabled() or not isinstance(runnable, OpenAICompatibleLLM):
+        return None, None, None
+    if byo_api_key and not LLM_CACHE_ALLOW_BYO:
+        record_counter("agent.llm_cache_bypass")
+        return None, None, "bypass"
+    key = completion_key(runnable, prompt)
+    try:
+        entry = _get_cache().get(key)
+    except Exception:
+        return None, None, None
+    if not isinstance(entry, dict) or not entry.get("message"):
+        record_counter("agent.llm_cache_miss")
+        return key, None, "miss"
+    record_counter("agent.llm_cache_hit")
+    return key, entry, "hit"
+
+
+def store_completion(key: Optional[str], message: str, *, coerced: bool = False) -> None:
+    if key is None or not message:
+        return
+    try:
+        _get_cache().set(key, {"message": message, "coerced": coerced}, timeout=LLM_CACHE_TTL_SEC)
+    except Exception:
+        return
+
+
+__all__ = [
+    "LLM_CACHE_ALLOW_BYO",
+    "LLM_CACHE_TTL_SEC",
+    "completion_key",
+    "llm_cache_enabled",
+    "lookup_completion",
+    "store_completion",
+]
@@ -3,25 +3,60 @@
 Decisiones clave:
 - Selección de proveedor por variables de entorno (.env) con fallback seguro a stub.
 - Soporta BYO key opcional si `LLM_ALLOW_BYO_KEY=true` y el caller entrega la key.
-- Devuelve un "runnable" minimalista con `.invoke()` / `.ainvoke()` que entrega metadatos.
+- Devuelve un "runnable" minimalista con `.invoke()` / `.ainvoke()` que entrega metadatos,
+  y `.stream()` que entrega el texto por fragmentos a medida que llega.
+- Los clientes OpenAI-compatible se reutilizan entre requests (registro por proceso,
+  acotado y con expiración por inactividad) para mantener vivas las conexiones HTTP.
+  Al salir del registro se cierran sus pools httpx. El pool async se crea por event
+  loop, porque un `httpx.AsyncClient` no se puede compartir entre loops.
 """
 from __future__ import annotations
 
+import asyncio
+import hashlib
 import logging
 import os
+import re
+import threading
 import time
+import weakref
 from dataclasses import dataclass
-from typing import Any, Dict, Optional
+from typing import Any, Dict, Iterator, Optional
 
 from django.core.exceptions import ImproperlyConfigured
 
+from .cache import LRUCache
+from .observability import elapsed_ms, record_counter, record_timing
+
 try:
     from langchain_openai import ChatOpenAI
 except ImportError:  # pragma: no cover - se maneja en runtime
     ChatOpenAI = None
 
+try:
+    import httpx
+except ImportError:  # pragma: no cover - viene con openai/langchain_openai
+    httpx = None
+
 logger = logging.getLogger(__name__)
 
+# Registro de clientes por proceso: uno por (proveedor, base_url, modelo, hash de la key).
+# Acotado y con expiración por inactividad para que las keys BYO no se acumulen.
+LLM_CLIENT_CACHE_SIZE = int(os.getenv("LLM_CLIENT_CACHE_SIZE", "32"))
+LLM_CLIENT_IDLE_SEC = float(os.getenv("LLM_CLIENT_IDLE_SEC", "600"))
+LLM_KEEPALIVE_CONNECTIONS = int(os.getenv("LLM_KEEPALIVE_CONNECTIONS", "10"))
+
+
+def _retire_client(llm: Any) -> None:
+    # Una request que lo tomó justo antes de salir del registro puede seguir usándolo:
+    # se cierra cuando ya no puede quedar ninguna en curso (pasado su timeout).
+    timer = threading.Timer(max(float(llm.config.timeout_sec), 1.0), llm.close)
+    timer.daemon = True
+    timer.start()
+
+
+_clients = LRUCache(LLM_CLIENT_CACHE_SIZE, ttl_sec=LLM_CLIENT_IDLE_SEC, sliding=True, on_evict=_retire_client)
+
 
 @dataclass(frozen=True)
 class LLMConfig:
@@ -100,6 +135,10 @@ class StubLLM:
         # No async real; suficiente para tests/aserciones.
         return self.invoke(prompt, metadata=metadata)
 
+    def stream(self, prompt: str, *, metadata: Optional[Dict[str, Any]] = None) -> Iterator[str]:
+        # Palabra a palabra (con su espacio) para simular tokens.
+        yield from re.findall(r"\s*\S+", self.canned_response)
+
 
 class OpenAICompatibleLLM:
     """Cliente para endpoints OpenAI-compatible (OpenAI, vLLM, LM Studio, Ollama API).
@@ -114,14 +153,74 @@ class OpenAICompatibleLLM:
                 "Falta la dependencia 'langchain_openai'. Instala langchain_openai>=0.3.18 para usar LLM_PROVIDER=openai_compatible."
             )
         self.config = config
-        self._client = ChatOpenAI(
+        self._api_key = api_key
+        # Pool propio con keep-alive: el cliente vive en el registro, así que las
+        # conexiones (y el handshake TLS) se reutilizan entre requests.
+        self._http_client = httpx.Client(limits=self._limits(), timeout=config.timeout_sec) if httpx else None
+        self._client = self._chat_model(**({"http_client": self._http_client} if self._http_client else {}))
+        # Un httpx.AsyncClient queda atado al loop donde abrió sus conexiones: uno por loop,
+        # con clave id(loop) y una weakref al loop (el modelo y el cliente pueden referenciarlo,
+        # así que una WeakKeyDictionary no soltaría nunca la entrada).
+        self._async_clients: Dict[int, tuple[weakref.ref, Any, Any]] = {}
+        self._async_lock = threading.Lock()
+
+    @staticmethod
+    def _limits() -> Any:
+        return httpx.Limits(max_keepalive_connections=LLM_KEEPALIVE_CONNECTIONS, keepalive_expiry=60.0)
+
+    def _chat_model(self, **http_clients: Any) -> Any:
+        config = self.config
+        return ChatOpenAI(
             model=config.model,
-            api_key=api_key,
+            api_key=self._api_key,
             base_url=config.base_url or None,
             timeout=config.timeout_sec,
             max_tokens=config.max_tokens if config.max_tokens > 0 else None,
+            **http_clients,
         )
 
+    def _async_model(self) -> Any:
+        """Modelo con un `httpx.AsyncClient` propio del event loop en curso."""
+
+        loop = asyncio.get_running_loop()
+        with self._async_lock:
+            self._evict_closed_loops_locked()
+            entry = self._async_clients.get(id(loop))
+            # Un id() se puede reutilizar tras recolectar el loop: se confirma con la weakref.
+            if entry is None or entry[0]() is not loop:
+                http_async_client = (
+                    httpx.AsyncClient(limits=self._limits(), timeout=self.config.timeout_sec) if httpx else None
+                )
+                model = self._chat_model(**({"http_async_client": http_async_client} if http_async_client else {}))
+                entry = (weakref.ref(loop), model, http_async_client)
+                self._async_clients[id(loop)] = entry
+        return entry[1]
+
+    def _evict_closed_loops_locked(self) -> None:
+        # Un cliente de un loop cerrado ya no se puede cerrar con await: se suelta para el GC.
+        for key, (loop_ref, _, _) in list(self._async_clients.items()):
+            loop = loop_ref()
+            if loop is None or loop.is_closed():
+                del self._async_clients[key]
+
+    def close(self) -> None:
+        """Cierra los pools httpx (el síncrono ya; cada async en su propio loop)."""
+
+        if self._http_client is not None:
+            self._http_client.close()
+        with self._async_lock:
+            entries = list(self._async_clients.values())
+            self._async_clients.clear()
+        for loop_ref, _, http_async_client in entries:
+            loop = loop_ref()
+            # Con el loop cerrado (o recolectado) ya no se puede esperar su aclose().
+            if http_async_client is None or loop is None or loop.is_closed():
+                continue
+            try:
+                asyncio.run_coroutine_threadsafe(http_async_client.aclose(), loop)
+            except RuntimeError:
+                pass
+
     def _extract_usage(self, response: Any) -> tuple[Optional[int], Optional[int]]:
         usage = getattr(response, "usage_metadata", None)
         if isinstance(usage, dict):
@@ -152,9 +251,17 @@ class OpenAICompatibleLLM:
             "prompt": prompt,
         }
 
+    def stream(self, prompt: str, *, metadata: Optional[Dict[str, Any]] = None) -> Iterator[str]:
+        """Fragmentos de texto según llegan del endpoint; cerrar el generador corta la petición."""
+
+        for chunk in self._client.stream(prompt):
+            content = getattr(chunk, "content", None)
+            if isinstance(content, str) and content:
+                yield content
+
     async def ainvoke(self, prompt: str, *, metadata: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
         start = time.perf_counter()
-        response = await self._client.ainvoke(prompt)
+        response = await self._async_model().ainvoke(prompt)
         latency_ms = int((time.perf_counter() - start) * 1000)
         content = getattr(response, "content", None) or ""
         prompt_tokens, completion_tokens = self._extract_usage(response)
@@ -171,6 +278,37 @@ class OpenAICompatibleLLM:
         }
 
 
+def _client_key(config: LLMConfig, api_key: str) -> tuple:
+    key_hash = hashlib.sha256(api_key.encode("utf-8")).hexdigest()
+    return (config.provider, config.base_url, config.model, config.timeout_sec, config.max_tokens, key_hash)
+
+
+def get_openai_compatible_llm(config: LLMConfig, api_key: str) -> OpenAICompatibleLLM:
+    """`OpenAICompatibleLLM` reutilizado del registro del proceso (lo crea si no existe o expiró)."""
+
+    key = _client_key(config, api_key)
+    llm = _clients.get(key)
+    if llm is not None:
+        record_counter("agent.llm_client_reused")
+        return llm
+    started = time.monotonic()
+    llm = OpenAICompatibleLLM(config, api_key=api_key)
+    _clients.set(key, llm)
+    record_counter("agent.llm_client_created")
+    record_timing("agent.llm_client_build_ms", elapsed_ms(started))
+    return llm
+
+
+def clear_llm_clients() -> None:
+    """Vacía el registro; los clientes se cierran pasado su timeout (ver `_retire_client`)."""
+
+    _clients.clear()
+
+
+def llm_client_stats() -> Dict[str, Any]:
+    return {"cached": len(_clients), "max_size": LLM_CLIENT_CACHE_SIZE, "idle_sec": LLM_CLIENT_IDLE_SEC}
+
+
 def build_llm_runnable(*, byo_api_key: Optional[str] = None) -> Any:
     """Factory principal.
 
@@ -210,7 +348,7 @@ def build_llm_runnable(*, byo_api_key: Optional[str] = None) -> Any:
         logger.warning("No hay LLM_API_KEY configurada; se usará StubLLM como fallback.")
         return StubLLM(config, canned_response="LLM sin API key: respondiendo en modo stub.")
 
-    return OpenAICompatibleLLM(config, api_key=selected_key)
+    return get_openai_compatible_llm(config, api_key=selected_key)
 
 
 __all__ = [
@@ -219,4 +357,7 @@ __all__ = [
     "build_llm_runnable",
     "StubLLM",
     "OpenAICompatibleLLM",
+    "clear_llm_clients",
+    "get_openai_compatible_llm",
+    "llm_client_stats",
 ]
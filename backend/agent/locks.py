@@ -0,0 +1,52 @@
+"""Cross-process advisory file locks (`fcntl.flock`) for artifacts shared by workers.
+
+Gunicorn/uvicorn workers are separate processes, so a `threading.Lock` does not
+serialize their writes to the vector artifact or the manifest. `file_lock` takes
+an exclusive (or shared) `flock` on a `.lock` file next to the artifact. flock
+locks belong to the open file, so threads of one process also exclude each other.
+Where `fcntl` is missing (Windows) it falls back to an in-process lock per path.
+"""
+from __future__ import annotations
+
+import os
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None  # type: ignore[assignment]
+
+_fallback_locks: dict[str, threading.Lock] = {}
+_fallback_guard = threading.Lock()
+
+
+@contextmanager
+def file_lock(path: Path, *, shared: bool = False) -> Iterator[None]:
+    """Hold an advisory lock on `path` (created if missing) for the `with` block."""
+
+    if fcntl is None:  # pragma: no cover - Windows
+        with _fallback_guard:
+            lock = _fallback_locks.setdefault(str(path), threading.Lock())
+        with lock:
+            yield
+        return
+
+    try:
+        fd = os.open(str(path), os.O_RDWR | os.O_CREAT, 0o644)
+    except OSError:
+        if not shared:
+            raise
+        # Read-only artifact directory: nobody can be writing to it either.
+        yield
+        return
+    try:
+        fcntl.flock(fd, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+        yield
+    finally:
+        os.close(fd)  # releases the flock
+
+
+__all__ = ["file_lock"]
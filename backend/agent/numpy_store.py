@@ -0,0 +1,561 @@
+"""In-process vector index backed by NumPy (alternative to Chroma).
+
+Layout on disk (inside VECTOR_DB_DIR):
+- `<collection>.npy`: float32 matrix (N x D) of unit-normalized embeddings.
+- `<collection>.jsonl`: one line per row with `id`, `document` and `metadata`.
+
+The matrix is opened memory-mapped, so every worker shares the OS page cache
+instead of holding its own copy. `NumpyCollection.query` mimics the subset of the
+Chroma collection API that `agent.retrieval` and `agent.indexing` use (`query`,
+`get`, `upsert`, `delete`), so callers do not need to know which backend is active.
+Search is exact unless an IVF-flat index (`agent.ivf`) is attached, in which case
+unfiltered queries only scan the `nprobe` closest clusters.
+
+Incremental writes (`upsert`/`delete`) of a collection loaded from disk are appended
+to `<collection>.delta.jsonl` instead of rewriting the base files; loading replays
+the delta on top of them. Every worker process writes under an exclusive
+`<collection>.lock` (`agent.locks.file_lock`) after catching up with rows the others
+appended, so no write is lost, and `query`/`get` pick up other workers' writes
+(one `stat` per call when nothing changed). After AGENT_NUMPY_DELTA_MAX_ROWS delta
+rows the writer folds the delta into new base files. The first line of the delta
+holds a token naming the base files it applies to; a rebuild or fold writes a new
+token, which tells the other processes to reload from scratch.
+"""
+from __future__ import annotations
+
+import itertools
+import json
+import os
+import threading
+import uuid
+from pathlib import Path
+from typing import Any, Callable, Iterable, Optional, Sequence
+
+import numpy as np
+
+from .locks import file_lock
+
+EmbeddingFn = Callable[[list[str]], Any]
+# (matrix, ids, documents, metadatas, ann)
+CollectionState = tuple[np.ndarray, list[str], list[Optional[str]], list[Optional[dict[str, Any]]], Any]
+
+NUMPY_DELTA_MAX_ROWS = int(os.getenv("AGENT_NUMPY_DELTA_MAX_ROWS", "1000"))
+
+
+def matrix_path(db_dir: Path, collection: str) -> Path:
+    return db_dir / f"{collection}.npy"
+
+
+def sidecar_path(db_dir: Path, collection: str) -> Path:
+    return db_dir / f"{collection}.jsonl"
+
+
+def delta_path(db_dir: Path, collection: str) -> Path:
+    return db_dir / f"{collection}.delta.jsonl"
+
+
+def lock_path(db_dir: Path, collection: str) -> Path:
+    return db_dir / f"{collection}.lock"
+
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def top_k_indices(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the `k` highest scores, best first (O(N) partition + O(k log k) sort)."""
+
+    n = scores.shape[0]
+    if k <= 0 or n == 0:
+        return np.empty(0, dtype=np.int64)
+    if k >= n:
+        return np.argsort(-scores, kind="stable")
+    part = np.argpartition(-scores, k - 1)[:k]
+    return part[np.argsort(-scores[part], kind="stable")]
+
+
+_COMPARATORS: dict[str, Callable[[Any, Any], bool]] = {
+    "$eq": lambda a, b: a == b,
+    "$ne": lambda a, b: a != b,
+    "$gt": lambda a, b: a is not None and a > b,
+    "$gte": lambda a, b: a is not None and a >= b,
+    "$lt": lambda a, b: a is not None and a < b,
+    "$lte": lambda a, b: a is not None and a <= b,
+    "$in": lambda a, b: a in b,
+    "$nin": lambda a, b: a not in b,
+}
+
+
+def matches_where(metadata: Optional[dict[str, Any]], where: dict[str, Any]) -> bool:
+    """Evaluate a Chroma-style `where` clause against one metadata dict."""
+
+    metadata = metadata or {}
+    for key, condition in where.items():
+        if key == "$and":
+            if not all(matches_where(metadata, clause) for clause in condition):
+                return False
+        elif key == "$or":
+            if not any(matches_where(metadata, clause) for clause in condition):
+                return False
+        elif isinstance(condition, dict):
+            value = metadata.get(key)
+            for op, operand in condition.items():
+                try:
+                    if not _COMPARATORS[op](value, operand):
+                        return False
+                except TypeError:
+                    return False
+        elif metadata.get(key) != condition:
+            return False
+    return True
+
+
+def _upserted(
+    state: CollectionState,
+    ids: Sequence[str],
+    vectors: np.ndarray,
+    documents: Sequence[Optional[str]],
+    metadatas: Sequence[Optional[dict[str, Any]]],
+) -> CollectionState:
+    """New state with the rows written (`vectors` unit-normalized); `state` is not modified."""
+
+    matrix, all_ids, all_documents, all_metadatas, ann = state
+    last = {row_id: j for j, row_id in enumerate(ids)}  # repeated id: last write wins
+    position = {row_id: i for i, row_id in enumerate(all_ids)}
+    replaced = [(position[row_id], j) for row_id, j in last.items() if row_id in position]
+    appended = [j for row_id, j in last.items() if row_id not in position]
+
+    # Metadata-only updates (e.g. stock) keep the current matrix; otherwise write a copy,
+    # since the loaded matrix is a read-only memory map that queries may be scanning.
+    if appended or any(not np.allclose(matrix[i], vectors[j], atol=1e-6) for i, j in replaced):
+        base = np.asarray(matrix, dtype=np.float32) if matrix.size else np.empty((0, vectors.shape[1]), dtype=np.float32)
+        matrix = np.vstack([base, vectors[appended]]) if appended else base.copy()
+        for i, j in replaced:
+            matrix[i] = vectors[j]
+
+    all_ids, all_documents, all_metadatas = list(all_ids), list(all_documents), list(all_metadatas)
+    for i, j in replaced:
+        all_documents[i] = documents[j]
+        all_metadatas[i] = metadatas[j]
+    changed_rows = [i for i, _ in replaced] + list(range(len(all_ids), len(all_ids) + len(appended)))
+    for j in appended:
+        all_ids.append(ids[j])
+        all_documents.append(documents[j])
+        all_metadatas.append(metadatas[j])
+
+    if ann is not None:
+        # Keep the trained centroids; (re)assign only the written rows.
+        assignments = np.resize(ann.assignments, len(all_ids))
+        assignments[changed_rows] = ann.assign(vectors[[j for _, j in replaced] + appended])
+        ann = ann.with_assignments(assignments)
+    return matrix, all_ids, all_documents, all_metadatas, ann
+
+
+def _deleted(state: CollectionState, ids: Iterable[str]) -> Optional[CollectionState]:
+    """New state without `ids`, or None when none of them is present."""
+
+    drop = set(ids)
+    matrix, all_ids, all_documents, all_metadatas, ann = state
+    keep = [i for i, row_id in enumerate(all_ids) if row_id not in drop]
+    if len(keep) == len(all_ids):
+        return None
+    return (
+        np.asarray(matrix)[keep],
+        [all_ids[i] for i in keep],
+        [all_documents[i] for i in keep],
+        [all_metadatas[i] for i in keep],
+        ann.with_assignments(ann.assignments[keep]) if ann is not None else None,
+    )
+
+
+def _replay(state: CollectionState, records: list[dict[str, Any]]) -> CollectionState:
+    """Apply delta records in order, one batch per run of the same op."""
+
+    for op, group in itertools.groupby(records, key=lambda record: record.get("op")):
+        batch = list(group)
+        if op == "upsert":
+            state = _upserted(
+                state,
+                [str(record["id"]) for record in batch],
+                np.asarray([record["embedding"] for record in batch], dtype=np.float32),
+                [record.get("document") for record in batch],
+                [record.get("metadata") for record in batch],
+            )
+        elif op == "delete":
+            state = _deleted(state, [str(record["id"]) for record in batch]) or state
+    return state
+
+
+def _read_delta(db_dir: Path, name: str, offset: int = 0) -> tuple[Optional[str], list[dict[str, Any]], int]:
+    """(token, records after byte `offset`, offset past the last complete line).
+
+    A torn last line (writer died mid-append) is left out and re-read next time.
+    """
+
+    try:
+        with delta_path(db_dir, name).open("rb") as f:
+            header = f.readline()
+            start = max(offset, len(header))
+            f.seek(start)
+            data = f.read()
+    except FileNotFoundError:
+        return None, [], 0
+    token = json.loads(header).get("token") if header.endswith(b"\n") else None
+    end = data.rfind(b"\n") + 1
+    records = [json.loads(line) for line in data[:end].splitlines() if line.strip()]
+    return token, records, start + end
+
+
+def _delta_stat(db_dir: Path, name: str) -> Optional[tuple[int, int, int]]:
+    try:
+        st = os.stat(delta_path(db_dir, name))
+    except FileNotFoundError:
+        return None
+    return st.st_ino, st.st_size, st.st_mtime_ns
+
+
+def reset_delta(db_dir: Path, name: str) -> str:
+    """Start an empty delta with a new token (after the base files were rewritten)."""
+
+    token = uuid.uuid4().hex
+    target = delta_path(db_dir, name)
+    tmp = target.with_name(target.name + ".tmp")
+    tmp.write_text(json.dumps({"token": token}) + "\n", encoding="utf-8")
+    os.replace(tmp, target)
+    return token
+
+
+def _read_collection(db_dir: Path, name: str, *, mmap: bool, ann: str) -> tuple[CollectionState, Optional[str], int, int]:
+    """Base files plus the replayed delta: (state, token, delta offset, delta rows)."""
+
+    embeddings = np.load(matrix_path(db_dir, name), mmap_mode="r" if mmap else None)
+    ids: list[str] = []
+    documents: list[Optional[str]] = []
+    metadatas: list[Optional[dict[str, Any]]] = []
+    with sidecar_path(db_dir, name).open("r", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            row = json.loads(line)
+            ids.append(str(row["id"]))
+            documents.append(row.get("document"))
+            metadatas.append(row.get("metadata"))
+    ivf = None
+    if ann == "ivf_flat":
+        from .ivf import IVFFlatIndex, ivf_path
+
+        ivf = IVFFlatIndex.load(ivf_path(db_dir, name))
+        if ivf.assignments.shape[0] != len(ids):
+            raise ValueError("IVF index does not match the collection; rebuild it")
+    token, records, offset = _read_delta(db_dir, name)
+    state = _replay((embeddings, ids, documents, metadatas, ivf), records)
+    return state, token, offset, len(records)
+
+
+class NumpyCollection:
+    """Exact (brute-force) cosine search over a unit-normalized embedding matrix."""
+
+    def __init__(
+        self,
+        name: str,
+        embeddings: np.ndarray,
+        ids: Sequence[str],
+        documents: Sequence[Optional[str]],
+        metadatas: Sequence[Optional[dict[str, Any]]],
+        *,
+        embedding_function: Optional[EmbeddingFn] = None,
+        ann: Any = None,
+        nprobe: int = 8,
+    ) -> None:
+        if embeddings.ndim != 2 or embeddings.shape[0] != len(ids):
+            raise ValueError("Embedding matrix shape does not match the number of ids")
+        self.name = name
+        # (matrix, ids, documents, metadatas, ann) is swapped as one tuple so concurrent
+        # queries never see a matrix and an id list from different versions.
+        self._state = (embeddings, list(ids), list(documents), list(metadatas), ann)
+        self.nprobe = nprobe
+        self._embedding_function = embedding_function
+        self.db_dir: Optional[Path] = None
+        self._write_lock = threading.Lock()
+        self._load_options: dict[str, Any] = {"mmap": True, "ann": "exact"}
+        # Delta file as last read: token, byte offset, row count and stat() for the fast path.
+        self._delta_token: Optional[str] = None
+        self._delta_offset = 0
+        self._delta_rows = 0
+        self._delta_seen: Optional[tuple[int, int, int]] = None
+
+    @classmethod
+    def load(
+        cls,
+        db_dir: Path,
+        name: str,
+        *,
+        embedding_function: Optional[EmbeddingFn] = None,
+        mmap: bool = True,
+        ann: str = "exact",
+        nprobe: int = 8,
+    ) -> "NumpyCollection":
+        """Open a persisted collection (base files + delta); `ann='ivf_flat'` also loads `<name>.ivf.npz`."""
+
+        with file_lock(lock_path(db_dir, name), shared=True):
+            seen = _delta_stat(db_dir, name)
+            state, token, offset, rows = _read_collection(db_dir, name, mmap=mmap, ann=ann)
+        collection = cls(name, *state[:4], embedding_function=embedding_function, ann=state[4], nprobe=nprobe)
+        collection.db_dir = db_dir
+        collection._load_options = {"mmap": mmap, "ann": ann}
+        collection._delta_token, collection._delta_offset, collection._delta_rows = token, offset, rows
+        collection._delta_seen = seen
+        return collection
+
+    def count(self) -> int:
+        return len(self._state[1])
+
+    def _embed(self, texts: list[str]) -> np.ndarray:
+        if self._embedding_function is None:
+            raise ValueError("query_texts given but the collection has no embedding function")
+        return np.asarray(self._embedding_function(texts), dtype=np.float32)
+
+    def query(
+        self,
+        query_texts: Optional[list[str]] = None,
+        query_embeddings: Optional[Any] = None,
+        n_results: int = 10,
+        where: Optional[dict[str, Any]] = None,
+        include: Iterable[str] = ("documents", "metadatas", "distances"),
+    ) -> dict[str, Any]:
+        if query_embeddings is None:
+            if not query_texts:
+                raise ValueError("query_texts or query_embeddings is required")
+            queries = self._embed(list(query_texts))
+        else:
+            queries = np.asarray(query_embeddings, dtype=np.float32)
+        self.refresh()
+        if queries.ndim == 1:
+            queries = queries.reshape(1, -1)
+        queries = normalize_rows(queries)
+
+        include_set = set(include)
+        embeddings, ids, documents, metadatas, ann = self._state
+        if ann is not None and not where:
+            return self._query_ann(ann, queries, int(n_results), include_set)
+        rows: Optional[np.ndarray] = None
+        if where:
+            # Pre-filter: only matching rows are scored, so k results survive selective filters.
+            rows = np.asarray([i for i, meta in enumerate(metadatas) if matches_where(meta, where)], dtype=np.int64)
+            embeddings = np.asarray(embeddings)[rows]
+        # One BLAS call for the whole batch: (N x D) @ (D x B) -> (N x B).
+        if embeddings.shape[0]:
+            scores = np.asarray(embeddings @ queries.T)
+        else:
+            scores = np.empty((0, len(queries)))
+
+        out: dict[str, Any] = {"ids": [], "documents": [], "metadatas": [], "distances": []}
+        for col in range(queries.shape[0]):
+            column = scores[:, col]
+            local = top_k_indices(column, int(n_results))
+            top = rows[local] if rows is not None else local
+            out["ids"].append([ids[i] for i in top])
+            if "documents" in include_set:
+                out["documents"].append([documents[i] for i in top])
+            if "metadatas" in include_set:
+                out["metadatas"].append([metadatas[i] for i in top])
+            if "distances" in include_set:
+                # Cosine distance: rows and queries are unit vectors, so 1 - dot.
+                out["distances"].append([float(1.0 - column[i]) for i in local])
+        return out
+
+    def _query_ann(self, ann: Any, queries: np.ndarray, k: int, include_set: set[str]) -> dict[str, Any]:
+        embeddings, ids, documents, metadatas, _ = self._state
+        out: dict[str, Any] = {"ids": [], "documents": [], "metadatas": [], "distances": []}
+        for query in queries:
+            top, scores = ann.search(embeddings, query, k, self.nprobe)
+            out["ids"].append([ids[i] for i in top])
+            if "documents" in include_set:
+                out["documents"].append([documents[i] for i in top])
+            if "metadatas" in include_set:
+                out["metadatas"].append([metadatas[i] for i in top])
+            if "distances" in include_set:
+                out["distances"].append([float(1.0 - score) for score in scores])
+        return out
+
+    def get(
+        self,
+        ids: Optional[Sequence[str]] = None,
+        include: Iterable[str] = ("documents", "metadatas"),
+    ) -> dict[str, Any]:
+        """Rows by id (unknown ids are skipped), flat lists like Chroma's `get`."""
+
+        self.refresh()
+        embeddings, all_ids, documents, metadatas, _ = self._state
+        if ids is None:
+            rows = list(range(len(all_ids)))
+        else:
+            position = {row_id: i for i, row_id in enumerate(all_ids)}
+            rows = [position[row_id] for row_id in ids if row_id in position]
+
+        include_set = set(include)
+        out: dict[str, Any] = {"ids": [all_ids[i] for i in rows]}
+        if "documents" in include_set:
+            out["documents"] = [documents[i] for i in rows]
+        if "metadatas" in include_set:
+            out["metadatas"] = [metadatas[i] for i in rows]
+        if "embeddings" in include_set:
+            out["embeddings"] = [np.asarray(embeddings[i]).tolist() for i in rows]
+        return out
+
+    def upsert(
+        self,
+        ids: Sequence[str],
+        embeddings: Any,
+        documents: Optional[Sequence[Optional[str]]] = None,
+        metadatas: Optional[Sequence[Optional[dict[str, Any]]]] = None,
+    ) -> None:
+        if not ids:
+            return
+        vectors = normalize_rows(np.asarray(embeddings, dtype=np.float32).reshape(len(ids), -1))
+        documents = documents if documents is not None else [None] * len(ids)
+        metadatas = metadatas if metadatas is not None else [None] * len(ids)
+        records = [
+            {"op": "upsert", "id": row_id, "document": documents[j], "metadata": metadatas[j], "embedding": vectors[j].tolist()}
+            for j, row_id in enumerate(ids)
+        ]
+        self._write(lambda state: _upserted(state, list(ids), vectors, documents, metadatas), records)
+
+    def delete(self, ids: Sequence[str]) -> None:
+        if not ids:
+            return
+        self._write(lambda state: _deleted(state, ids), [{"op": "delete", "id": row_id} for row_id in ids])
+
+    def refresh(self) -> bool:
+        """Apply rows other processes wrote since this copy last read the files."""
+
+        if self.db_dir is None or _delta_stat(self.db_dir, self.name) == self._delta_seen:
+            return False
+        with self._write_lock, file_lock(lock_path(self.db_dir, self.name), shared=True):
+            return self._catch_up()
+
+    def _catch_up(self) -> bool:
+        # Caller holds `_write_lock` and the file lock (shared or exclusive).
+        assert self.db_dir is not None
+        seen = _delta_stat(self.db_dir, self.name)
+        if seen == self._delta_seen:
+            return False
+        token, records, offset = _read_delta(self.db_dir, self.name, self._delta_offset)
+        if token is not None and token == self._delta_token:
+            self._state = _replay(self._state, records)
+            self._delta_offset, self._delta_rows = offset, self._delta_rows + len(records)
+        elif matrix_path(self.db_dir, self.name).exists():
+            # Base files were rewritten (fold or rebuild): reload from scratch.
+            self._state, self._delta_token, self._delta_offset, self._delta_rows = _read_collection(
+                self.db_dir, self.name, **self._load_options
+            )
+        self._delta_seen = seen
+        return True
+
+    def _write(self, apply: Callable[[CollectionState], Optional[CollectionState]], records: list[dict[str, Any]]) -> None:
+        with self._write_lock:
+            if self.db_dir is None:
+                self._state = apply(self._state) or self._state
+                return
+            with file_lock(lock_path(self.db_dir, self.name)):
+                self._catch_up()
+                state = apply(self._state)
+                if state is None:
+                    return
+                if (
+                    self._delta_token is None
+                    or self._delta_rows + len(records) > NUMPY_DELTA_MAX_ROWS
+                    or not matrix_path(self.db_dir, self.name).exists()
+                ):
+                    self._fold(state)
+                else:
+                    self._append_delta(records)
+                self._state = state
+
+    def _append_delta(self, records: list[dict[str, Any]]) -> None:
+        assert self.db_dir is not None
+        payload = "".join(json.dumps(record, ensure_ascii=False) + "\n" for record in records)
+        with delta_path(self.db_dir, self.name).open("ab") as f:
+            f.write(payload.encode("utf-8"))
+            self._delta_offset = f.tell()
+        self._delta_rows += len(records)
+        self._delta_seen = _delta_stat(self.db_dir, self.name)
+
+    def _fold(self, state: CollectionState) -> None:
+        """Rewrite the base files from `state` and start an empty delta."""
+
+        assert self.db_dir is not None
+        matrix, ids, documents, metadatas, ann = state
+        self._delta_token = _write_files(
+            self.db_dir, self.name, ids=ids, embeddings=matrix, documents=documents, metadatas=metadatas
+        )
+        if ann is not None:
+            from .ivf import ivf_path
+
+            ann.save(ivf_path(self.db_dir, self.name))
+        self._delta_offset = delta_path(self.db_dir, self.name).stat().st_size
+        self._delta_rows = 0
+        self._delta_seen = _delta_stat(self.db_dir, self.name)
+
+
+def write_numpy_collection(
+    db_dir: Path,
+    name: str,
+    *,
+    ids: Sequence[str],
+    embeddings: Any,
+    documents: Sequence[Optional[str]],
+    metadatas: Sequence[Optional[dict[str, Any]]],
+) -> None:
+    """Persist a collection atomically (write to temp files, then rename); drops any delta."""
+
+    db_dir.mkdir(parents=True, exist_ok=True)
+    with file_lock(lock_path(db_dir, name)):
+        _write_files(db_dir, name, ids=ids, embeddings=embeddings, documents=documents, metadatas=metadatas)
+
+
+def _write_files(
+    db_dir: Path,
+    name: str,
+    *,
+    ids: Sequence[str],
+    embeddings: Any,
+    documents: Sequence[Optional[str]],
+    metadatas: Sequence[Optional[dict[str, Any]]],
+) -> str:
+    """Write base files + an empty delta (caller holds the file lock); returns the delta token."""
+
+    matrix = normalize_rows(np.asarray(embeddings, dtype=np.float32))
+    if matrix.ndim != 2 or matrix.shape[0] != len(ids):
+        raise ValueError("Embedding matrix shape does not match the number of ids")
+
+    npy_target = matrix_path(db_dir, name)
+    jsonl_target = sidecar_path(db_dir, name)
+    npy_tmp = npy_target.with_name(npy_target.name + ".tmp")
+    jsonl_tmp = jsonl_target.with_name(jsonl_target.name + ".tmp")
+
+    with npy_tmp.open("wb") as f:
+        np.save(f, matrix)
+    with jsonl_tmp.open("w", encoding="utf-8") as f:
+        for idx, row_id in enumerate(ids):
+            row = {"id": str(row_id), "document": documents[idx], "metadata": metadatas[idx]}
+            f.write(json.dumps(row, ensure_ascii=False) + "\n")
+
+    os.replace(jsonl_tmp, jsonl_target)
+    os.replace(npy_tmp, npy_target)
+    return reset_delta(db_dir, name)
+
+
+__all__ = [
+    "NUMPY_DELTA_MAX_ROWS",
+    "NumpyCollection",
+    "delta_path",
+    "lock_path",
+    "matches_where",
+    "normalize_rows",
+    "reset_delta",
+    "top_k_indices",
+    "write_numpy_collection",
+]
@@ -1,11 +1,51 @@
+"""Prompt del LLM: instrucciones, few-shots, mensaje del usuario y contexto de búsqueda.
+
+El contexto es compacto y con presupuesto de tokens (`compact_context`): una línea
+JSON por resultado con solo los campos útiles para redactar (sin `distance`/`score`
+ni valores vacíos), y descripciones recortadas para que el prompt completo no
+supere `PromptConfig.max_prompt_tokens` (por defecto `LLM_PROMPT_MAX_TOKENS`, o
+`LLM_PROMPT_BUDGET_RATIO` × `LLM_MAX_TOKENS`). Si ni sin descripciones entra,
+se descartan los últimos resultados (siempre queda al menos uno).
+
+Los tokens se estiman (`estimate_tokens`, ~4 caracteres por token): sirve para
+presupuestar y comparar, no para facturar.
+"""
 from __future__ import annotations
 
 import json
+import math
+import os
 from dataclasses import dataclass
-from typing import Any
+from typing import Any, Optional
 
+from .observability import truncate_text
 from .retrieval import RetrievalResult
 
+CHARS_PER_TOKEN = 4
+# Campos que el modelo usa para redactar; el resto (distance, score, metadata...) no viaja.
+CONTEXT_FIELDS = (
+    "libro_id",
+    "titulo",
+    "autor",
+    "isbn",
+    "precio",
+    "stock",
+    "categoria",
+    "editorial",
+    "año_publicacion",
+    "descripcion",
+)
+MIN_DESCRIPTION_CHARS = 40
+
+
+def _prompt_budget_from_env() -> int:
+    explicit = int(os.getenv("LLM_PROMPT_MAX_TOKENS", "0") or 0)
+    if explicit > 0:
+        return explicit
+    max_tokens = int(os.getenv("LLM_MAX_TOKENS", "512") or 512)
+    ratio = float(os.getenv("LLM_PROMPT_BUDGET_RATIO", "2") or 2)
+    return max(256, int(max_tokens * ratio))
+
 
 @dataclass(frozen=True)
 class PromptConfig:
@@ -13,6 +53,53 @@ class PromptConfig:
     max_bullets: int = 5
     min_bullets: int = 2
     max_chars: int = 800
+    max_results: int = 5
+    max_prompt_tokens: Optional[int] = None  # None = desde el entorno al construir
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimación barata (sin tokenizer): ~4 caracteres por token."""
+
+    return math.ceil(len(text or "") / CHARS_PER_TOKEN)
+
+
+def _compact_row(row: dict[str, Any], description_chars: int) -> dict[str, Any]:
+    out: dict[str, Any] = {}
+    for field in CONTEXT_FIELDS:
+        value = row.get(field)
+        if value is None or value == "":
+            continue
+        if field == "descripcion":
+            if description_chars < MIN_DESCRIPTION_CHARS:
+                continue
+            value = truncate_text(value, max_len=description_chars)
+        out[field] = value
+    return out
+
+
+def _dumps(value: Any) -> str:
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"), default=str)
+
+
+def compact_context(retrieval: RetrievalResult, *, budget_tokens: int, max_results: int = 5) -> str:
+    """Contexto de búsqueda en <= `budget_tokens` (estimados): cabecera + una línea JSON por resultado."""
+
+    header = _dumps({"query": retrieval.query, "degraded": retrieval.degraded, "source": retrieval.source})
+    results = list(retrieval.results[:max_results])
+    budget_chars = max(0, budget_tokens) * CHARS_PER_TOKEN - len(header) - 1
+
+    bare = [_dumps(_compact_row(row, 0)) for row in results]
+    while len(bare) > 1 and sum(len(line) + 1 for line in bare) > budget_chars:
+        bare.pop()
+        results.pop()
+
+    # Lo que sobra se reparte en partes iguales entre las descripciones.
+    spare = budget_chars - sum(len(line) + 1 for line in bare)
+    with_description = [row for row in results if row.get("descripcion")]
+    # ~20 caracteres por el escape/clave `"descripcion":"…"` de cada fila.
+    per_row = spare // len(with_description) - 20 if with_description else 0
+    lines = [_dumps(_compact_row(row, per_row)) for row in results]
+    return "\n".join([header, *lines])
 
 
 def _instruction_block(cfg: PromptConfig) -> str:
@@ -45,25 +132,20 @@ def _few_shots() -> str:
 
 def build_llm_prompt(*, user_message: str, retrieval: RetrievalResult, config: PromptConfig | None = None) -> str:
     cfg = config or PromptConfig()
+    budget = cfg.max_prompt_tokens if cfg.max_prompt_tokens is not None else _prompt_budget_from_env()
 
-    safe_results = retrieval.results[:5]
-    context = {
-        "query": retrieval.query,
-        "degraded": retrieval.degraded,
-        "source": retrieval.source,
-        "results": safe_results,
-    }
-
-    return (
+    head = (
         _instruction_block(cfg)
         + "\n"
         + _few_shots()
         + "\nMensaje del usuario:\n"
         + user_message
-        + "\n\nContexto de búsqueda (JSON):\n"
-        + json.dumps(context, ensure_ascii=False)
-        + "\n"
+        + "\n\nContexto de búsqueda (una línea JSON por resultado):\n"
+    )
+    context = compact_context(
+        retrieval, budget_tokens=budget - estimate_tokens(head), max_results=cfg.max_results
     )
+    return head + context + "\n"
 
 
-__all__ = ["PromptConfig", "build_llm_prompt"]
+__all__ = ["PromptConfig", "build_llm_prompt", "compact_context", "estimate_tokens"]
@@ -0,0 +1,129 @@
+"""Versioned cache for `search_catalog` results (Django cache framework).
+
+Keys embed a catalog version counter. Any write to `Libro`/`Categoria` bumps the
+counter (see `apps.libros.signals`), which orphans every older entry at once, so
+stock and price changes are never served stale. Orphans simply expire via TTL.
+
+A second counter, the lexical version, only moves when the text indexed by the BM25
+index changes (`agent.lexical_index`), so stock/price writes do not make every
+worker rebuild it.
+
+Note: the counters live in the same cache backend. With several workers, point the
+`agent` cache alias to a shared backend (Redis/Memcached/DB) so every worker sees
+the same version; LocMemCache is per-process.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+from typing import Any, Optional
+
+from .observability import record_counter
+
+CACHE_ALIAS = os.getenv("AGENT_RESULT_CACHE_ALIAS", "agent")
+RESULT_CACHE_TTL_SEC = int(os.getenv("AGENT_RESULT_CACHE_TTL_SEC", "300"))
+CATALOG_VERSION_KEY = "agent:catalog_version"
+LEXICAL_VERSION_KEY = "agent:lexical_version"
+
+_logger = logging.getLogger("agent")
+
+
+def _get_cache():
+    from django.conf import settings
+    from django.core.cache import caches
+
+    alias = CACHE_ALIAS if CACHE_ALIAS in getattr(settings, "CACHES", {}) else "default"
+    return caches[alias]
+
+
+def result_cache_enabled() -> bool:
+    return RESULT_CACHE_TTL_SEC > 0
+
+
+def _get_version(key: str) -> int:
+    cache = _get_cache()
+    # add() is a no-op when the key exists, so concurrent first readers agree on 1.
+    cache.add(key, 1, timeout=None)
+    return int(cache.get(key) or 1)
+
+
+def _bump_version(key: str, event: str) -> Optional[int]:
+    try:
+        cache = _get_cache()
+        try:
+            version = int(cache.incr(key))
+        except ValueError:
+            # Key missing (evicted or never read): start a fresh version.
+            version = 2
+            cache.set(key, version, timeout=None)
+        record_counter(f"{event}_bump")
+        return version
+    except Exception as e:  # pragma: no cover - cache outages must not break writes
+        _logger.warning({"event": f"{event}_bump_failed", "error": str(e)})
+        return None
+
+
+def get_catalog_version() -> int:
+    return _get_version(CATALOG_VERSION_KEY)
+
+
+def bump_catalog_version() -> None:
+    """Invalidate every cached result (called on catalog writes). Never raises."""
+
+    _bump_version(CATALOG_VERSION_KEY, "agent.catalog_version")
+
+
+def get_lexical_version() -> int:
+    return _get_version(LEXICAL_VERSION_KEY)
+
+
+def bump_lexical_version() -> Optional[int]:
+    """Mark the indexed catalog text as changed. Returns the new version (None on cache errors)."""
+
+    return _bump_version(LEXICAL_VERSION_KEY, "agent.lexical_version")
+
+
+def _make_key(version: int, parts: dict[str, Any]) -> str:
+    raw = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+    digest = hashlib.sha1(raw.encode("utf-8")).hexdigest()
+    return f"agent:search:v{version}:{digest}"
+
+
+def get_cached(parts: dict[str, Any]) -> tuple[Optional[int], Optional[dict[str, Any]]]:
+    """Return (catalog version, cached payload or None).
+
+    Pass the returned version back to `set_cached`, so a result computed while a
+    write bumped the catalog is stored under the old (already orphaned) version.
+    """
+
+    if not result_cache_enabled():
+        return None, None
+    try:
+        version = get_catalog_version()
+        payload = _get_cache().get(_make_key(version, parts))
+    except Exception:
+        return None, None
+    record_counter("agent.result_cache_hit" if payload is not None else "agent.result_cache_miss")
+    return version, payload
+
+
+def set_cached(version: Optional[int], parts: dict[str, Any], payload: dict[str, Any]) -> None:
+    if version is None or not result_cache_enabled():
+        return
+    try:
+        _get_cache().set(_make_key(version, parts), payload, timeout=RESULT_CACHE_TTL_SEC)
+    except Exception:
+        return
+
+
+__all__ = [
+    "bump_catalog_version",
+    "bump_lexical_version",
+    "get_cached",
+    "get_catalog_version",
+    "get_lexical_version",
+    "result_cache_enabled",
+    "set_cached",
+]
@@ -1,37 +1,133 @@
 from __future__ import annotations
 
-from dataclasses import dataclass
+import asyncio
+import os
+import re
+import time
+from dataclasses import asdict, dataclass, replace
 from typing import Any, Callable, Optional
 
-from .vector_store import VectorStoreUnavailable, get_chroma_collection
+from .cache import LRUCache
+from .circuit_breaker import CircuitBreaker
+from .hydration import fetch_libro_rows, hydrate_results, result_libro_id, rows_from_queryset
+from .lexical_index import BM25Index, get_lexical_index, normalize_text
+from .observability import elapsed_ms, log_event, record_counter, record_timing
+from .result_cache import get_cached, get_catalog_version, set_cached
+from .semantic_cache import (
+    SEMANTIC_CACHE_SHADOW_THRESHOLDS,
+    SEMANTIC_CACHE_SIZE,
+    SEMANTIC_CACHE_THRESHOLD,
+    SemanticCache,
+)
+from .vector_store import (
+    VectorStoreUnavailable,
+    get_embedding_function,
+    get_vector_collection,
+    load_vector_store_config,
+)
+from .warmup import vector_warming_up
+
+EMBEDDING_CACHE_SIZE = int(os.getenv("AGENT_EMBEDDING_CACHE_SIZE", "2048"))
+# 'vector' (vector with ORM fallback) | 'hybrid' (BM25 + vector fused by RRF).
+DEFAULT_RETRIEVAL_MODE = (os.getenv("AGENT_RETRIEVAL_MODE", "vector") or "vector").strip().lower()
+LEXICAL_INDEX_ENABLED = (os.getenv("AGENT_LEXICAL_INDEX", "true") or "true").strip().lower() not in {"0", "false", "no"}
+RRF_K = 60
+# Vector store circuit breaker: open after N consecutive failures/slow calls, probe after the cool-down.
+VECTOR_BREAKER = CircuitBreaker(
+    "vector_store",
+    failure_threshold=int(os.getenv("AGENT_VECTOR_BREAKER_FAILURES", "5")),
+    cooldown_sec=float(os.getenv("AGENT_VECTOR_BREAKER_COOLDOWN_SEC", "30")),
+    latency_budget_ms=int(os.getenv("AGENT_VECTOR_BREAKER_LATENCY_MS", "0")),
+)
+# search_catalog_async: how long the vector leg may hold the answer once ORM rows exist (0 = no limit).
+RETRIEVAL_BUDGET_MS = int(os.getenv("AGENT_RETRIEVAL_BUDGET_MS", "0"))
+# Filters `build_where` can express as metadata conditions.
+FILTER_KEYS = frozenset({"categoria", "editorial", "precio_min", "precio_max", "disponible", "q"})
+
+# (embedding model, normalized query) -> float32 vector.
+_embedding_cache = LRUCache(EMBEDDING_CACHE_SIZE)
+# Paraphrased queries -> vector hits of a similar earlier query (opt-in, see agent.semantic_cache).
+_semantic_cache = SemanticCache(
+    SEMANTIC_CACHE_SIZE,
+    threshold=SEMANTIC_CACHE_THRESHOLD,
+    shadow_thresholds=SEMANTIC_CACHE_SHADOW_THRESHOLDS,
+)
 
 
 @dataclass(frozen=True)
 class RetrievalResult:
     query: str
     k: int
-    source: str  # 'vector' | 'orm'
+    source: str  # 'vector' | 'orm' | 'hybrid'
     degraded: bool
     results: list[dict[str, Any]]
     warnings: list[str]
+    # search_catalog_async only: which leg answered and per-leg timings (never cached).
+    race: Optional[dict[str, Any]] = None
 
 
 def _clean_query(query: Optional[str]) -> str:
     return (query or "").strip()
 
 
-def _search_vector(query: str, k: int) -> list[dict[str, Any]]:
-    collection = get_chroma_collection()
-    resp = collection.query(
-        query_texts=[query],
-        n_results=k,
-        include=["documents", "metadatas", "distances"],
-    )
+def _normalize_for_cache(text: str) -> str:
+    return re.sub(r"\s+", " ", text).strip().casefold()
+
+
+def embed_queries(queries: list[str]) -> list[Any]:
+    """Embed queries through the process-wide LRU cache.
+
+    Cache misses are embedded together in a single encoder call. Returns one float32
+    vector per query, in input order.
+    """
+
+    import numpy as np
+
+    cfg = load_vector_store_config()
+    model_name = cfg.embedding_model or ""
+    keys = [(model_name, _normalize_for_cache(q)) for q in queries]
+
+    vectors: list[Any] = [None] * len(queries)
+    missing: dict[tuple[str, str], list[int]] = {}
+    for idx, key in enumerate(keys):
+        cached = _embedding_cache.get(key)
+        if cached is not None:
+            vectors[idx] = cached
+        else:
+            missing.setdefault(key, []).append(idx)
+
+    # Repeats inside the same batch are embedded once, so they count as hits.
+    hits = len(queries) - len(missing)
+    if hits:
+        record_counter("agent.embedding_cache_hit", hits)
 
-    ids = (resp.get("ids") or [[]])[0]
-    documents = (resp.get("documents") or [[]])[0]
-    metadatas = (resp.get("metadatas") or [[]])[0]
-    distances = (resp.get("distances") or [[]])[0]
+    if missing:
+        record_counter("agent.embedding_cache_miss", len(missing))
+        embedding_fn = get_embedding_function(cfg)
+        texts = [queries[idxs[0]] for idxs in missing.values()]
+        for key, embedded in zip(missing.keys(), embedding_fn(texts)):
+            vector = np.asarray(embedded, dtype=np.float32)
+            _embedding_cache.set(key, vector)
+            for idx in missing[key]:
+                vectors[idx] = vector
+
+    return vectors
+
+
+def clear_embedding_cache() -> None:
+    _embedding_cache.clear()
+    _semantic_cache.clear()
+
+
+def _rows_from_response(resp: dict[str, Any], position: int) -> list[dict[str, Any]]:
+    def _column(name: str) -> list[Any]:
+        values = resp.get(name) or []
+        return values[position] if position < len(values) and values[position] is not None else []
+
+    ids = _column("ids")
+    documents = _column("documents")
+    metadatas = _column("metadatas")
+    distances = _column("distances")
 
     out: list[dict[str, Any]] = []
     for idx in range(len(ids)):
@@ -47,44 +143,312 @@ def _search_vector(query: str, k: int) -> list[dict[str, Any]]:
     return out
 
 
+def _search_vector(query: str, k: int, *, where: Optional[dict[str, Any]] = None) -> list[dict[str, Any]]:
+    if where is None and _semantic_cache.enabled:
+        return _search_vector_semantic(query, k)
+    return _search_vector_many([query], k, where=where)[0]
+
+
+def _search_vector_semantic(query: str, k: int) -> list[dict[str, Any]]:
+    """Unfiltered vector search that first checks the semantic cache for a paraphrase."""
+
+    def search() -> list[dict[str, Any]]:
+        get_vector_collection()  # fail fast on a missing artifact, before loading the encoder
+        embedding = embed_queries([query])[0]
+        namespace = (load_vector_store_config().embedding_model, get_catalog_version())
+        hits = _semantic_cache.lookup(embedding, k, namespace=namespace)
+        if hits is None:
+            hits = _query_vector_store([query], k, embeddings=[embedding])[0]
+            _semantic_cache.add(embedding, k, hits, namespace=namespace)
+        return hits
+
+    return VECTOR_BREAKER.call(search)
+
+
+def _search_vector_many(
+    queries: list[str], k: int, *, where: Optional[dict[str, Any]] = None
+) -> list[list[dict[str, Any]]]:
+    """One batched embedding call and one multi-query collection request.
+
+    Runs through `VECTOR_BREAKER`: while the circuit is open this raises
+    `CircuitOpenError` (a `VectorStoreUnavailable`) without opening the store.
+    """
+
+    return VECTOR_BREAKER.call(_query_vector_store, queries, k, where=where)
+
+
+def _query_vector_store(
+    queries: list[str],
+    k: int,
+    *,
+    where: Optional[dict[str, Any]] = None,
+    embeddings: Optional[list[Any]] = None,
+) -> list[list[dict[str, Any]]]:
+    collection = get_vector_collection()
+    query_embeddings = embeddings if embeddings is not None else embed_queries(queries)
+    kwargs: dict[str, Any] = {"where": where} if where else {}
+    resp = collection.query(
+        query_embeddings=[embedding.tolist() for embedding in query_embeddings],
+        n_results=k,
+        include=["documents", "metadatas", "distances"],
+        **kwargs,
+    )
+    return [_rows_from_response(resp, position) for position in range(len(queries))]
+
+
+def build_where(filters: dict[str, Any]) -> Optional[dict[str, Any]]:
+    """Translate `tool_filter_catalog` filters into a collection `where` clause.
+
+    Only category and editorial go into the clause (`categoria_key`, `editorial_key`,
+    written by `agent.indexing.libro_to_document`). Price and stock change between
+    syncs, so their index metadata can be stale; `live_filter` checks them against
+    the hydrated rows instead. Returns None when there is nothing to put in the
+    clause; raises ValueError for filters that cannot be expressed at all (e.g.
+    `autor` substring match), so callers fall back to ORM.
+    """
+
+    unsupported = sorted(key for key, value in filters.items() if value not in (None, "") and key not in FILTER_KEYS)
+    if unsupported:
+        raise ValueError(f"Unsupported vector filters: {', '.join(unsupported)}")
+
+    clauses: list[dict[str, Any]] = []
+    categoria = filters.get("categoria")
+    if categoria:
+        if isinstance(categoria, int) or str(categoria).isdigit():
+            clauses.append({"categoria_id": int(categoria)})
+        else:
+            clauses.append({"categoria_key": normalize_text(categoria)})
+
+    editorial = filters.get("editorial")
+    if editorial:
+        clauses.append({"editorial_key": normalize_text(editorial)})
+
+    if not clauses:
+        return None
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+
+def live_filter(filters: dict[str, Any]) -> Optional[Callable[[dict[str, Any]], bool]]:
+    """Predicate for the price/stock filters over hydrated rows, or None without them.
+
+    Raises ValueError for a non-numeric price bound.
+    """
+
+    checks: list[Callable[[dict[str, Any]], bool]] = []
+    for key, in_range in (("precio_min", lambda price, bound: price >= bound), ("precio_max", lambda price, bound: price <= bound)):
+        value = filters.get(key)
+        if value is not None and str(value).strip() != "":
+            bound = float(value)
+            checks.append(
+                lambda row, bound=bound, in_range=in_range: row.get("precio") is not None
+                and in_range(float(row["precio"]), bound)
+            )
+
+    disponible = filters.get("disponible")
+    if isinstance(disponible, bool):
+        checks.append(lambda row: ((row.get("stock") or 0) > 0) == disponible)
+
+    if not checks:
+        return None
+    return lambda row: all(check(row) for check in checks)
+
+
+def search_vector_filtered(query: str, filters: dict[str, Any], k: int) -> list[dict[str, Any]]:
+    """Single filtered ANN query, hydrated to the flat `Libro` row schema.
+
+    Price/stock filters are applied to the live rows, over a wider candidate set
+    (`max(k * 4, 20)`) so k results usually survive them.
+
+    Raises ValueError (filters not expressible), VectorStoreUnavailable, or whatever
+    the collection raises; the caller owns the fallback.
+    """
+
+    where = build_where(filters)
+    live = live_filter(filters)
+    if where is None and live is None:
+        raise ValueError("No vector-expressible filters")
+    fetch_k = max(k * 4, 20) if live is not None else k
+    results, _ = _hydrate(_search_vector(query, fetch_k, where=where))
+    if live is not None:
+        results = [row for row in results if live(row)]
+    return results[:k]
+
+
+def _search_vector_warming_up(query: str, k: int) -> list[dict[str, Any]]:
+    raise VectorStoreUnavailable("Vector store warming up; using keyword search.")
+
+
 def _search_orm(query: str, k: int) -> list[dict[str, Any]]:
     # Lazy import so agent retrieval remains usable in unit tests without Django setup.
-    from django.db.models import Q
-
     from apps.libros.models import Libro
+    from apps.libros.search import fuzzy_search_libros, search_libros
 
-    qs = (
-        Libro.objects.all()
-        .filter(
-            Q(titulo__icontains=query)
-            | Q(autor__icontains=query)
-            | Q(isbn__icontains=query)
-            | Q(descripcion__icontains=query)
-            | Q(editorial__icontains=query)
-        )
-        .order_by("titulo")
-    )
+    qs, ranked = search_libros(Libro.objects.all(), query)
+    qs = qs.order_by("-rank", "titulo") if ranked else qs.order_by("titulo")
+    rows = rows_from_queryset(qs, limit=k)
+    if rows:
+        return rows
 
-    results: list[dict[str, Any]] = []
-    for libro in qs[:k]:
-        results.append(
-            {
-                "libro_id": libro.id,
-                "titulo": libro.titulo,
-                "autor": libro.autor,
-                "isbn": libro.isbn,
-                "precio": str(libro.precio) if getattr(libro, "precio", None) is not None else None,
-                "categoria": libro.categoria.nombre if getattr(libro, "categoria", None) else None,
-                "stock": libro.stock,
-                "editorial": getattr(libro, "editorial", None),
-                "año_publicacion": getattr(libro, "año_publicacion", None),
-                "descripcion": getattr(libro, "descripcion", None),
-            }
+    # Nothing matched as typed: retry tolerating typos ("Garcia Marques") before giving up.
+    qs, ranked = fuzzy_search_libros(Libro.objects.all(), query)
+    if not ranked:
+        return rows
+    rows = rows_from_queryset(qs.order_by("-rank", "titulo"), limit=k)
+    if rows:
+        record_counter("agent.orm_fuzzy_fallback")
+    return rows
+
+
+def _fetch_libros(libro_ids: list[int]) -> dict[int, dict[str, Any]]:
+    return fetch_libro_rows(libro_ids)
+
+
+def _hydrate(hits: list[dict[str, Any]]) -> tuple[list[dict[str, Any]], list[str]]:
+    return hydrate_results(hits, fetch_fn=_fetch_libros)
+
+
+def _prefetch_libros(hits: list[dict[str, Any]]) -> Callable[[list[int]], dict[int, dict[str, Any]]]:
+    """One row query for every hit of a batch; returns a `fetch_fn` serving from it."""
+
+    try:
+        rows: Optional[dict[int, dict[str, Any]]] = _fetch_libros(
+            [libro_id for libro_id in map(result_libro_id, hits) if libro_id is not None]
         )
+        error: Optional[Exception] = None
+    except Exception as e:
+        rows, error = None, e
+
+    def fetch(libro_ids: list[int]) -> dict[int, dict[str, Any]]:
+        if rows is None:
+            raise error  # type: ignore[misc]  # hydrate_results falls back to the snapshot
+        return rows
+
+    return fetch
+
 
+def _search_lexical(query: str, k: int) -> list[dict[str, Any]]:
+    """BM25 over the in-memory index; rows are fetched by primary key (no table scan)."""
+
+    index = get_lexical_index()
+    if index is None:
+        return []  # first build still running in the background
+    hits = index.search(query, k)
+    rows = _fetch_libros([libro_id for libro_id, _ in hits])
+    results: list[dict[str, Any]] = []
+    for libro_id, score in hits:
+        row = rows.get(libro_id)
+        if row is not None:
+            results.append({**row, "score": round(score, 4)})
     return results
 
 
+def _search_keyword(query: str, k: int) -> list[dict[str, Any]]:
+    """Default keyword fallback: BM25 index first, `icontains` scan only when it has no hit."""
+
+    if LEXICAL_INDEX_ENABLED:
+        try:
+            results = _search_lexical(query, k)
+        except Exception:
+            results = []
+        if results:
+            return results
+    return _search_orm(query, k)
+
+
+def reciprocal_rank_fusion(rankings: list[list[int]], *, k: int = RRF_K) -> list[tuple[int, float]]:
+    """Fuse ranked id lists: score(d) = sum(1 / (k + rank)), rank starting at 1."""
+
+    scores: dict[int, float] = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, start=1):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+
+
+def _search_hybrid(
+    query: str,
+    k: int,
+    warnings: list[str],
+    vector_search_fn: Callable[[str, int], list[dict[str, Any]]],
+) -> RetrievalResult:
+    index = get_lexical_index()
+    if index is None:
+        # First build still running in the background: rank on vector hits alone.
+        record_counter("agent.retrieval_hybrid_lexical_pending")
+        index = BM25Index()
+
+    exact = index.exact_match(query)
+    if exact:
+        # Exact ISBN / author: the lexical answer is authoritative, skip embeddings.
+        record_counter("agent.retrieval_hybrid_exact")
+        rows = _fetch_libros(exact[:k])
+        results = [rows[libro_id] for libro_id in exact[:k] if libro_id in rows]
+        return RetrievalResult(query=query, k=k, source="hybrid", degraded=False, results=results, warnings=warnings)
+
+    fetch_k = max(k * 4, 20)
+    lexical_ranking = [libro_id for libro_id, _ in index.search(query, fetch_k)]
+
+    degraded = False
+    distances: dict[int, Any] = {}
+    vector_ranking: list[int] = []
+    try:
+        for hit in vector_search_fn(query, fetch_k):
+            libro_id = result_libro_id(hit)
+            if libro_id is not None and libro_id not in distances:
+                distances[libro_id] = hit.get("distance")
+                vector_ranking.append(libro_id)
+    except VectorStoreUnavailable as e:
+        warnings.append(str(e))
+        degraded = True
+    except Exception as e:
+        warnings.append(f"Vector search failed: {e}")
+        degraded = True
+
+    fused = reciprocal_rank_fusion([lexical_ranking, vector_ranking])[:k]
+    rows = _fetch_libros([libro_id for libro_id, _ in fused])
+    results: list[dict[str, Any]] = []
+    for libro_id, score in fused:
+        row = rows.get(libro_id)
+        if row is None:
+            continue
+        item = {**row, "score": round(score, 6)}
+        if libro_id in distances:
+            item["distance"] = distances[libro_id]
+        results.append(item)
+
+    return RetrievalResult(query=query, k=k, source="hybrid", degraded=degraded, results=results, warnings=warnings)
+
+
+def _normalize_k(k: Any, warnings: list[str]) -> int:
+    try:
+        k_int = int(k)
+    except Exception:
+        k_int = 5
+        warnings.append("Invalid 'k' value; defaulted to 5")
+
+    if k_int <= 0:
+        k_int = 5
+        warnings.append("Non-positive 'k' value; defaulted to 5")
+    return k_int
+
+
+def _empty_query_result(k: int, prefer_vector: bool) -> RetrievalResult:
+    return RetrievalResult(
+        query="",
+        k=k,
+        source="orm" if not prefer_vector else "vector",
+        degraded=True,
+        results=[],
+        warnings=["Empty query"],
+    )
+
+
+def _cache_parts(
+    cleaned: str, k: int, prefer_vector: bool, warnings: list[str], mode: str = "vector"
+) -> dict[str, Any]:
+    return {"q": cleaned, "k": k, "prefer_vector": bool(prefer_vector), "warnings": list(warnings), "mode": mode}
+
+
 def search_catalog(
     query: Optional[str],
     *,
@@ -92,55 +456,73 @@ def search_catalog(
     prefer_vector: bool = True,
     vector_search_fn: Optional[Callable[[str, int], list[dict[str, Any]]]] = None,
     orm_search_fn: Optional[Callable[[str, int], list[dict[str, Any]]]] = None,
+    use_cache: bool = True,
+    mode: Optional[str] = None,
 ) -> RetrievalResult:
     """Stable retrieval helper for the book catalog.
 
-    - Tries vector search (Chroma) if available.
-    - Falls back to ORM keyword search when vector search is unavailable.
+    - Tries vector search (Chroma or the NumPy index, per manifest) if available.
+    - Falls back to keyword search (BM25 index, then ORM) when vector search is unavailable.
+    - `mode='hybrid'` (or AGENT_RETRIEVAL_MODE=hybrid) fuses BM25 and vector hits by
+      reciprocal-rank fusion; exact ISBN/author queries skip embeddings entirely.
 
     Returns a stable contract via RetrievalResult, including:
-    - source: 'vector' or 'orm'
+    - source: 'vector', 'orm' or 'hybrid'
     - degraded: True when we had to fall back (or vector was intentionally skipped)
     - warnings: human-readable info useful for UI/debugging
+
+    Results of the default search paths are cached per catalog version
+    (see agent.result_cache); `use_cache=False` forces a fresh search.
     """
 
     cleaned = _clean_query(query)
     warnings: list[str] = []
-
-    try:
-        k_int = int(k)
-    except Exception:
-        k_int = 5
-        warnings.append("Invalid 'k' value; defaulted to 5")
-
-    if k_int <= 0:
-        k_int = 5
-        warnings.append("Non-positive 'k' value; defaulted to 5")
+    k_int = _normalize_k(k, warnings)
 
     if cleaned == "":
-        return RetrievalResult(
-            query="",
-            k=k_int,
-            source="orm" if not prefer_vector else "vector",
-            degraded=True,
-            results=[],
-            warnings=["Empty query"],
-        )
+        return _empty_query_result(k_int, prefer_vector)
+
+    # Only the default search paths are cached; injected fns (tests, tools) bypass it.
+    cacheable = use_cache and vector_search_fn is None and orm_search_fn is None
+    resolved_mode = (mode or DEFAULT_RETRIEVAL_MODE).strip().lower()
+    cache_parts = _cache_parts(cleaned, k_int, prefer_vector, warnings, resolved_mode)
+    cache_version: Optional[int] = None
+    if cacheable:
+        cache_version, cached = get_cached(cache_parts)
+        if cached is not None:
+            return RetrievalResult(**cached)
 
+    if vector_search_fn is None and vector_warming_up():
+        # Do not block the request on the model load; degraded results are not cached.
+        vector_search_fn = _search_vector_warming_up
     vector_search_fn = vector_search_fn or _search_vector
-    orm_search_fn = orm_search_fn or _search_orm
+    orm_search_fn = orm_search_fn or _search_keyword
+
+    if prefer_vector and resolved_mode == "hybrid":
+        try:
+            result = _search_hybrid(cleaned, k_int, list(warnings), vector_search_fn)
+        except Exception as e:
+            # Lexical index unavailable (e.g. no DB): continue with the plain vector path.
+            warnings.append(f"Hybrid search failed: {e}")
+        else:
+            if cacheable and not result.degraded:
+                set_cached(cache_version, cache_parts, asdict(result))
+            return result
 
     if prefer_vector:
         try:
-            results = vector_search_fn(cleaned, k_int)
-            return RetrievalResult(
+            results, hydration_warnings = _hydrate(vector_search_fn(cleaned, k_int))
+            result = RetrievalResult(
                 query=cleaned,
                 k=k_int,
                 source="vector",
                 degraded=False,
                 results=results,
-                warnings=warnings,
+                warnings=warnings + hydration_warnings,
             )
+            if cacheable and not hydration_warnings:
+                set_cached(cache_version, cache_parts, asdict(result))
+            return result
         except VectorStoreUnavailable as e:
             warnings.append(str(e))
         except Exception as e:
@@ -149,7 +531,7 @@ def search_catalog(
     # Fallback ORM
     try:
         results = orm_search_fn(cleaned, k_int)
-        return RetrievalResult(
+        result = RetrievalResult(
             query=cleaned,
             k=k_int,
             source="orm",
@@ -157,6 +539,10 @@ def search_catalog(
             results=results,
             warnings=warnings,
         )
+        # A fallback caused by a vector failure is not cached: it would outlive the outage.
+        if cacheable and not prefer_vector:
+            set_cached(cache_version, cache_parts, asdict(result))
+        return result
     except Exception as e:
         warnings.append(f"ORM search failed: {e}")
         return RetrievalResult(
@@ -167,3 +553,277 @@ def search_catalog(
             results=[],
             warnings=warnings,
         )
+
+
+def search_catalog_many(
+    queries: list[Optional[str]],
+    *,
+    k: int = 5,
+    prefer_vector: bool = True,
+    use_cache: bool = True,
+) -> list[RetrievalResult]:
+    """Batch variant of `search_catalog` (same contract, one result per query, same order).
+
+    Cache misses are embedded in a single encoder call and sent as one multi-query
+    request to the collection. If vector search is unavailable, every pending query
+    falls back to ORM individually.
+    """
+
+    shared_warnings: list[str] = []
+    k_int = _normalize_k(k, shared_warnings)
+
+    out: list[Optional[RetrievalResult]] = [None] * len(queries)
+    pending: list[tuple[int, str, Optional[int]]] = []  # (position, cleaned query, cache version)
+
+    for position, query in enumerate(queries):
+        cleaned = _clean_query(query)
+        if cleaned == "":
+            out[position] = _empty_query_result(k_int, prefer_vector)
+            continue
+        version: Optional[int] = None
+        if use_cache:
+            version, cached = get_cached(_cache_parts(cleaned, k_int, prefer_vector, shared_warnings))
+            if cached is not None:
+                out[position] = RetrievalResult(**cached)
+                continue
+        pending.append((position, cleaned, version))
+
+    vector_error: Optional[str] = None
+    if pending and prefer_vector and vector_warming_up():
+        vector_error = "Vector store warming up; using keyword search."
+    elif pending and prefer_vector:
+        try:
+            batches = _search_vector_many([cleaned for _, cleaned, _ in pending], k_int)
+            fetch_batch = _prefetch_libros([hit for hits in batches for hit in hits])
+            for (position, cleaned, version), hits in zip(pending, batches):
+                # Per query, so a deleted book only drops its own hit.
+                results, hydration_warnings = hydrate_results(hits, fetch_fn=fetch_batch)
+                result = RetrievalResult(
+                    query=cleaned,
+                    k=k_int,
+                    source="vector",
+                    degraded=False,
+                    results=results,
+                    warnings=list(shared_warnings) + hydration_warnings,
+                )
+                if use_cache and not hydration_warnings:
+                    set_cached(version, _cache_parts(cleaned, k_int, prefer_vector, shared_warnings), asdict(result))
+                out[position] = result
+            pending = []
+        except VectorStoreUnavailable as e:
+            vector_error = str(e)
+        except Exception as e:
+            vector_error = f"Vector search failed: {e}"
+
+    for position, cleaned, version in pending:
+        warnings = list(shared_warnings)
+        if vector_error:
+            warnings.append(vector_error)
+        try:
+            results = _search_keyword(cleaned, k_int)
+        except Exception as e:
+            warnings.append(f"ORM search failed: {e}")
+            results = []
+        result = RetrievalResult(
+            query=cleaned,
+            k=k_int,
+            source="orm",
+            degraded=True,
+            results=results,
+            warnings=warnings,
+        )
+        if use_cache and not prefer_vector and len(warnings) == len(shared_warnings):
+            set_cached(version, _cache_parts(cleaned, k_int, prefer_vector, shared_warnings), asdict(result))
+        out[position] = result
+
+    return [result for result in out if result is not None]
+
+
+def _call_closing_connections(fn: Callable[..., Any], *args: Any) -> Any:
+    """Run `fn` in a pool thread and close the DB connection it opened there."""
+
+    try:
+        return fn(*args)
+    finally:
+        from django.db import connections
+
+        connections.close_all()
+
+
+def _discard_outcome(task: asyncio.Task) -> None:
+    # Losing legs are abandoned, not awaited; read their exception so asyncio does not log it.
+    if not task.cancelled():
+        task.exception()
+
+
+async def search_catalog_async(
+    query: Optional[str],
+    *,
+    k: int = 5,
+    prefer_vector: bool = True,
+    budget_ms: Optional[int] = None,
+    vector_search_fn: Optional[Callable[[str, int], list[dict[str, Any]]]] = None,
+    orm_search_fn: Optional[Callable[[str, int], list[dict[str, Any]]]] = None,
+    use_cache: bool = True,
+    mode: Optional[str] = None,
+) -> RetrievalResult:
+    """`search_catalog` for ASGI callers: vector and keyword retrieval race under a budget.
+
+    The vector leg starts first and has `budget_ms` (default AGENT_RETRIEVAL_BUDGET_MS;
+    0 waits for it) to answer on its own. The keyword leg only starts once the budget
+    expires or the vector leg fails, and from then on the first leg to succeed is
+    returned. So a vector answer within budget costs one search, and a slow encoder
+    costs at most the budget plus the keyword search. If hydrating a vector win fails,
+    the keyword answer is used instead.
+
+    Each leg runs in its own pool thread; the keyword leg opens (and closes) its own
+    DB connection, so hydrating a vector win on Django's DB thread never queues behind
+    it. The winner and leg timings are returned in `RetrievalResult.race`. Hybrid mode
+    and `prefer_vector=False` have nothing to race and run `search_catalog` as is.
+    """
+
+    from asgiref.sync import sync_to_async
+
+    cleaned = _clean_query(query)
+    warnings: list[str] = []
+    k_int = _normalize_k(k, warnings)
+    if cleaned == "":
+        return _empty_query_result(k_int, prefer_vector)
+
+    resolved_mode = (mode or DEFAULT_RETRIEVAL_MODE).strip().lower()
+    if not prefer_vector or resolved_mode == "hybrid":
+        return await sync_to_async(search_catalog)(
+            cleaned,
+            k=k_int,
+            prefer_vector=prefer_vector,
+            vector_search_fn=vector_search_fn,
+            orm_search_fn=orm_search_fn,
+            use_cache=use_cache,
+            mode=mode,
+        )
+
+    cacheable = use_cache and vector_search_fn is None and orm_search_fn is None
+    cache_parts = _cache_parts(cleaned, k_int, prefer_vector, warnings, resolved_mode)
+    cache_version: Optional[int] = None
+    if cacheable:
+        cache_version, cached = await sync_to_async(get_cached)(cache_parts)
+        if cached is not None:
+            return RetrievalResult(**cached)
+
+    if vector_search_fn is None and vector_warming_up():
+        vector_search_fn = _search_vector_warming_up
+    vector_search_fn = vector_search_fn or _search_vector
+    orm_search_fn = orm_search_fn or _search_keyword
+    budget = RETRIEVAL_BUDGET_MS if budget_ms is None else int(budget_ms)
+
+    started = time.monotonic()
+    legs_ms: dict[str, Optional[int]] = {"vector": None, "orm": None}
+
+    async def timed(name: str, call: Any) -> list[dict[str, Any]]:
+        try:
+            return await call
+        finally:
+            legs_ms[name] = elapsed_ms(started)
+
+    vector_task = asyncio.ensure_future(timed("vector", asyncio.to_thread(vector_search_fn, cleaned, k_int)))
+    orm_task: Optional[asyncio.Future] = None
+
+    def start_orm() -> asyncio.Future:
+        nonlocal orm_task
+        if orm_task is None or orm_task.cancelled():
+            orm_task = asyncio.ensure_future(
+                timed("orm", asyncio.to_thread(_call_closing_connections, orm_search_fn, cleaned, k_int))
+            )
+        return orm_task
+
+    def leg_failed(task: asyncio.Future) -> None:
+        error = task.exception()
+        if isinstance(error, VectorStoreUnavailable):
+            warnings.append(str(error))
+        else:
+            warnings.append(f"{'Vector' if task is vector_task else 'ORM'} search failed: {error}")
+
+    await asyncio.wait({vector_task}, timeout=budget / 1000.0 if budget > 0 else None)
+    if not vector_task.done():
+        warnings.append(f"Vector search exceeded the {budget} ms budget; using the first available result.")
+    if not vector_task.done() or vector_task.exception() is not None:
+        start_orm()
+
+    winner: Optional[asyncio.Future] = None
+    pending = {task for task in (vector_task, orm_task) if task is not None}
+    while winner is None and pending:
+        # The vector leg goes first in each round so it wins ties with the ORM leg.
+        for task in [t for t in (vector_task, orm_task) if t in pending and t.done()]:
+            pending.discard(task)
+            if task.exception() is None:
+                winner = task
+                break
+            leg_failed(task)
+            if task is vector_task and orm_task is None:
+                pending.add(start_orm())
+        if winner is None and pending:
+            await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+
+    def cancel_pending() -> None:
+        for task in pending:
+            task.add_done_callback(_discard_outcome)
+            task.cancel()
+        pending.clear()
+
+    result: Optional[RetrievalResult] = None
+    if winner is vector_task:
+        try:
+            results, hydration_warnings = await sync_to_async(_hydrate)(vector_task.result())
+        except Exception as e:
+            # Rows unreadable: answer with the keyword leg, which is still running if it was
+            # racing (it is only cancelled once hydration succeeds) and started now otherwise.
+            pending.discard(orm_task)
+            warnings.append(f"Vector hydration failed: {e}")
+            record_counter("agent.retrieval_race_hydration_failed")
+            winner = start_orm()
+            try:
+                await winner
+            except Exception:
+                leg_failed(winner)
+                winner = None
+        else:
+            result = RetrievalResult(
+                query=cleaned,
+                k=k_int,
+                source="vector",
+                degraded=False,
+                results=results,
+                warnings=warnings + hydration_warnings,
+            )
+            cancel_pending()
+            if cacheable and not hydration_warnings and len(warnings) == len(cache_parts["warnings"]):
+                await sync_to_async(set_cached)(cache_version, cache_parts, asdict(result))
+
+    cancel_pending()
+    won = "vector" if result is not None else "orm" if winner is not None else "none"
+    race = {"winner": won, "budget_ms": budget, "legs_ms": dict(legs_ms), "total_ms": elapsed_ms(started)}
+    record_counter(f"agent.retrieval_race_{won}")
+    record_timing("agent.retrieval_race_ms", race["total_ms"])
+    log_event("agent.retrieval_race", **race)
+
+    if result is not None:
+        return replace(result, race=race)
+
+    # The ORM answer is never cached here: it stands in for a slow or failed vector leg.
+    return RetrievalResult(
+        query=cleaned,
+        k=k_int,
+        source="orm",
+        degraded=True,
+        results=winner.result() if winner is not None else [],
+        warnings=warnings,
+        race=race,
+    )
+
+
+def search_catalog_raced(query: Optional[str], **kwargs: Any) -> RetrievalResult:
+    """Sync entry point to `search_catalog_async` (WSGI views, the sync handler)."""
+
+    from asgiref.sync import async_to_sync
+
+    return async_to_sync(search_catalog_async)(query, **kwargs)
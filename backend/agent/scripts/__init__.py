@@ -0,0 +1 @@
+"""Reproducible scripts for the agent feature (benchmarks, maintenance)."""
@@ -0,0 +1,105 @@
+"""Benchmark: IVF-flat approximate search vs exact NumPy search (recall@k, p50/p99).
+
+Builds one IVF index per `--nlist` value and sweeps `--nprobe` over it; every
+setting is compared against the exact top-k of the same collection. Vectors are
+synthetic and clustered (uniform random vectors have no structure for IVF to
+exploit), or an existing artifact is used via `--db-dir` with queries sampled
+from its own rows.
+
+Usage (from backend/):
+    python -m agent.scripts.bench_ann --size 100000 --nlist 316 --nprobe 1,4,8,16,32
+    python -m agent.scripts.bench_ann --db-dir agent/vector_db --collection libros_catalog --output ann.json
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+
+from agent.benchmarking import recall_at_k, summarize_latencies, time_calls
+from agent.ivf import default_nlist, train_ivf
+from agent.numpy_store import matrix_path, normalize_rows
+
+
+def _clustered_unit_vectors(
+    n: int, dim: int, clusters: int, rng: np.random.Generator, *, spread: float = 0.35
+) -> np.ndarray:
+    centers = normalize_rows(rng.standard_normal((clusters, dim), dtype=np.float32))
+    labels = rng.integers(0, clusters, size=n)
+    noise = rng.standard_normal((n, dim), dtype=np.float32) * (spread / np.sqrt(dim))
+    return normalize_rows(centers[labels] + noise)
+
+
+def _int_list(value: str) -> list[int]:
+    return [int(v) for v in value.split(",") if v.strip()]
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", type=int, default=100000, help="Synthetic catalog size")
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--clusters", type=int, default=200, help="Topics in the synthetic data")
+    parser.add_argument("--db-dir", default="", help="Benchmark an existing NumPy artifact instead")
+    parser.add_argument("--collection", default="libros_catalog")
+    parser.add_argument("--nlist", default="", help="Comma-separated nlist values (default: ~sqrt(N))")
+    parser.add_argument("--nprobe", default="1,4,8,16,32")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", default="", help="Write the JSON report to this path")
+    args = parser.parse_args(argv)
+
+    rng = np.random.default_rng(args.seed)
+    if args.db_dir:
+        matrix = np.load(matrix_path(Path(args.db_dir), args.collection))
+        picks = rng.choice(matrix.shape[0], size=min(args.queries, matrix.shape[0]), replace=False)
+        # Perturbed rows, so a query is not trivially its own nearest neighbour.
+        noise = rng.standard_normal((picks.size, matrix.shape[1]), dtype=np.float32) * 0.05
+        queries = normalize_rows(matrix[picks] + noise)
+    else:
+        data = _clustered_unit_vectors(args.size + args.queries, args.dim, args.clusters, rng)
+        matrix, queries = data[: args.size], data[args.size :]
+
+    n = int(matrix.shape[0])
+    report: dict[str, Any] = {"size": n, "dim": int(matrix.shape[1]), "k": args.k, "queries": len(queries), "runs": []}
+
+    def exact(q: np.ndarray) -> list[int]:
+        scores = matrix @ q
+        top = np.argpartition(-scores, min(args.k, n - 1))[: args.k]
+        return top[np.argsort(-scores[top])].tolist()
+
+    latencies, exact_hits = time_calls(exact, queries)
+    report["exact"] = summarize_latencies(latencies)
+
+    for nlist in _int_list(args.nlist) or [default_nlist(n)]:
+        started = time.perf_counter()
+        index = train_ivf(matrix, nlist, seed=args.seed)
+        build_s = time.perf_counter() - started
+        for nprobe in _int_list(args.nprobe):
+            if nprobe > index.nlist:
+                continue
+            latencies, hits = time_calls(lambda q: index.search(matrix, q, args.k, nprobe)[0].tolist(), queries)
+            run = {
+                "nlist": index.nlist,
+                "nprobe": nprobe,
+                "build_s": round(build_s, 3),
+                "recall_at_k_vs_exact": recall_at_k(exact_hits, hits, args.k),
+                **summarize_latencies(latencies),
+            }
+            report["runs"].append(run)
+            print(json.dumps(run, ensure_ascii=False), file=sys.stderr)
+
+    payload = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        Path(args.output).write_text(payload, encoding="utf-8")
+    print(payload)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,119 @@
+"""Benchmark: NumPy in-process index vs Chroma for catalog-sized vector search.
+
+Uses synthetic unit vectors, so no embedding model is loaded; both backends receive
+the same `query_embeddings`. Chroma (HNSW) is approximate, so the report also
+includes its recall@k against the exact NumPy result.
+
+Usage (from backend/):
+    python -m agent.scripts.bench_vector_backends --sizes 10000,100000,1000000 --dim 384
+    python -m agent.scripts.bench_vector_backends --sizes 10000 --skip-chroma --output bench.json
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+
+from agent.benchmarking import recall_at_k, summarize_latencies, time_calls
+from agent.numpy_store import NumpyCollection, normalize_rows, write_numpy_collection
+
+CHROMA_ADD_BATCH = 5000
+
+
+def _random_unit_vectors(n: int, dim: int, rng: np.random.Generator) -> np.ndarray:
+    return normalize_rows(rng.standard_normal((n, dim), dtype=np.float32))
+
+
+def _bench_numpy(workdir: Path, vectors: np.ndarray, ids: list[str], queries: np.ndarray, k: int) -> tuple[dict[str, Any], list[list[str]]]:
+    started = time.perf_counter()
+    write_numpy_collection(
+        workdir,
+        "bench",
+        ids=ids,
+        embeddings=vectors,
+        documents=[None] * len(ids),
+        metadatas=[None] * len(ids),
+    )
+    build_s = time.perf_counter() - started
+
+    started = time.perf_counter()
+    collection = NumpyCollection.load(workdir, "bench")
+    open_ms = (time.perf_counter() - started) * 1000.0
+
+    def run(q: np.ndarray) -> list[str]:
+        return collection.query(query_embeddings=[q], n_results=k, include=["distances"])["ids"][0]
+
+    latencies, hits = time_calls(run, queries)
+    report = {"build_s": round(build_s, 3), "open_ms": round(open_ms, 3), **summarize_latencies(latencies)}
+    return report, hits
+
+
+def _bench_chroma(workdir: Path, vectors: np.ndarray, ids: list[str], queries: np.ndarray, k: int) -> tuple[dict[str, Any], list[list[str]]]:
+    import chromadb
+
+    started = time.perf_counter()
+    client = chromadb.PersistentClient(path=str(workdir))
+    collection = client.create_collection(name="bench", metadata={"hnsw:space": "cosine"})
+    for start in range(0, len(ids), CHROMA_ADD_BATCH):
+        end = start + CHROMA_ADD_BATCH
+        collection.add(ids=ids[start:end], embeddings=vectors[start:end].tolist())
+    build_s = time.perf_counter() - started
+
+    def run(q: np.ndarray) -> list[str]:
+        return collection.query(query_embeddings=[q.tolist()], n_results=k, include=["distances"])["ids"][0]
+
+    latencies, hits = time_calls(run, queries)
+    return {"build_s": round(build_s, 3), **summarize_latencies(latencies)}, hits
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="10000,100000,1000000", help="Comma-separated catalog sizes")
+    parser.add_argument("--dim", type=int, default=384, help="Embedding dimension (mxbai-embed-large uses 1024)")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--skip-chroma", action="store_true")
+    parser.add_argument("--output", default="", help="Write the JSON report to this path")
+    args = parser.parse_args(argv)
+
+    rng = np.random.default_rng(args.seed)
+    report: dict[str, Any] = {"dim": args.dim, "k": args.k, "queries": args.queries, "runs": []}
+
+    for size in [int(s) for s in args.sizes.split(",") if s.strip()]:
+        vectors = _random_unit_vectors(size, args.dim, rng)
+        queries = _random_unit_vectors(args.queries, args.dim, rng)
+        ids = [f"libro:{i}" for i in range(size)]
+        run: dict[str, Any] = {"size": size}
+
+        workdir = Path(tempfile.mkdtemp(prefix="bench_vec_"))
+        try:
+            run["numpy"], exact_hits = _bench_numpy(workdir / "numpy", vectors, ids, queries, args.k)
+            if not args.skip_chroma:
+                try:
+                    run["chroma"], chroma_hits = _bench_chroma(workdir / "chroma", vectors, ids, queries, args.k)
+                    run["chroma"]["recall_at_k_vs_exact"] = recall_at_k(exact_hits, chroma_hits, args.k)
+                except ImportError:
+                    run["chroma"] = {"error": "chromadb not installed"}
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+        report["runs"].append(run)
+        print(json.dumps(run, ensure_ascii=False), file=sys.stderr)
+
+    payload = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        Path(args.output).write_text(payload, encoding="utf-8")
+    print(payload)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
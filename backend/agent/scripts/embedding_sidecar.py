@@ -0,0 +1,69 @@
+"""Run the shared embedding sidecar (see `agent.embedding_service`).
+
+Loads the embedding model named by the vector store config (manifest or
+VECTOR_EMBEDDING_MODEL) once, then serves every worker on the host over a unix
+socket. Point the workers at it with AGENT_EMBEDDING_SOCKET=<same path>.
+
+Usage (from backend/):
+    python -m agent.scripts.embedding_sidecar --socket /run/agent/embed.sock
+    python -m agent.scripts.embedding_sidecar --socket /tmp/embed.sock --max-batch 32 --max-wait-ms 2
+"""
+from __future__ import annotations
+
+import argparse
+import signal
+import sys
+import time
+
+from agent.embedding_service import EMBEDDING_SOCKET, EmbeddingServer
+from agent.vector_store import SentenceTransformerEmbedder, load_vector_store_config
+
+
+def _stop(signum, frame) -> None:
+    raise KeyboardInterrupt
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--socket", default=EMBEDDING_SOCKET, help="Unix socket path (default: AGENT_EMBEDDING_SOCKET)")
+    parser.add_argument("--model", default="", help="Override the model from the vector store config")
+    parser.add_argument("--device", default="", help="Override VECTOR_EMBEDDING_DEVICE")
+    parser.add_argument("--max-batch", type=int, default=64, help="Max texts per encode call")
+    parser.add_argument("--max-wait-ms", type=float, default=5.0, help="Max wait to fill a batch")
+    args = parser.parse_args(argv)
+
+    if not args.socket:
+        parser.error("--socket (or AGENT_EMBEDDING_SOCKET) is required")
+    cfg = load_vector_store_config()
+    model = args.model or cfg.embedding_model
+    if not model:
+        parser.error("No embedding model: set --model, VECTOR_EMBEDDING_MODEL or build a manifest")
+
+    embedder = SentenceTransformerEmbedder(
+        model, device=args.device or cfg.embedding_device, normalize_embeddings=cfg.normalize_embeddings
+    )
+    started = time.monotonic()
+    embedder(["warmup"])  # load before accepting connections, so clients never wait on it
+    print(f"Loaded {model} in {time.monotonic() - started:.1f}s", file=sys.stderr)
+
+    server = EmbeddingServer(
+        args.socket,
+        embedder,
+        model_name=model,
+        normalize_embeddings=cfg.normalize_embeddings,
+        max_batch=args.max_batch,
+        max_wait_ms=args.max_wait_ms,
+    )
+    signal.signal(signal.SIGTERM, _stop)
+    print(f"Serving embeddings on {args.socket}", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,196 @@
+"""Load test: sync chat path (thread per chat) vs async path (one event loop).
+
+`simulate` (default) runs both handlers in-process with a fake retrieval and a fake
+LLM that waits `--llm-ms` (time.sleep for `invoke`, asyncio.sleep for `ainvoke`),
+so it needs no database, model or API key. The sync path gets `--sync-threads`
+threads, like `gunicorn --workers 1 --threads N`; the async path gets one event
+loop, like one uvicorn worker. Both receive `--requests` chats at `--concurrency`.
+
+`http` sends the same load to a running server, once per endpoint:
+
+    uvicorn config.asgi:application --workers 1       # terminal 1
+    python -m agent.scripts.load_test_chat --mode http --base-url http://127.0.0.1:8000
+
+Usage (from backend/):
+    python -m agent.scripts.load_test_chat --requests 400 --concurrency 200 --llm-ms 800
+    python -m agent.scripts.load_test_chat --mode http --paths /api/agent/,/api/agent/async/ --concurrency 100
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Optional
+
+from agent.benchmarking import summarize_latencies
+
+MESSAGE = "Busco novelas de realismo mágico"
+
+
+def _summary(latencies_ms: list[float], wall_s: float, errors: int) -> dict[str, Any]:
+    summary = summarize_latencies(latencies_ms)
+    summary.pop("qps", None)  # serial qps; throughput below is the concurrent one
+    return {
+        **summary,
+        "errors": errors,
+        "wall_s": round(wall_s, 3),
+        "throughput_rps": round(len(latencies_ms) / wall_s, 2) if wall_s > 0 else 0.0,
+    }
+
+
+class _SimulatedLLM:
+    def __init__(self, latency_ms: float) -> None:
+        self.latency_sec = latency_ms / 1000.0
+
+    def _response(self) -> dict[str, Any]:
+        return {"content": "- Resultado simulado.\n- ¿Quieres ver detalles?", "provider": "simulated", "model": "sim"}
+
+    def invoke(self, prompt: str, **kwargs: Any) -> dict[str, Any]:
+        time.sleep(self.latency_sec)
+        return self._response()
+
+    async def ainvoke(self, prompt: str, **kwargs: Any) -> dict[str, Any]:
+        await asyncio.sleep(self.latency_sec)
+        return self._response()
+
+
+def _simulated_retrieval(latency_ms: float):
+    from agent.retrieval import RetrievalResult
+
+    def retrieval(query: str, *, k: int = 5, prefer_vector: bool = True) -> RetrievalResult:
+        time.sleep(latency_ms / 1000.0)
+        return RetrievalResult(
+            query=query, k=k, source="vector", degraded=False, results=[{"libro_id": 1, "titulo": "Sim"}], warnings=[]
+        )
+
+    return retrieval
+
+
+def _run_simulated(args: argparse.Namespace) -> dict[str, Any]:
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
+    import django
+
+    django.setup()
+    from agent.agent_handler import handle_agent_message, handle_agent_message_async
+
+    llm = _SimulatedLLM(args.llm_ms)
+    retrieval_fn = _simulated_retrieval(args.retrieval_ms)
+    kwargs = {"k": 5, "retrieval_fn": retrieval_fn, "llm": llm}
+
+    # Latencies count from t0 (every chat offered at once), so queueing behind busy
+    # threads / the concurrency gate is included on both paths.
+    def sync_chat(t0: float) -> float:
+        handle_agent_message(MESSAGE, **kwargs)
+        return (time.perf_counter() - t0) * 1000.0
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=min(args.sync_threads, args.concurrency)) as pool:
+        sync_latencies = list(pool.map(sync_chat, [started] * args.requests))
+    sync_report = _summary(sync_latencies, time.perf_counter() - started, 0)
+
+    async def async_load() -> tuple[list[float], float]:
+        gate = asyncio.Semaphore(args.concurrency)
+
+        async def one(t0: float) -> float:
+            async with gate:
+                await handle_agent_message_async(MESSAGE, **kwargs)
+                return (time.perf_counter() - t0) * 1000.0
+
+        began = time.perf_counter()
+        latencies = await asyncio.gather(*(one(began) for _ in range(args.requests)))
+        return list(latencies), time.perf_counter() - began
+
+    async_latencies, async_wall = asyncio.run(async_load())
+    async_report = _summary(async_latencies, async_wall, 0)
+
+    return {
+        "mode": "simulate",
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "llm_ms": args.llm_ms,
+        "retrieval_ms": args.retrieval_ms,
+        "sync": {"threads": min(args.sync_threads, args.concurrency), **sync_report},
+        "async": {"event_loops": 1, **async_report},
+        "speedup": round(async_report["throughput_rps"] / sync_report["throughput_rps"], 2)
+        if sync_report["throughput_rps"]
+        else None,
+    }
+
+
+async def _http_load(url: str, args: argparse.Namespace) -> dict[str, Any]:
+    import httpx
+
+    headers = {"Authorization": f"Bearer {args.token}"} if args.token else {}
+    payload = {"message": MESSAGE, "k": 5, "use_llm": not args.no_llm, "save_history": False}
+    gate = asyncio.Semaphore(args.concurrency)
+    latencies: list[float] = []
+    statuses: dict[str, int] = {}
+    errors = 0
+
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(timeout=args.timeout, limits=limits, headers=headers) as client:
+
+        async def one() -> None:
+            nonlocal errors
+            async with gate:
+                began = time.perf_counter()
+                try:
+                    response = await client.post(url, json=payload)
+                    status = str(response.status_code)
+                except httpx.HTTPError as e:
+                    status = type(e).__name__
+                latencies.append((time.perf_counter() - began) * 1000.0)
+                statuses[status] = statuses.get(status, 0) + 1
+                if status != "200":
+                    errors += 1
+
+        began = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(args.requests)))
+        wall = time.perf_counter() - began
+
+    return {"url": url, "statuses": statuses, **_summary(latencies, wall, errors)}
+
+
+def _run_http(args: argparse.Namespace) -> dict[str, Any]:
+    runs = []
+    for path in [p.strip() for p in args.paths.split(",") if p.strip()]:
+        run = asyncio.run(_http_load(args.base_url.rstrip("/") + path, args))
+        print(json.dumps(run, ensure_ascii=False), file=sys.stderr)
+        runs.append(run)
+    return {"mode": "http", "requests": args.requests, "concurrency": args.concurrency, "runs": runs}
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mode", choices=["simulate", "http"], default="simulate")
+    parser.add_argument("--requests", type=int, default=200, help="Chats per path")
+    parser.add_argument("--concurrency", type=int, default=100, help="Chats in flight at once")
+    parser.add_argument("--llm-ms", type=float, default=800.0, help="simulate: fake LLM latency")
+    parser.add_argument("--retrieval-ms", type=float, default=20.0, help="simulate: fake retrieval latency")
+    parser.add_argument("--sync-threads", type=int, default=8, help="simulate: threads for the sync path")
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000", help="http: server to load")
+    parser.add_argument("--paths", default="/api/agent/,/api/agent/async/", help="http: comma-separated endpoints")
+    parser.add_argument("--token", default="", help="http: JWT access token (optional)")
+    parser.add_argument("--no-llm", action="store_true", help="http: send use_llm=false")
+    parser.add_argument("--timeout", type=float, default=60.0, help="http: per-request timeout (s)")
+    parser.add_argument("--output", default="", help="Write the JSON report here too")
+    args = parser.parse_args(argv)
+
+    if args.requests < 1 or args.concurrency < 1:
+        parser.error("--requests and --concurrency must be >= 1")
+
+    report = _run_simulated(args) if args.mode == "simulate" else _run_http(args)
+    payload = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        Path(args.output).write_text(payload, encoding="utf-8")
+    print(payload)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
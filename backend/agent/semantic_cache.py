@@ -0,0 +1,157 @@
+"""In-memory semantic cache: reuse vector hits for paraphrased queries.
+
+Exact repeats are served by the result cache; paraphrases ("libros de García Márquez"
+vs "novelas de Gabriel García Márquez") have near-identical embeddings and the same
+top-k, but different cache keys. This cache keeps the embeddings of recent queries in
+a fixed-size matrix with the hits they produced. A new query whose cosine similarity
+to a cached one reaches `threshold` reuses those hits; `search_catalog` still hydrates
+them, so price/stock are always fresh.
+
+Memory is bounded by `max_entries` (embedding rows + hit lists without documents);
+the least recently used entry is evicted first. Entries are dropped wholesale when
+the catalog version or the embedding model changes.
+
+Shadow thresholds: every lookup also records whether it would have hit at each value
+in `shadow_thresholds` (`agent.semantic_cache.hit@0.95`...), so a threshold can be
+tuned from production traffic before it is enabled (threshold > 1 = shadow only).
+"""
+from __future__ import annotations
+
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+import numpy as np
+
+from .observability import record_counter
+
+SEMANTIC_CACHE_SIZE = int(os.getenv("AGENT_SEMANTIC_CACHE_SIZE", "0"))
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("AGENT_SEMANTIC_CACHE_THRESHOLD", "0.95"))
+SEMANTIC_CACHE_SHADOW_THRESHOLDS = tuple(
+    float(value)
+    for value in (os.getenv("AGENT_SEMANTIC_CACHE_SHADOW_THRESHOLDS", "0.90,0.93,0.95,0.97") or "").split(",")
+    if value.strip()
+)
+
+
+def threshold_label(threshold: float) -> str:
+    return f"{threshold:.2f}"
+
+
+class SemanticCache:
+    def __init__(
+        self,
+        max_entries: int,
+        *,
+        threshold: float = 0.95,
+        shadow_thresholds: tuple[float, ...] = (),
+    ) -> None:
+        self.max_entries = max_entries
+        self.threshold = threshold
+        self.shadow_thresholds = tuple(sorted(set(shadow_thresholds)))
+        self._lock = threading.Lock()
+        self._namespace: Optional[Hashable] = None
+        self._matrix: Optional[np.ndarray] = None  # (max_entries, dim), allocated on first add
+        # slot -> (k, hits); order = recency (last is most recent).
+        self._entries: OrderedDict[int, tuple[int, list[dict[str, Any]]]] = OrderedDict()
+        self._free: list[int] = []
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    def _use_namespace(self, namespace: Hashable) -> None:
+        # Caller holds the lock.
+        if namespace != self._namespace:
+            self._namespace = namespace
+            self._matrix = None
+            self._entries.clear()
+            self._free = []
+
+    @staticmethod
+    def _unit(embedding: Any) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32).reshape(-1)
+        norm = float(np.linalg.norm(vector))
+        return vector / norm if norm > 0 else vector
+
+    def lookup(self, embedding: Any, k: int, *, namespace: Hashable = None) -> Optional[list[dict[str, Any]]]:
+        """Hits of the most similar cached query (>= threshold, cached with >= k results)."""
+
+        if not self.enabled:
+            return None
+        query = self._unit(embedding)
+        with self._lock:
+            self._use_namespace(namespace)
+            record_counter("agent.semantic_cache.lookup")
+            slots = [slot for slot, (cached_k, _) in self._entries.items() if cached_k >= k]
+            if self._matrix is None or not slots or self._matrix.shape[1] != query.shape[0]:
+                record_counter("agent.semantic_cache_miss")
+                return None
+            similarities = self._matrix[slots] @ query
+            best = int(np.argmax(similarities))
+            similarity = float(similarities[best])
+            for shadow in self.shadow_thresholds:
+                if similarity >= shadow:
+                    record_counter(f"agent.semantic_cache.hit@{threshold_label(shadow)}")
+            if similarity < self.threshold:
+                record_counter("agent.semantic_cache_miss")
+                return None
+            slot = slots[best]
+            self._entries.move_to_end(slot)
+            record_counter("agent.semantic_cache_hit")
+            return [dict(hit) for hit in self._entries[slot][1][:k]]
+
+    def add(self, embedding: Any, k: int, hits: list[dict[str, Any]], *, namespace: Hashable = None) -> None:
+        if not self.enabled:
+            return
+        vector = self._unit(embedding)
+        # Documents are re-read on hydration; keep only what ranks and identifies a hit.
+        compact = [{key: value for key, value in hit.items() if key != "document"} for hit in hits]
+        with self._lock:
+            self._use_namespace(namespace)
+            if self._matrix is None or self._matrix.shape[1] != vector.shape[0]:
+                self._matrix = np.zeros((self.max_entries, vector.shape[0]), dtype=np.float32)
+                self._entries.clear()
+                self._free = list(range(self.max_entries - 1, -1, -1))
+            if self._free:
+                slot = self._free.pop()
+            else:
+                slot, _ = self._entries.popitem(last=False)
+                record_counter("agent.semantic_cache_evict")
+            self._matrix[slot] = vector
+            self._entries[slot] = (k, compact)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._namespace = None
+            self._matrix = None
+            self._entries.clear()
+            self._free = []
+
+
+def shadow_hit_rates(counters: dict[str, int], thresholds: tuple[float, ...]) -> dict[str, Optional[float]]:
+    """Hit rate each shadow threshold would have produced, from METRICS counters."""
+
+    lookups = int(counters.get("agent.semantic_cache.lookup", 0))
+    return {
+        threshold_label(t): (
+            round(int(counters.get(f"agent.semantic_cache.hit@{threshold_label(t)}", 0)) / lookups, 4)
+            if lookups
+            else None
+        )
+        for t in sorted(thresholds)
+    }
+
+
+__all__ = [
+    "SEMANTIC_CACHE_SHADOW_THRESHOLDS",
+    "SEMANTIC_CACHE_SIZE",
+    "SEMANTIC_CACHE_THRESHOLD",
+    "SemanticCache",
+    "shadow_hit_rates",
+]
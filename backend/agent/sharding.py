@@ -0,0 +1,181 @@
+"""Category-sharded vector collections.
+
+`build_vector_index --shard-by categoria` writes one collection per category and
+records the layout in the manifest:
+
+    "shards": {"by": "categoria", "collections": {"<categoria_key>": "<collection>__<slug>", ...}}
+
+`ShardedCollection` wraps the per-shard collections behind the same subset of the
+Chroma API as a single collection (`query`, `get`, `upsert`, `delete`, `count`):
+
+- a `where` that pins `categoria_key` (as `filter_catalog` does) queries only that shard;
+- any other query fans out to every shard on a thread pool and merges top-k by distance;
+- writes are routed by the row's `categoria_key`, so an incremental sync only rewrites
+  the shards holding the changed books (a book that changed category is removed from
+  its old shard). Rows for a category without a shard create it through `open_shard`.
+"""
+from __future__ import annotations
+
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional, Sequence
+
+SHARD_WORKERS = int(os.getenv("AGENT_VECTOR_SHARD_WORKERS", "8"))
+# Shard for books without a category (`categoria_key` absent from the metadata).
+UNCATEGORIZED_SHARD = "_sin_categoria"
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=max(1, SHARD_WORKERS), thread_name_prefix="agent-shard")
+        return _executor
+
+
+def shard_key(metadata: Optional[dict[str, Any]]) -> str:
+    return (metadata or {}).get("categoria_key") or UNCATEGORIZED_SHARD
+
+
+def shard_collection_name(base: str, key: str, taken: Sequence[str] = ()) -> str:
+    """`<base>__<slug>`, valid as a Chroma name (<= 63 chars) and unique among `taken`."""
+
+    slug = re.sub(r"[^a-z0-9]+", "_", key.lower()).strip("_")[:40] or "sin_categoria"
+    name = f"{base[:20]}__{slug}"
+    candidate, n = name, 2
+    while candidate in taken:
+        candidate, n = f"{name}_{n}", n + 1
+    return candidate
+
+
+def routed_shard(where: Optional[dict[str, Any]]) -> Optional[str]:
+    """Shard key pinned by a `where` clause (`categoria_key` equality, possibly in `$and`)."""
+
+    if not where:
+        return None
+    clauses = where.get("$and") if "$and" in where else [where]
+    for clause in clauses or []:
+        value = clause.get("categoria_key")
+        if isinstance(value, dict):
+            value = value.get("$eq")
+        if isinstance(value, str):
+            return value
+    return None
+
+
+class ShardedCollection:
+    def __init__(
+        self,
+        name: str,
+        shards: dict[str, Any],
+        *,
+        open_shard: Optional[Callable[[str], Any]] = None,
+    ) -> None:
+        self.name = name
+        self.shards = dict(shards)
+        self._open_shard = open_shard
+        self._lock = threading.Lock()
+
+    def count(self) -> int:
+        return sum(shard.count() for shard in self.shards.values())
+
+    def query(
+        self,
+        *,
+        query_embeddings: Sequence[Any],
+        n_results: int = 10,
+        include: Sequence[str] = ("documents", "metadatas", "distances"),
+        where: Optional[dict[str, Any]] = None,
+    ) -> dict[str, Any]:
+        kwargs: dict[str, Any] = {"where": where} if where else {}
+        key = routed_shard(where)
+        if key is not None:
+            shard = self.shards.get(key)
+            if shard is None:
+                return {name: [[] for _ in query_embeddings] for name in ("ids", *include)}
+            return shard.query(query_embeddings=query_embeddings, n_results=n_results, include=include, **kwargs)
+
+        # Distances are needed to merge, even if the caller did not ask for them.
+        shard_include = list(dict.fromkeys([*include, "distances"]))
+
+        def run(shard: Any) -> dict[str, Any]:
+            return shard.query(
+                query_embeddings=query_embeddings, n_results=n_results, include=shard_include, **kwargs
+            )
+
+        responses = list(_get_executor().map(run, list(self.shards.values())))
+        out: dict[str, Any] = {name: [] for name in ("ids", *include)}
+        for position in range(len(query_embeddings)):
+            merged = []
+            for resp in responses:
+                for i, distance in enumerate(resp["distances"][position]):
+                    merged.append((distance, resp, i))
+            merged.sort(key=lambda item: item[0])
+            top = merged[:n_results]
+            for name in out:
+                out[name].append([resp[name][position][i] for _, resp, i in top])
+        return out
+
+    def get(self, ids: Optional[Sequence[str]] = None, include: Sequence[str] = ("documents", "metadatas")) -> dict[str, Any]:
+        out: dict[str, Any] = {"ids": [], **{name: [] for name in include}}
+        for shard in self.shards.values():
+            resp = shard.get(ids=ids, include=include) if ids is not None else shard.get(include=include)
+            for name in out:
+                out[name].extend(resp.get(name) or [])
+        return out
+
+    def _shard_for_write(self, key: str) -> Any:
+        with self._lock:
+            shard = self.shards.get(key)
+            if shard is None:
+                if self._open_shard is None:
+                    raise KeyError(f"No shard for {key!r}")
+                shard = self._open_shard(key)
+                self.shards[key] = shard
+            return shard
+
+    def upsert(
+        self,
+        *,
+        ids: Sequence[str],
+        embeddings: Any,
+        documents: Optional[Sequence[Optional[str]]] = None,
+        metadatas: Optional[Sequence[Optional[dict[str, Any]]]] = None,
+    ) -> None:
+        documents = documents if documents is not None else [None] * len(ids)
+        metadatas = metadatas if metadatas is not None else [None] * len(ids)
+        groups: dict[str, list[int]] = {}
+        for i, metadata in enumerate(metadatas):
+            groups.setdefault(shard_key(metadata), []).append(i)
+
+        for key, rows in groups.items():
+            group_ids = [ids[i] for i in rows]
+            # A book that changed category still lives in its old shard.
+            for other_key, other in list(self.shards.items()):
+                if other_key != key:
+                    other.delete(ids=group_ids)
+            self._shard_for_write(key).upsert(
+                ids=group_ids,
+                embeddings=[embeddings[i] for i in rows],
+                documents=[documents[i] for i in rows],
+                metadatas=[metadatas[i] for i in rows],
+            )
+
+    def delete(self, ids: Sequence[str]) -> None:
+        for shard in self.shards.values():
+            shard.delete(ids=ids)
+
+
+__all__ = [
+    "UNCATEGORIZED_SHARD",
+    "ShardedCollection",
+    "routed_shard",
+    "shard_collection_name",
+    "shard_key",
+]
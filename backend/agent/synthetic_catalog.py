@@ -0,0 +1,157 @@
+"""Synthetic `Libro`/`Categoria` catalogs and query workloads for retrieval benchmarks.
+
+Rows are generated deterministically from a seed, so two runs with the same size
+and seed benchmark the same catalog. Every synthetic ISBN starts with
+`SYNTHETIC_ISBN_PREFIX`, which is how `delete_synthetic_catalog` finds them again.
+
+Workloads are built from catalog rows (synthetic or real) and carry their own
+relevance judgements as ISBNs, which stay stable across databases:
+
+    {"query": "...", "kind": "title|author|isbn|topic", "relevant_isbns": [...]}
+"""
+from __future__ import annotations
+
+import random
+from collections import defaultdict
+from decimal import Decimal
+from typing import Any, Iterable, Iterator
+
+SYNTHETIC_ISBN_PREFIX = "999"
+
+# categoria -> topic words used in titles/descriptions, so semantic queries have signal.
+CATEGORY_TOPICS: dict[str, tuple[str, ...]] = {
+    "Fantasía": ("dragón", "hechicera", "reino", "espada", "profecía", "elfos"),
+    "Ciencia ficción": ("galaxia", "androide", "colonia", "nave", "planeta", "inteligencia"),
+    "Misterio": ("detective", "asesinato", "pista", "coartada", "sospechoso", "crimen"),
+    "Romance": ("amor", "boda", "carta", "verano", "reencuentro", "corazón"),
+    "Historia": ("imperio", "revolución", "batalla", "dinastía", "conquista", "república"),
+    "Ciencia": ("átomo", "evolución", "genética", "universo", "energía", "cerebro"),
+    "Infantil": ("osito", "bosque", "amistad", "juego", "escuela", "aventura"),
+    "Autoayuda": ("hábitos", "felicidad", "liderazgo", "ansiedad", "propósito", "disciplina"),
+}
+_ADJECTIVES = ("oscuro", "perdido", "eterno", "secreto", "último", "silencioso", "dorado", "olvidado")
+_FIRST_NAMES = ("Ana", "Luis", "María", "Jorge", "Lucía", "Pedro", "Sofía", "Diego", "Elena", "Tomás")
+_LAST_NAMES = ("García", "Rojas", "Méndez", "Paredes", "Quispe", "Vargas", "Torres", "Salinas", "Ibáñez", "Navarro")
+_EDITORIALES = ("Planeta", "Alfaguara", "Anagrama", "Tusquets", "Salamandra", "Debolsillo")
+
+
+def synthetic_isbn(index: int) -> str:
+    return f"{SYNTHETIC_ISBN_PREFIX}{index:010d}"
+
+
+def generate_libro_rows(n: int, *, seed: int = 0) -> Iterator[dict[str, Any]]:
+    """Yield `n` field dicts for `Libro` (with `categoria` as a name)."""
+
+    rng = random.Random(seed)
+    categorias = list(CATEGORY_TOPICS)
+    # ~5 books per author, so author queries have several relevant results.
+    authors = [
+        f"{rng.choice(_FIRST_NAMES)} {rng.choice(_LAST_NAMES)} {i}" for i in range(max(1, n // 5))
+    ]
+    for i in range(n):
+        categoria = rng.choice(categorias)
+        topics = rng.sample(CATEGORY_TOPICS[categoria], 3)
+        titulo = f"El {topics[0]} {rng.choice(_ADJECTIVES)} {i}"
+        yield {
+            "titulo": titulo,
+            "autor": rng.choice(authors),
+            "isbn": synthetic_isbn(i),
+            "categoria": categoria,
+            "editorial": rng.choice(_EDITORIALES),
+            "precio": Decimal(rng.randint(500, 9000)) / 100,
+            "stock": rng.choice((0, 1, 3, 10, 25)),
+            "año_publicacion": rng.randint(1950, 2024),
+            "descripcion": (
+                f"Una historia de {categoria.lower()} sobre {topics[0]}, {topics[1]} y {topics[2]}. "
+                f"{titulo} es parte de un catálogo de prueba."
+            ),
+        }
+
+
+def create_synthetic_catalog(n: int, *, seed: int = 0, batch_size: int = 1000) -> int:
+    """Insert `n` synthetic books with `bulk_create` (no per-row signals). Returns rows created."""
+
+    from django.db import transaction
+
+    from apps.libros.models import Categoria, Libro
+
+    with transaction.atomic():
+        categorias = {nombre: Categoria.objects.get_or_create(nombre=nombre)[0] for nombre in CATEGORY_TOPICS}
+        batch: list[Any] = []
+        created = 0
+        for row in generate_libro_rows(n, seed=seed):
+            batch.append(Libro(**{**row, "categoria": categorias[row["categoria"]]}))
+            if len(batch) >= batch_size:
+                Libro.objects.bulk_create(batch, ignore_conflicts=True)
+                created += len(batch)
+                batch.clear()
+        if batch:
+            Libro.objects.bulk_create(batch, ignore_conflicts=True)
+            created += len(batch)
+    return created
+
+
+def delete_synthetic_catalog() -> int:
+    from apps.libros.models import Libro
+
+    deleted, _ = Libro.objects.filter(isbn__startswith=SYNTHETIC_ISBN_PREFIX).delete()
+    return deleted
+
+
+def build_workload(rows: Iterable[dict[str, Any]], *, size: int = 200, seed: int = 0) -> list[dict[str, Any]]:
+    """Mixed query workload (title, author, isbn, topic) with relevant ISBNs per query.
+
+    `rows` need `titulo`, `autor`, `isbn`, `categoria` and `descripcion`.
+    """
+
+    rows = [row for row in rows if row.get("isbn")]
+    if not rows:
+        return []
+    rng = random.Random(seed)
+    by_author: dict[str, list[str]] = defaultdict(list)
+    by_topic: dict[tuple[str, str], list[str]] = defaultdict(list)
+    for row in rows:
+        by_author[row["autor"]].append(row["isbn"])
+        description = (row.get("descripcion") or "").lower()
+        for word in CATEGORY_TOPICS.get(row.get("categoria") or "", ()):
+            if word in description:
+                by_topic[(row["categoria"], word)].append(row["isbn"])
+
+    kinds = ("title", "author", "isbn", "topic") if by_topic else ("title", "author", "isbn")
+    workload: list[dict[str, Any]] = []
+    for i in range(size):
+        kind = kinds[i % len(kinds)]
+        if kind == "topic":
+            (categoria, word), relevant = rng.choice(sorted(by_topic.items()))
+            query = f"libro de {categoria.lower()} sobre {word}"
+        else:
+            row = rng.choice(rows)
+            if kind == "title":
+                query, relevant = row["titulo"], [row["isbn"]]
+            elif kind == "author":
+                query, relevant = row["autor"], by_author[row["autor"]]
+            else:
+                query, relevant = row["isbn"], [row["isbn"]]
+        workload.append({"query": query, "kind": kind, "relevant_isbns": list(relevant)})
+    return workload
+
+
+def relevance_recall(relevant: list[str], found: list[str], k: int) -> float:
+    """Share of the relevant items retrievable in k slots that appear in `found[:k]`."""
+
+    if not relevant or k <= 0:
+        return 0.0
+    hits = len(set(relevant) & set(found[:k]))
+    return hits / min(len(set(relevant)), k)
+
+
+__all__ = [
+    "CATEGORY_TOPICS",
+    "SYNTHETIC_ISBN_PREFIX",
+    "build_workload",
+    "create_synthetic_catalog",
+    "delete_synthetic_catalog",
+    "generate_libro_rows",
+    "relevance_recall",
+    "synthetic_isbn",
+]
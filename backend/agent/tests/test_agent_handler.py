@@ -1,11 +1,12 @@
 from __future__ import annotations
 
+import asyncio
 from dataclasses import dataclass
 from typing import Any, Optional
 
 import pytest
 
-from agent.agent_handler import handle_agent_message
+from agent.agent_handler import handle_agent_message, handle_agent_message_async, stream_agent_message
 
 
 @dataclass(frozen=True)
@@ -34,6 +35,28 @@ class FakeLLM:
         }
 
 
+class FakeStreamingLLM:
+    def __init__(self, chunks: list[str]):
+        self._chunks = chunks
+        self.consumed = 0
+
+    def stream(self, prompt: str, *, metadata: Optional[dict[str, Any]] = None):
+        for chunk in self._chunks:
+            self.consumed += 1
+            yield chunk
+
+
+def _fake_retrieval(query: str, *, k: int = 5, prefer_vector: bool = True):
+    return FakeRetrievalResult(
+        query=query,
+        k=k,
+        source="orm",
+        degraded=True,
+        results=[{"libro_id": 123, "titulo": "X"}],
+        warnings=[],
+    )
+
+
 def test_handle_agent_message_empty_returns_structured_error():
     resp = handle_agent_message("   ", include_trace=True, retrieval_fn=lambda *a, **k: None)  # type: ignore[arg-type]
     payload = resp.to_dict()
@@ -253,3 +276,113 @@ def test_handle_agent_message_records_metrics(monkeypatch):
     assert "agent.retrieval_orm" in counter_names
     assert "agent.retrieval_ms" in timing_names
     assert "agent.llm_total_ms" in timing_names
+
+
+def test_handle_agent_message_filters_pass_residual_text_and_vector_source(monkeypatch):
+    seen = {}
+
+    class Resp:
+        ok = True
+        error = None
+        warnings = []
+        data = {"results": [{"libro_id": 9, "titulo": "X"}], "source": "vector"}
+
+    def fake_filter_catalog(filters, k=5, query=None):
+        seen["filters"] = filters
+        seen["query"] = query
+        return Resp()
+
+    monkeypatch.setattr("agent.agent_handler.tool_filter_catalog", fake_filter_catalog)
+
+    resp = handle_agent_message("novelas de dragones, categoria: Fantasia disponible", use_llm=False, include_trace=True)
+
+    assert seen["filters"] == {"categoria": "Fantasia", "disponible": True}
+    assert seen["query"] == "novelas de dragones"
+    assert resp.trace["source"] == "vector"
+    assert resp.trace["degraded"] is False
+
+
+def test_stream_agent_message_sends_results_first_then_tokens_then_done():
+    llm = FakeStreamingLLM(["- Hola", ", aquí tienes\n", "- ¿Quieres ver detalles?"])
+
+    events = list(
+        stream_agent_message("busco algo", include_trace=True, retrieval_fn=_fake_retrieval, llm=llm)  # type: ignore[arg-type]
+    )
+
+    names = [name for name, _ in events]
+    assert names == ["results", "token", "token", "token", "done"]
+    assert events[0][1]["results"][0]["libro_id"] == 123
+    done = events[-1][1]
+    assert done["message"] == "".join(data["text"] for name, data in events if name == "token")
+    assert done["replaced"] is False
+    assert done["trace"]["llm"]["streamed"] is True
+    assert "first_token_ms" in done["trace"]["llm"]
+
+
+def test_stream_agent_message_stops_on_partial_guardrail_violation_and_falls_back():
+    llm = FakeStreamingLLM(["```json\n", "{}", "\n```", "- más"])
+
+    events = list(stream_agent_message("busco algo", retrieval_fn=_fake_retrieval, llm=llm))  # type: ignore[arg-type]
+
+    assert [name for name, _ in events] == ["results", "done"]
+    assert llm.consumed == 1
+    done = events[-1][1]
+    assert done["replaced"] is True
+    assert done["message"].startswith("Encontré 1 resultados")
+
+
+def test_stream_agent_message_empty_message_yields_error_only():
+    events = list(stream_agent_message("   "))
+
+    assert len(events) == 1
+    assert events[0][0] == "done"
+    assert events[0][1]["error"] == "invalid_request"
+
+
+def test_stream_agent_message_without_stream_uses_invoke():
+    events = list(
+        stream_agent_message("busco algo", retrieval_fn=_fake_retrieval, llm=FakeLLM("- ok\n- ok"))  # type: ignore[arg-type]
+    )
+
+    assert [name for name, _ in events] == ["results", "token", "done"]
+    assert events[-1][1]["message"] == "- ok\n- ok"
+
+
+def test_handle_agent_message_async_matches_sync_contract():
+    class AsyncFakeLLM(FakeLLM):
+        async def ainvoke(self, prompt: str, *, metadata: Optional[dict[str, Any]] = None) -> dict[str, Any]:
+            await asyncio.sleep(0)
+            return self.invoke(prompt)
+
+    kwargs = {"include_trace": True, "retrieval_fn": _fake_retrieval, "request_id": "r1"}
+    sync_resp = handle_agent_message("busco algo", llm=FakeLLM("- uno\n- dos"), **kwargs)
+    async_resp = asyncio.run(handle_agent_message_async("busco algo", llm=AsyncFakeLLM("- uno\n- dos"), **kwargs))
+
+    assert async_resp.message == sync_resp.message == "- uno\n- dos"
+    assert async_resp.results == sync_resp.results
+    assert async_resp.actions == sync_resp.actions
+    assert async_resp.trace["llm"]["provider"] == "fake"
+    assert async_resp.trace["request_id"] == "r1"
+
+
+def test_handle_agent_message_async_falls_back_when_llm_fails():
+    class ExplodingAsyncLLM:
+        async def ainvoke(self, prompt: str, **kwargs: Any) -> dict[str, Any]:
+            raise RuntimeError("boom")
+
+    resp = asyncio.run(
+        handle_agent_message_async(
+            "busco algo", include_trace=True, retrieval_fn=_fake_retrieval, llm=ExplodingAsyncLLM()
+        )
+    )
+
+    assert resp.message.startswith("Encontré 1 resultados")
+    assert resp.trace["llm"]["provider"] == "failed"
+
+
+def test_handle_agent_message_reports_prompt_tokens_in_trace():
+    resp = handle_agent_message(
+        "busco algo", include_trace=True, retrieval_fn=_fake_retrieval, llm=FakeLLM("- ok\n- ok")  # type: ignore[arg-type]
+    )
+
+    assert resp.trace["llm"]["prompt_tokens_est"] > 0
@@ -0,0 +1,87 @@
+import pytest
+
+from agent import retrieval
+from agent.circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpenError
+from agent.observability import METRICS
+from agent.vector_store import VectorStoreUnavailable
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+def _fail():
+    raise VectorStoreUnavailable("artifact missing")
+
+
+def test_breaker_opens_after_consecutive_failures_and_short_circuits():
+    breaker = CircuitBreaker("test_open", failure_threshold=2, cooldown_sec=10, clock=FakeClock())
+    calls = []
+
+    for _ in range(2):
+        with pytest.raises(VectorStoreUnavailable):
+            breaker.call(lambda: calls.append(1) or _fail())
+    assert breaker.state == OPEN
+
+    with pytest.raises(CircuitOpenError):
+        breaker.call(lambda: calls.append(1))
+    assert len(calls) == 2
+    counters = METRICS.snapshot()["counters"]
+    assert counters["agent.circuit.test_open.open"] == 1
+    assert counters["agent.circuit.test_open.rejected"] == 1
+
+
+def test_breaker_half_open_probe_closes_or_reopens():
+    clock = FakeClock()
+    breaker = CircuitBreaker("test_probe", failure_threshold=1, cooldown_sec=10, clock=clock)
+    with pytest.raises(VectorStoreUnavailable):
+        breaker.call(_fail)
+    assert breaker.snapshot()["retry_in_sec"] == 10
+
+    clock.now += 10
+    with pytest.raises(VectorStoreUnavailable):
+        breaker.call(_fail)  # failed probe
+    assert breaker.state == OPEN
+
+    clock.now += 10
+    assert breaker.allow() is True
+    assert breaker.state == HALF_OPEN
+    assert breaker.allow() is False  # only one probe in flight
+    breaker.record_success(5)
+    assert breaker.state == CLOSED
+    assert breaker.snapshot()["consecutive_failures"] == 0
+
+
+def test_slow_successes_count_as_failures():
+    breaker = CircuitBreaker("test_slow", failure_threshold=2, latency_budget_ms=100, clock=FakeClock())
+
+    breaker.record_success(150)
+    breaker.record_success(50)
+    breaker.record_success(150)
+    assert breaker.state == CLOSED
+    breaker.record_success(150)
+    assert breaker.state == OPEN
+
+
+def test_search_catalog_skips_vector_store_while_circuit_open(monkeypatch):
+    opened = []
+
+    def broken_collection():
+        opened.append(1)
+        raise VectorStoreUnavailable("artifact missing")
+
+    monkeypatch.setattr(retrieval, "get_vector_collection", broken_collection)
+    monkeypatch.setattr(retrieval, "_search_keyword", lambda q, k: [{"libro_id": 1}])
+    monkeypatch.setattr(retrieval, "VECTOR_BREAKER", CircuitBreaker("test_search", failure_threshold=2))
+
+    for _ in range(4):
+        res = retrieval.search_catalog("dune", use_cache=False)
+        assert res.source == "orm"
+        assert res.results == [{"libro_id": 1}]
+
+    assert len(opened) == 2
+    assert "circuit open" in res.warnings[-1]
@@ -0,0 +1,90 @@
+import threading
+
+import numpy as np
+import pytest
+
+from agent.embedding_service import EmbeddingServer, EmbeddingServiceClient, MicroBatcher
+from agent.vector_store import VectorStoreUnavailable
+
+
+class FakeEmbedder:
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, texts):
+        self.calls.append(list(texts))
+        return [[float(len(text)), 1.0] for text in texts]
+
+
+@pytest.fixture
+def sidecar(tmp_path):
+    embedder = FakeEmbedder()
+    server = EmbeddingServer(str(tmp_path / "embed.sock"), embedder, model_name="m", max_wait_ms=50)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server, embedder
+    server.shutdown()
+    server.server_close()
+
+
+def test_client_embeds_through_sidecar(sidecar):
+    server, embedder = sidecar
+    fallback = FakeEmbedder()
+    client = EmbeddingServiceClient(server.socket_path, "m", fallback=fallback)
+
+    assert client(["ab", "abcd"]) == [[2.0, 1.0], [4.0, 1.0]]
+    assert embedder.calls == [["ab", "abcd"]]
+    assert fallback.calls == []
+
+
+def test_concurrent_requests_are_micro_batched(sidecar):
+    server, embedder = sidecar
+    client = EmbeddingServiceClient(server.socket_path, "m")
+    results = {}
+
+    def call(text):
+        results[text] = client([text])
+
+    threads = [threading.Thread(target=call, args=(t,)) for t in ("a", "bb", "ccc")]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results == {"a": [[1.0, 1.0]], "bb": [[2.0, 1.0]], "ccc": [[3.0, 1.0]]}
+    assert len(embedder.calls) < 3
+
+
+def test_client_falls_back_when_socket_is_absent(tmp_path):
+    fallback = FakeEmbedder()
+    client = EmbeddingServiceClient(str(tmp_path / "missing.sock"), "m", fallback=fallback)
+
+    assert client(["abc"]) == [[3.0, 1.0]]
+    assert fallback.calls == [["abc"]]
+
+    with pytest.raises(VectorStoreUnavailable):
+        EmbeddingServiceClient(str(tmp_path / "missing.sock"), "m")(["abc"])
+
+
+def test_client_falls_back_on_model_mismatch(sidecar):
+    server, embedder = sidecar
+    fallback = FakeEmbedder()
+    client = EmbeddingServiceClient(server.socket_path, "other-model", fallback=fallback)
+
+    assert client(["abc"]) == [[3.0, 1.0]]
+    assert embedder.calls == []
+    assert fallback.calls == [["abc"]]
+
+
+def test_micro_batcher_reports_embedder_errors():
+    def broken(texts):
+        raise RuntimeError("boom")
+
+    batcher = MicroBatcher(broken, max_wait_ms=0)
+    with pytest.raises(Exception, match="boom"):
+        batcher.submit(["x"])
+    batcher.close()
+
+    ok = MicroBatcher(lambda texts: np.ones((len(texts), 3)), max_wait_ms=0)
+    assert ok.submit(["x", "y"]).shape == (2, 3)
+    ok.close()
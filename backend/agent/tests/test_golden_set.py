@@ -61,7 +61,7 @@ def _patch_tools(monkeypatch):
 
         return Resp()
 
-    def fake_filter_catalog(filters: dict[str, Any], k: int = 5):
+    def fake_filter_catalog(filters: dict[str, Any], k: int = 5, query: Optional[str] = None):
         results = [{"libro_id": 555, "titulo": "Libro Filtrado", "categoria": filters.get("categoria")}]
 
         class Resp:
@@ -0,0 +1,131 @@
+import json
+import sys
+import threading
+import types
+
+import numpy as np
+import pytest
+
+from agent import vector_store
+from agent.result_cache import get_catalog_version
+from agent.index_versions import PointerWatcher, list_versions, prune_versions, publish_version, version_dir
+from agent.numpy_store import write_numpy_collection
+
+
+def _build(root, version, rows):
+    db_dir = version_dir(root, version)
+    write_numpy_collection(
+        db_dir,
+        "c",
+        ids=[f"libro:{i}" for i in range(rows)],
+        embeddings=np.eye(rows, 4, dtype=np.float32) + 0.1,
+        documents=[None] * rows,
+        metadatas=[{"libro_id": i} for i in range(rows)],
+    )
+    (db_dir / "manifest.json").write_text(json.dumps({"collection": "c", "backend": "numpy"}), encoding="utf-8")
+
+
+@pytest.fixture
+def versioned_root(tmp_path, monkeypatch):
+    for name in ("VECTOR_BACKEND", "VECTOR_COLLECTION", "VECTOR_DB_MANIFEST", "VECTOR_EMBEDDING_MODEL", "VECTOR_ANN"):
+        monkeypatch.delenv(name, raising=False)
+    monkeypatch.setenv("VECTOR_DB_DIR", str(tmp_path))
+    monkeypatch.setattr(vector_store, "INDEX_CHECK_SEC", 0.0)
+    vector_store.clear_vector_store_cache()
+    _build(tmp_path, "v1", 2)
+    publish_version(tmp_path, "v1")
+    yield tmp_path
+    vector_store.clear_vector_store_cache()
+
+
+def test_new_version_is_opened_in_background_and_swapped_in(versioned_root, monkeypatch):
+    first = vector_store.get_vector_collection()
+    assert first.count() == 2
+    assert vector_store.load_vector_store_config().version == "v1"
+
+    release = threading.Event()
+    real_open = vector_store._open_vector_collection
+
+    def slow_open(cfg):
+        release.wait(5)
+        return real_open(cfg)
+
+    monkeypatch.setattr(vector_store, "_open_vector_collection", slow_open)
+    _build(versioned_root, "v2", 3)
+    publish_version(versioned_root, "v2")
+
+    catalog_version = get_catalog_version()
+
+    # The new version is loading: requests keep getting the old collection meanwhile.
+    assert vector_store.get_vector_collection() is first
+    assert vector_store.index_version_status()["swapping"] is True
+    swap = vector_store._swap_thread
+    release.set()
+    swap.join(5)
+
+    swapped = vector_store.get_vector_collection()
+    assert swapped is not first
+    assert swapped.count() == 3
+    status = vector_store.index_version_status()
+    assert (status["version"], status["generation"], status["swapping"]) == ("v2", 2, False)
+    # Results cached against v1 are orphaned.
+    assert get_catalog_version() == catalog_version + 1
+
+
+def test_release_drops_only_the_replaced_chroma_system(tmp_path, monkeypatch):
+    old_cfg = vector_store.VectorStoreConfig(db_dir=tmp_path / "v1", collection="c", backend="chroma")
+    live_system, old_system = object(), object()
+    systems = {str(tmp_path / "v1"): old_system, str(tmp_path / "v2"): live_system}
+    shared = type("SharedSystemClient", (), {"_identifer_to_system": systems})
+    monkeypatch.setitem(sys.modules, "chromadb", types.ModuleType("chromadb"))
+    monkeypatch.setitem(sys.modules, "chromadb.api", types.ModuleType("chromadb.api"))
+    monkeypatch.setitem(sys.modules, "chromadb.api.client", types.SimpleNamespace(SharedSystemClient=shared))
+
+    vector_store._release_collection(old_cfg)
+    assert systems == {str(tmp_path / "v2"): live_system}
+
+    # A chromadb without the system map: nothing to do, no error.
+    monkeypatch.delattr(shared, "_identifer_to_system")
+    vector_store._release_collection(old_cfg)
+
+
+def test_failed_swap_keeps_serving_current_version(versioned_root):
+    first = vector_store.get_vector_collection()
+    broken = version_dir(versioned_root, "v2")
+    broken.mkdir(parents=True)
+    (broken / "manifest.json").write_text(json.dumps({"collection": "c", "backend": "numpy"}), encoding="utf-8")
+    publish_version(versioned_root, "v2")
+
+    assert vector_store.poll_index_version() is True
+    swap = vector_store._swap_thread
+    if swap is not None:
+        swap.join(5)
+
+    assert vector_store.get_vector_collection() is first
+    status = vector_store.index_version_status()
+    assert status["version"] == "v1"
+    assert "not found" in status["last_error"]
+
+
+def test_pointer_watcher_is_rate_limited(tmp_path):
+    _build(tmp_path, "v1", 1)
+    publish_version(tmp_path, "v1")
+    watcher = PointerWatcher(tmp_path, interval_sec=3600)
+
+    assert watcher.poll()["version"] == "v1"
+    _build(tmp_path, "v2", 1)
+    publish_version(tmp_path, "v2")
+    assert watcher.poll() is None  # not due yet
+
+    watcher = PointerWatcher(tmp_path, interval_sec=0)
+    assert watcher.poll()["generation"] == 2
+    assert watcher.poll() is None  # unchanged
+
+
+def test_prune_keeps_current_and_previous_versions(tmp_path):
+    for version in ("v1", "v2", "v3", "v4"):
+        _build(tmp_path, version, 1)
+        publish_version(tmp_path, version)
+
+    assert prune_versions(tmp_path, keep=1) == ["v1", "v2"]
+    assert list_versions(tmp_path) == ["v3", "v4"]
@@ -0,0 +1,94 @@
+import json
+from decimal import Decimal
+from types import SimpleNamespace
+
+import pytest
+
+from agent import indexing
+from agent.numpy_store import NumpyCollection
+from agent.vector_store import VectorStoreConfig
+
+
+def _libro(libro_id, titulo="Rayuela", stock=3):
+    return SimpleNamespace(
+        id=libro_id,
+        titulo=titulo,
+        autor="Julio Cortázar",
+        isbn=f"978000000000{libro_id}",
+        categoria=SimpleNamespace(nombre="Novela"),
+        categoria_id=1,
+        editorial="Sudamericana",
+        año_publicacion=1963,
+        descripcion="",
+        precio=Decimal("10.00"),
+        stock=stock,
+    )
+
+
+@pytest.fixture()
+def sync_env(tmp_path, monkeypatch):
+    import numpy as np
+
+    collection = NumpyCollection("book_catalog", np.empty((0, 2), dtype=np.float32), [], [], [])
+    collection.db_dir = tmp_path
+    cfg = VectorStoreConfig(db_dir=tmp_path, collection="book_catalog", manifest_path=tmp_path / "manifest.json")
+    (tmp_path / "manifest.json").write_text(json.dumps({"collection": "book_catalog"}), encoding="utf-8")
+
+    db = {}
+    calls = {"embedded": []}
+
+    def fake_embed(texts):
+        calls["embedded"].extend(texts)
+        return [[1.0, float(len(t))] for t in texts]
+
+    monkeypatch.setattr(indexing, "_load_libros", lambda ids: {i: db[i] for i in ids if i in db})
+
+    def run(ids):
+        return indexing.sync_libros(ids, collection=collection, embed_fn=fake_embed, cfg=cfg)
+
+    return SimpleNamespace(collection=collection, db=db, calls=calls, run=run, manifest=tmp_path / "manifest.json")
+
+
+def test_sync_embeds_only_when_indexed_text_changes(sync_env):
+    sync_env.db[1] = _libro(1)
+    assert sync_env.run([1])["embedded"] == 1
+
+    sync_env.db[1] = _libro(1, stock=0)
+    stats = sync_env.run([1])
+    assert stats == {"embedded": 0, "updated": 1, "unchanged": 0, "deleted": 0}
+    assert sync_env.collection.get(ids=["libro:1"])["metadatas"][0]["stock"] == 0
+
+    assert sync_env.run([1])["unchanged"] == 1
+
+    sync_env.db[1] = _libro(1, titulo="Rayuela (edición crítica)")
+    assert sync_env.run([1])["embedded"] == 1
+    assert len(sync_env.calls["embedded"]) == 2
+
+
+def test_sync_deletes_missing_books_and_updates_manifest(sync_env):
+    sync_env.db[1] = _libro(1)
+    sync_env.db[2] = _libro(2, titulo="Final del juego")
+    sync_env.run([1, 2])
+
+    del sync_env.db[2]
+    stats = sync_env.run([2])
+
+    assert stats["deleted"] == 1
+    assert sync_env.collection.get()["ids"] == ["libro:1"]
+    manifest = json.loads(sync_env.manifest.read_text(encoding="utf-8"))
+    assert manifest["collection"] == "book_catalog"
+    assert manifest["counts"]["documents_indexed"] == 1
+    # Persisted atomically: a fresh load sees the same rows.
+    assert NumpyCollection.load(sync_env.manifest.parent, "book_catalog").get()["ids"] == ["libro:1"]
+
+
+def test_worker_coalesces_queued_ids_into_batches():
+    batches = []
+    worker = indexing.VectorSyncWorker(sync_fn=lambda ids: batches.append(ids) or {}, batch_size=2, delay_sec=60)
+
+    worker.enqueue([3, 1])
+    worker.enqueue([1, 2])
+    worker.flush()
+
+    assert batches == [[1, 2], [3]]
+    assert worker.pending() == 0
@@ -0,0 +1,67 @@
+import numpy as np
+import pytest
+
+from agent.ivf import IVFFlatIndex, ivf_path, train_ivf
+from agent.numpy_store import NumpyCollection, normalize_rows, write_numpy_collection
+
+
+def _vectors(n: int, dim: int = 16, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    return normalize_rows(rng.standard_normal((n, dim), dtype=np.float32))
+
+
+def _write(tmp_path, vectors: np.ndarray, nlist: int = 8) -> list[str]:
+    ids = [f"libro:{i}" for i in range(len(vectors))]
+    write_numpy_collection(
+        tmp_path, "libros", ids=ids, embeddings=vectors, documents=[None] * len(ids), metadatas=[None] * len(ids)
+    )
+    train_ivf(vectors, nlist).save(ivf_path(tmp_path, "libros"))
+    return ids
+
+
+def test_ivf_with_all_lists_probed_matches_exact_search(tmp_path):
+    vectors = _vectors(300)
+    _write(tmp_path, vectors)
+    exact = NumpyCollection.load(tmp_path, "libros")
+    ivf = NumpyCollection.load(tmp_path, "libros", ann="ivf_flat", nprobe=8)
+
+    for query in _vectors(10, seed=1):
+        expected = exact.query(query_embeddings=[query], n_results=5, include=["distances"])
+        got = ivf.query(query_embeddings=[query], n_results=5, include=["distances"])
+        assert got["ids"] == expected["ids"]
+        assert np.allclose(got["distances"], expected["distances"], atol=1e-5)
+
+
+def test_ivf_nprobe_limits_candidates():
+    vectors = _vectors(400)
+    index = train_ivf(vectors, 10)
+
+    candidates = index.candidates(vectors[0], nprobe=1)
+
+    assert 0 < candidates.size < len(vectors)
+    assert index.assignments[0] in set(index.assignments[candidates])
+
+
+def test_ivf_assignments_follow_upsert_and_delete(tmp_path):
+    vectors = _vectors(100)
+    _write(tmp_path, vectors, nlist=4)
+    collection = NumpyCollection.load(tmp_path, "libros", ann="ivf_flat", nprobe=4)
+
+    new = _vectors(1, seed=7)[0]
+    collection.upsert(ids=["libro:5", "libro:500"], embeddings=[new, new])
+    collection.delete(ids=["libro:0"])
+
+    reloaded = NumpyCollection.load(tmp_path, "libros", ann="ivf_flat", nprobe=4)
+    index = IVFFlatIndex.load(ivf_path(tmp_path, "libros"))
+    assert index.assignments.shape[0] == reloaded.count() == 100
+    hits = reloaded.query(query_embeddings=[new], n_results=2, include=["distances"])
+    assert sorted(hits["ids"][0]) == ["libro:5", "libro:500"]
+
+
+def test_stale_ivf_index_is_rejected(tmp_path):
+    vectors = _vectors(50)
+    _write(tmp_path, vectors, nlist=4)
+    train_ivf(vectors[:40], 4).save(ivf_path(tmp_path, "libros"))
+
+    with pytest.raises(ValueError):
+        NumpyCollection.load(tmp_path, "libros", ann="ivf_flat")
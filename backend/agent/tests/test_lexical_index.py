@@ -0,0 +1,177 @@
+from types import SimpleNamespace
+
+import pytest
+
+from agent import lexical_index as lexical_module
+from agent import retrieval
+from agent.lexical_index import BM25Index, build_index, get_lexical_index, reset_lexical_index
+from agent.result_cache import bump_lexical_version, get_lexical_version
+
+ROWS = [
+    {"id": 1, "titulo": "Cien años de soledad", "autor": "Gabriel García Márquez", "isbn": "9780307474728"},
+    {"id": 2, "titulo": "El amor en los tiempos del cólera", "autor": "Gabriel García Márquez", "isbn": "9780307389732"},
+    {"id": 3, "titulo": "Rayuela", "autor": "Julio Cortázar", "descripcion": "Novela sobre la soledad en París"},
+]
+
+
+@pytest.fixture()
+def lexical_index(monkeypatch):
+    index = build_index(ROWS)
+    reset_lexical_index(index)
+    monkeypatch.setattr(
+        retrieval,
+        "_fetch_libros",
+        lambda ids: {row["id"]: {"libro_id": row["id"], "titulo": row["titulo"]} for row in ROWS if row["id"] in ids},
+    )
+    yield index
+    reset_lexical_index(None)
+
+
+def test_bm25_ranks_title_match_above_description_match():
+    index = build_index(ROWS)
+
+    hits = index.search("soledad", k=3)
+
+    assert [doc_id for doc_id, _ in hits] == [1, 3]
+
+
+def test_bm25_upsert_and_remove_keep_postings_consistent():
+    index = BM25Index()
+    index.upsert(1, {"titulo": "Dune"})
+    index.upsert(1, {"titulo": "Fundación"})
+
+    assert index.search("dune", k=5) == []
+    assert [doc_id for doc_id, _ in index.search("fundacion", k=5)] == [1]
+
+    index.remove(1)
+    assert len(index) == 0
+    assert index.search("fundacion", k=5) == []
+
+
+def test_exact_isbn_and_author_match_accent_insensitive():
+    index = build_index(ROWS)
+
+    assert index.exact_match("978-0307474728") == [1]
+    assert index.exact_match("gabriel garcia marquez") == [1, 2]
+    assert index.exact_match("soledad") is None
+
+
+def test_reciprocal_rank_fusion_rewards_agreement():
+    fused = retrieval.reciprocal_rank_fusion([[1, 2, 3], [3, 1]])
+
+    assert [doc_id for doc_id, _ in fused] == [1, 3, 2]
+
+
+def test_hybrid_exact_author_skips_vector_search(lexical_index):
+    def vector_should_not_run(q, k):
+        raise AssertionError("vector search called")
+
+    res = retrieval.search_catalog(
+        "Julio Cortázar", k=3, mode="hybrid", vector_search_fn=vector_should_not_run, use_cache=False
+    )
+
+    assert res.source == "hybrid"
+    assert [row["libro_id"] for row in res.results] == [3]
+
+
+def test_hybrid_fuses_lexical_and_vector_hits(lexical_index):
+    def fake_vector(q, k):
+        return [
+            {"id": "libro:3", "distance": 0.1, "metadata": {"libro_id": 3}},
+            {"id": "libro:2", "distance": 0.3, "metadata": {}},
+        ]
+
+    res = retrieval.search_catalog("soledad", k=3, mode="hybrid", vector_search_fn=fake_vector, use_cache=False)
+
+    assert res.degraded is False
+    assert [row["libro_id"] for row in res.results] == [3, 1, 2]
+    assert res.results[0]["distance"] == 0.1
+    assert "distance" not in res.results[1]
+
+
+def test_hybrid_degrades_to_lexical_when_vector_unavailable(lexical_index):
+    def failing_vector(q, k):
+        raise retrieval.VectorStoreUnavailable("down")
+
+    res = retrieval.search_catalog("soledad", k=3, mode="hybrid", vector_search_fn=failing_vector, use_cache=False)
+
+    assert res.degraded is True
+    assert [row["libro_id"] for row in res.results] == [1, 3]
+
+
+@pytest.fixture()
+def rebuilds(monkeypatch):
+    started = []
+    monkeypatch.setattr(lexical_module, "_start_rebuild", lambda: started.append(True))
+    yield started
+    reset_lexical_index(None)
+
+
+def test_first_use_builds_in_the_background_instead_of_blocking(rebuilds):
+    reset_lexical_index(None)
+
+    assert get_lexical_index() is None
+    assert rebuilds == [True]
+
+
+def test_lexical_version_bump_triggers_rebuild_while_serving_current_index(rebuilds, monkeypatch):
+    index = build_index(ROWS)
+    reset_lexical_index(index)
+    assert get_lexical_index() is index
+    assert rebuilds == []
+
+    bump_lexical_version()  # e.g. another worker renamed a Libro
+    monkeypatch.setattr(lexical_module, "_version_checked_at", 0.0)
+
+    assert get_lexical_index() is index
+    assert rebuilds == [True]
+
+
+def test_version_is_read_at_most_once_per_interval(rebuilds):
+    index = build_index(ROWS)
+    reset_lexical_index(index)
+    assert get_lexical_index() is index
+
+    bump_lexical_version()
+
+    assert get_lexical_index() is index
+    assert rebuilds == []
+
+
+def test_stock_only_save_does_not_ask_other_workers_to_rebuild(rebuilds, monkeypatch):
+    from apps.libros import signals
+    from apps.libros.models import Libro
+
+    on_commit = []
+    monkeypatch.setattr(signals.transaction, "on_commit", on_commit.append)
+    reset_lexical_index(build_index(ROWS))
+    version = get_lexical_version()
+    libro = SimpleNamespace(pk=1, stock=3, precio="10.00", descripcion=None, editorial=None, **ROWS[0])
+
+    signals.indexar_libro(Libro, libro)
+    assert on_commit == []
+
+    libro.titulo = "Cien años de soledad (edición conmemorativa)"
+    signals.indexar_libro(Libro, libro)
+    assert get_lexical_version() == version  # published only once the transaction commits
+    on_commit.pop()()
+    assert get_lexical_version() == version + 1
+    # The writer already applied the change, so it does not rebuild its own index.
+    assert lexical_module._index_version == version + 1
+    assert [doc_id for doc_id, _ in lexical_module._index.search("conmemorativa", k=3)] == [1]
+
+
+def test_index_older_than_ttl_is_rebuilt(rebuilds, monkeypatch):
+    index = build_index(ROWS)
+    reset_lexical_index(index)
+    monkeypatch.setattr(lexical_module, "_index_built_at", lexical_module._index_built_at - 10_000)
+
+    assert get_lexical_index() is index
+    assert rebuilds == [True]
+
+
+def test_keyword_search_falls_back_to_orm_until_the_index_is_built(rebuilds, monkeypatch):
+    reset_lexical_index(None)
+    monkeypatch.setattr(retrieval, "_search_orm", lambda q, k: [{"libro_id": 99, "titulo": "ORM"}])
+
+    assert retrieval._search_keyword("soledad", 3) == [{"libro_id": 99, "titulo": "ORM"}]
@@ -0,0 +1,96 @@
+from dataclasses import dataclass
+from typing import Any
+
+import pytest
+from django.core.cache import caches
+
+from agent.agent_handler import handle_agent_message, stream_agent_message
+from agent.llm_factory import LLMConfig, OpenAICompatibleLLM
+
+
+@dataclass(frozen=True)
+class FakeRetrievalResult:
+    query: str
+    k: int
+    source: str
+    degraded: bool
+    results: list[dict[str, Any]]
+    warnings: list[str]
+
+
+def fake_retrieval(query: str, *, k: int = 5, prefer_vector: bool = True):
+    return FakeRetrievalResult(query, k, "orm", True, [{"libro_id": 1, "titulo": "Dune"}], [])
+
+
+class _Chunk:
+    def __init__(self, content: str) -> None:
+        self.content = content
+        self.response_metadata = {}
+
+
+class _CountingChatOpenAI:
+    calls = 0
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:  # noqa: ANN401
+        pass
+
+    def invoke(self, prompt: str) -> _Chunk:
+        type(self).calls += 1
+        return _Chunk("Dune está disponible. ¿Quieres detalles?")
+
+    def stream(self, prompt: str):
+        type(self).calls += 1
+        yield _Chunk("- Dune está disponible.\n")
+        yield _Chunk("- ¿Quieres detalles?")
+
+
+@pytest.fixture()
+def llm(monkeypatch):
+    monkeypatch.setattr("agent.llm_factory.ChatOpenAI", _CountingChatOpenAI)
+    _CountingChatOpenAI.calls = 0
+    caches["agent_llm"].clear()
+    config = LLMConfig(
+        provider="openai_compatible",
+        model="m",
+        base_url=None,
+        api_key="k",
+        timeout_sec=5,
+        max_tokens=256,
+        cost_mode="paid",
+        allow_byo_key=False,
+    )
+    return OpenAICompatibleLLM(config, api_key="k")
+
+
+def test_repeated_prompt_is_served_from_cache_after_guardrails(llm):
+    first = handle_agent_message("dune", include_trace=True, retrieval_fn=fake_retrieval, llm=llm)
+    second = handle_agent_message("dune", include_trace=True, retrieval_fn=fake_retrieval, llm=llm)
+
+    assert _CountingChatOpenAI.calls == 1
+    assert first.trace["llm"]["cache"] == "miss"
+    assert second.trace["llm"]["cache"] == "hit"
+    # The stored message is the coerced one, not the raw completion.
+    assert second.message == first.message
+    assert second.message.startswith("- ")
+    assert second.trace["llm"]["coerced"] is True
+
+
+def test_byo_key_requests_bypass_the_cache(llm):
+    for _ in range(2):
+        resp = handle_agent_message(
+            "dune", include_trace=True, retrieval_fn=fake_retrieval, llm=llm, byo_api_key="user-key"
+        )
+
+    assert _CountingChatOpenAI.calls == 2
+    assert resp.trace["llm"]["cache"] == "bypass"
+
+
+def test_stream_replays_cached_message(llm):
+    list(stream_agent_message("dune", retrieval_fn=fake_retrieval, llm=llm))
+    events = list(stream_agent_message("dune", include_trace=True, retrieval_fn=fake_retrieval, llm=llm))
+
+    assert _CountingChatOpenAI.calls == 1
+    assert [name for name, _ in events] == ["results", "token", "done"]
+    done = events[-1][1]
+    assert done["trace"]["llm"]["cache"] == "hit"
+    assert done["replaced"] is False
@@ -1,10 +1,13 @@
 """Tests for agent.llm_factory."""
+import asyncio
 from typing import Any
 
 import pytest
 from django.core.exceptions import ImproperlyConfigured
 
-from agent.llm_factory import OpenAICompatibleLLM, StubLLM, build_llm_runnable
+from agent import llm_factory
+from agent.cache import LRUCache
+from agent.llm_factory import OpenAICompatibleLLM, StubLLM, build_llm_runnable, clear_llm_clients
 
 
 class _FakeLCResponse:
@@ -19,9 +22,19 @@ class _FakeChatOpenAI:
     def __init__(self, *args: Any, **kwargs: Any) -> None:  # noqa: ANN401
         self._content = kwargs.get("_fake_content", "respuesta")
 
+        self.http_async_client = kwargs.get("http_async_client")
+
     def invoke(self, prompt: str) -> _FakeLCResponse:
         return _FakeLCResponse(self._content)
 
+    async def ainvoke(self, prompt: str) -> _FakeLCResponse:
+        return _FakeLCResponse(self._content)
+
+    def stream(self, prompt: str):
+        yield _FakeLCResponse("")
+        for word in self._content.split(" "):
+            yield _FakeLCResponse(word)
+
 
 @pytest.fixture(autouse=True)
 def _clear_env(monkeypatch: pytest.MonkeyPatch) -> None:
@@ -37,6 +50,7 @@ def _clear_env(monkeypatch: pytest.MonkeyPatch) -> None:
     ]
     for key in keys:
         monkeypatch.delenv(key, raising=False)
+    clear_llm_clients()
 
 
 def test_stub_provider_returns_stub(monkeypatch: pytest.MonkeyPatch) -> None:
@@ -82,4 +96,96 @@ def test_openai_compatible_uses_fake_client(monkeypatch: pytest.MonkeyPatch) ->
     assert out["model"]
 
 
-__all__ = ["test_stub_provider_returns_stub", "test_missing_key_in_paid_mode_falls_back_to_stub", "test_byo_key_mode_without_key_raises", "test_openai_compatible_uses_fake_client"]
+def test_openai_compatible_stream_skips_empty_chunks(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setenv("LLM_PROVIDER", "openai_compatible")
+    monkeypatch.setenv("LLM_COST_MODE", "hybrid")
+    monkeypatch.setenv("LLM_API_KEY", "server-key")
+    monkeypatch.setattr("agent.llm_factory.ChatOpenAI", _FakeChatOpenAI)
+
+    llm = build_llm_runnable()
+    assert list(llm.stream("hola")) == ["respuesta"]
+
+
+def test_openai_compatible_clients_are_reused_per_key(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setenv("LLM_PROVIDER", "openai_compatible")
+    monkeypatch.setenv("LLM_COST_MODE", "hybrid")
+    monkeypatch.setenv("LLM_ALLOW_BYO_KEY", "true")
+    monkeypatch.setenv("LLM_API_KEY", "server-key")
+    monkeypatch.setattr("agent.llm_factory.ChatOpenAI", _FakeChatOpenAI)
+
+    server = build_llm_runnable()
+    assert build_llm_runnable() is server
+    user = build_llm_runnable(byo_api_key="user-key")
+    assert user is not server
+    assert build_llm_runnable(byo_api_key="user-key") is user
+
+    monkeypatch.setenv("LLM_MODEL", "otro-modelo")
+    assert build_llm_runnable() is not server
+
+
+def test_sliding_lru_cache_expires_idle_entries(monkeypatch: pytest.MonkeyPatch) -> None:
+    now = [100.0]
+    monkeypatch.setattr("agent.cache.time.monotonic", lambda: now[0])
+    cache = LRUCache(10, ttl_sec=60, sliding=True)
+    cache.set("busy", 1)
+    cache.set("idle", 2)
+
+    now[0] += 50
+    assert cache.get("busy") == 1  # refreshes its idle timer
+    now[0] += 20
+    cache.set("new", 3)  # drops "idle" (70s without use) from the cold end
+
+    assert len(cache) == 2
+    assert cache.get("idle") is None
+    assert cache.get("busy") == 1
+
+
+
+def test_lru_cache_reports_evicted_and_cleared_values() -> None:
+    evicted: list[Any] = []
+    cache = LRUCache(2, on_evict=evicted.append)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.set("c", 3)  # pushes out "a"
+    cache.set("b", 20)  # replaces 2
+
+    assert evicted == [1, 2]
+    cache.clear()
+    assert sorted(evicted) == [1, 2, 3, 20]
+
+
+def test_clients_leaving_the_registry_are_retired(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setenv("LLM_PROVIDER", "openai_compatible")
+    monkeypatch.setenv("LLM_API_KEY", "server-key")
+    monkeypatch.setattr("agent.llm_factory.ChatOpenAI", _FakeChatOpenAI)
+    retired: list[Any] = []
+    monkeypatch.setattr(llm_factory._clients, "on_evict", retired.append)
+
+    llm = build_llm_runnable()
+    clear_llm_clients()
+
+    assert retired == [llm]
+
+
+def test_async_http_client_is_created_per_event_loop_and_closed(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setenv("LLM_PROVIDER", "openai_compatible")
+    monkeypatch.setenv("LLM_API_KEY", "server-key")
+    monkeypatch.setattr("agent.llm_factory.ChatOpenAI", _FakeChatOpenAI)
+    llm = build_llm_runnable()
+
+    async def call() -> Any:
+        await llm.ainvoke("hola")
+        await llm.ainvoke("otra vez")  # same loop: same client
+        return llm._async_model().http_async_client
+
+    first = asyncio.run(call())
+    second = asyncio.run(call())
+    assert first is not None and second is not None and first is not second
+    # The first loop is closed: its entry was evicted when the second loop asked for a client.
+    assert [entry[2] for entry in llm._async_clients.values()] == [second]
+
+    llm.close()
+    assert llm._http_client.is_closed
+
+
+__all__ = ["test_stub_provider_returns_stub", "test_missing_key_in_paid_mode_falls_back_to_stub", "test_byo_key_mode_without_key_raises", "test_openai_compatible_uses_fake_client", "test_openai_compatible_stream_skips_empty_chunks", "test_openai_compatible_clients_are_reused_per_key", "test_sliding_lru_cache_expires_idle_entries", "test_lru_cache_reports_evicted_and_cleared_values", "test_clients_leaving_the_registry_are_retired", "test_async_http_client_is_created_per_event_loop_and_closed"]
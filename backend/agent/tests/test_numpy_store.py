@@ -0,0 +1,125 @@
+import numpy as np
+
+from agent import numpy_store, retrieval, vector_store
+from agent.numpy_store import NumpyCollection, delta_path, matrix_path, top_k_indices, write_numpy_collection
+from agent.retrieval import search_catalog
+
+
+def _write_fixture(db_dir):
+    write_numpy_collection(
+        db_dir,
+        "book_catalog",
+        ids=["libro:1", "libro:2", "libro:3"],
+        embeddings=[[1.0, 0.0, 0.0], [0.0, 1.0, 0.0], [0.7, 0.7, 0.0]],
+        documents=["Título: A", "Título: B", "Título: C"],
+        metadatas=[{"libro_id": 1}, {"libro_id": 2}, {"libro_id": 3}],
+    )
+
+
+def test_top_k_indices_orders_best_first():
+    scores = np.array([0.1, 0.9, 0.5, 0.7])
+    assert top_k_indices(scores, 2).tolist() == [1, 3]
+    assert top_k_indices(scores, 10).tolist() == [1, 3, 2, 0]
+
+
+def test_numpy_collection_query_returns_chroma_shape(tmp_path):
+    _write_fixture(tmp_path)
+    collection = NumpyCollection.load(tmp_path, "book_catalog")
+
+    resp = collection.query(query_embeddings=[[1.0, 0.1, 0.0]], n_results=2)
+
+    assert resp["ids"] == [["libro:1", "libro:3"]]
+    assert resp["metadatas"][0][0] == {"libro_id": 1}
+    assert resp["distances"][0][0] < resp["distances"][0][1]
+
+
+def test_search_catalog_uses_numpy_backend(tmp_path, monkeypatch):
+    _write_fixture(tmp_path)
+    monkeypatch.setenv("VECTOR_DB_DIR", str(tmp_path))
+    monkeypatch.setenv("VECTOR_BACKEND", "numpy")
+    monkeypatch.setenv("VECTOR_EMBEDDING_MODEL", "fake-model")
+    fake_embedder = lambda cfg=None: (lambda texts: [[0.0, 1.0, 0.0] for _ in texts])  # noqa: E731
+    monkeypatch.setattr(vector_store, "get_embedding_function", fake_embedder)
+    monkeypatch.setattr(retrieval, "get_embedding_function", fake_embedder)
+    vector_store.clear_vector_store_cache()
+    retrieval.clear_embedding_cache()
+
+    try:
+        res = search_catalog("libro B", k=1)
+    finally:
+        vector_store.clear_vector_store_cache()
+        retrieval.clear_embedding_cache()
+
+    assert res.source == "vector"
+    assert res.degraded is False
+    assert res.results[0]["libro_id"] == 2
+
+
+def test_numpy_collection_query_prefilters_with_where(tmp_path):
+    write_numpy_collection(
+        tmp_path,
+        "book_catalog",
+        ids=["libro:1", "libro:2", "libro:3"],
+        embeddings=[[1.0, 0.0], [0.9, 0.1], [0.0, 1.0]],
+        documents=["A", "B", "C"],
+        metadatas=[
+            {"libro_id": 1, "categoria_key": "novela", "precio_num": 30.0, "in_stock": True},
+            {"libro_id": 2, "categoria_key": "novela", "precio_num": 10.0, "in_stock": True},
+            {"libro_id": 3, "categoria_key": "historia", "precio_num": 5.0, "in_stock": True},
+        ],
+    )
+    collection = NumpyCollection.load(tmp_path, "book_catalog")
+
+    where = {"$and": [{"categoria_key": "novela"}, {"precio_num": {"$lte": 20.0}}, {"in_stock": True}]}
+    resp = collection.query(query_embeddings=[[1.0, 0.0]], n_results=3, where=where)
+
+    assert resp["ids"] == [["libro:2"]]
+    assert len(resp["distances"][0]) == 1
+
+
+def test_writes_from_two_workers_append_to_the_delta_and_both_survive(tmp_path):
+    _write_fixture(tmp_path)
+    base_mtime = matrix_path(tmp_path, "book_catalog").stat().st_mtime_ns
+    worker_a = NumpyCollection.load(tmp_path, "book_catalog")
+    worker_b = NumpyCollection.load(tmp_path, "book_catalog")
+
+    worker_a.upsert(ids=["libro:4"], embeddings=[[0.0, 0.0, 1.0]], documents=["D"], metadatas=[{"libro_id": 4}])
+    worker_b.upsert(ids=["libro:5"], embeddings=[[0.0, 0.7, 0.7]], documents=["E"], metadatas=[{"libro_id": 5}])
+    worker_b.delete(ids=["libro:1"])
+
+    # Base files untouched: each write appended a few delta lines.
+    assert matrix_path(tmp_path, "book_catalog").stat().st_mtime_ns == base_mtime
+    assert len(delta_path(tmp_path, "book_catalog").read_text(encoding="utf-8").splitlines()) == 4
+    # worker_a picks up worker_b's writes on its next read.
+    assert worker_a.query(query_embeddings=[[0.0, 0.7, 0.7]], n_results=1)["ids"] == [["libro:5"]]
+    expected = ["libro:2", "libro:3", "libro:4", "libro:5"]
+    assert sorted(worker_a.get()["ids"]) == expected
+    assert sorted(NumpyCollection.load(tmp_path, "book_catalog").get()["ids"]) == expected
+
+
+def test_delta_is_folded_into_the_base_files(tmp_path, monkeypatch):
+    monkeypatch.setattr(numpy_store, "NUMPY_DELTA_MAX_ROWS", 2)
+    _write_fixture(tmp_path)
+    writer = NumpyCollection.load(tmp_path, "book_catalog")
+    reader = NumpyCollection.load(tmp_path, "book_catalog")
+
+    for i in range(4, 7):
+        writer.upsert(ids=[f"libro:{i}"], embeddings=[[0.0, 0.0, 1.0]], documents=[str(i)], metadatas=[{"libro_id": i}])
+
+    assert writer.count() == 6
+    assert len(delta_path(tmp_path, "book_catalog").read_text(encoding="utf-8").splitlines()) <= 3
+    # The reader's offsets refer to the old delta: it reloads instead of replaying them.
+    assert reader.count() == 3
+    assert reader.get(ids=["libro:6"])["ids"] == ["libro:6"]
+    assert reader.count() == 6
+
+
+def test_rebuild_discards_the_previous_delta(tmp_path):
+    _write_fixture(tmp_path)
+    collection = NumpyCollection.load(tmp_path, "book_catalog")
+    collection.upsert(ids=["libro:9"], embeddings=[[0.0, 0.0, 1.0]], documents=["Z"], metadatas=[{"libro_id": 9}])
+
+    _write_fixture(tmp_path)
+
+    assert NumpyCollection.load(tmp_path, "book_catalog").get()["ids"] == ["libro:1", "libro:2", "libro:3"]
+    assert collection.get(ids=["libro:9"])["ids"] == []
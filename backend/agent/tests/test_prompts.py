@@ -1,4 +1,4 @@
-from agent.prompts import build_llm_prompt
+from agent.prompts import PromptConfig, build_llm_prompt, compact_context, estimate_tokens
 from agent.retrieval import RetrievalResult
 
 
@@ -17,3 +17,52 @@ def test_build_llm_prompt_includes_query_and_message():
     assert "Busco novelas" in prompt
     assert "realismo mágico" in prompt
     assert "Cien años de soledad" in prompt
+
+
+def _long_rows(n: int) -> list[dict]:
+    return [
+        {
+            "libro_id": i,
+            "titulo": f"Libro {i}",
+            "autor": "Autora",
+            "precio": "19.99",
+            "stock": 2,
+            "descripcion": "Una historia de familias y pueblos. " * 40,
+            "distance": 0.123456789,
+            "editorial": "",
+        }
+        for i in range(n)
+    ]
+
+
+def test_build_llm_prompt_context_is_compact_and_keeps_ids():
+    retrieval = RetrievalResult(query="q", k=5, source="vector", degraded=False, results=_long_rows(3), warnings=[])
+
+    prompt = build_llm_prompt(user_message="Busco", retrieval=retrieval)
+
+    assert '"libro_id":0' in prompt
+    assert "distance" not in prompt
+    assert "editorial" not in prompt  # empty values are dropped
+    assert '"precio":"19.99"' in prompt
+
+
+def test_build_llm_prompt_respects_token_budget():
+    retrieval = RetrievalResult(query="q", k=5, source="vector", degraded=False, results=_long_rows(5), warnings=[])
+
+    roomy = build_llm_prompt(user_message="Busco", retrieval=retrieval, config=PromptConfig(max_prompt_tokens=4000))
+    tight = build_llm_prompt(user_message="Busco", retrieval=retrieval, config=PromptConfig(max_prompt_tokens=500))
+
+    assert estimate_tokens(tight) <= 500
+    assert estimate_tokens(tight) < estimate_tokens(roomy)
+    # Descriptions are cut before any result is dropped.
+    assert all(f'"libro_id":{i}' in tight for i in range(5))
+
+
+def test_compact_context_drops_trailing_results_when_even_bare_rows_do_not_fit():
+    retrieval = RetrievalResult(query="q", k=5, source="vector", degraded=False, results=_long_rows(5), warnings=[])
+
+    context = compact_context(retrieval, budget_tokens=40)
+
+    assert '"libro_id":0' in context
+    assert '"libro_id":4' not in context
+    assert "descripcion" not in context
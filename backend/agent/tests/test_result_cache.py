@@ -0,0 +1,83 @@
+import pytest
+
+from agent import retrieval
+from agent.result_cache import bump_catalog_version, get_catalog_version
+
+
+@pytest.fixture()
+def counted_vector(monkeypatch):
+    calls = {"vector": 0}
+
+    def fake_vector(q: str, k: int):
+        calls["vector"] += 1
+        return [{"id": "libro:1", "distance": 0.1, "metadata": {"libro_id": 1}}]
+
+    def fake_fetch(ids):
+        return {1: {"libro_id": 1, "stock": calls["vector"]}}
+
+    monkeypatch.setattr(retrieval, "_search_vector", fake_vector)
+    monkeypatch.setattr(retrieval, "_fetch_libros", fake_fetch)
+    bump_catalog_version()
+    return calls
+
+
+def test_search_catalog_serves_repeats_from_cache(counted_vector):
+    first = retrieval.search_catalog("dune cache test", k=3)
+    second = retrieval.search_catalog("dune cache test", k=3)
+
+    assert counted_vector["vector"] == 1
+    assert second == first
+
+
+def test_catalog_version_bump_invalidates_cached_results(counted_vector):
+    version = get_catalog_version()
+    first = retrieval.search_catalog("dune invalidation test", k=3)
+
+    bump_catalog_version()
+    second = retrieval.search_catalog("dune invalidation test", k=3)
+
+    assert get_catalog_version() == version + 1
+    assert counted_vector["vector"] == 2
+    assert second.results[0]["stock"] != first.results[0]["stock"]
+
+
+def test_libro_write_bumps_catalog_version_again_on_commit(counted_vector, monkeypatch):
+    from apps.libros import signals
+    from apps.libros.models import Libro
+
+    on_commit = []
+    monkeypatch.setattr(signals.transaction, "on_commit", on_commit.append)
+    version = get_catalog_version()
+
+    signals.invalidar_cache_busqueda_libro(Libro, object())
+    assert get_catalog_version() == version + 1
+
+    # A search during the transaction still sees the old row and caches it...
+    during = retrieval.search_catalog("dune commit test", k=3)
+    for callback in on_commit:
+        callback()
+    after = retrieval.search_catalog("dune commit test", k=3)
+
+    # ...but the commit orphans that entry too.
+    assert get_catalog_version() == version + 2
+    assert counted_vector["vector"] == 2
+    assert after.results[0]["stock"] != during.results[0]["stock"]
+
+
+def test_vector_failure_fallback_is_not_cached(monkeypatch):
+    calls = {"orm": 0}
+
+    def failing_vector(q: str, k: int):
+        raise retrieval.VectorStoreUnavailable("down")
+
+    def fake_orm(q: str, k: int):
+        calls["orm"] += 1
+        return [{"libro_id": 1}]
+
+    monkeypatch.setattr(retrieval, "_search_vector", failing_vector)
+    monkeypatch.setattr(retrieval, "_search_orm", fake_orm)
+
+    retrieval.search_catalog("fallback no cache", k=2)
+    retrieval.search_catalog("fallback no cache", k=2)
+
+    assert calls["orm"] == 2
@@ -1,6 +1,10 @@
+import asyncio
+import threading
+import time
+
 import pytest
 
-from agent.retrieval import search_catalog
+from agent.retrieval import search_catalog, search_catalog_async, search_catalog_raced
 from agent.vector_store import VectorStoreUnavailable
 
 
@@ -65,3 +69,285 @@ def test_search_catalog_invalid_k_is_handled(k):
 
     res = search_catalog("abc", k=k, prefer_vector=False, orm_search_fn=fake_orm)
     assert res.k == 5
+
+
+def test_embed_queries_caches_normalized_queries(monkeypatch):
+    from agent import retrieval
+    from agent.observability import METRICS
+
+    calls: list[list[str]] = []
+
+    def fake_embedding_fn(texts):
+        calls.append(list(texts))
+        return [[float(len(t)), 1.0] for t in texts]
+
+    monkeypatch.setenv("VECTOR_EMBEDDING_MODEL", "fake-model")
+    monkeypatch.setattr(retrieval, "get_embedding_function", lambda cfg=None: fake_embedding_fn)
+    retrieval.clear_embedding_cache()
+    before = METRICS.snapshot()["counters"]
+
+    first = retrieval.embed_queries(["Harry Potter", "  harry   POTTER ", "Dune"])
+    second = retrieval.embed_queries(["dune"])
+
+    after = METRICS.snapshot()["counters"]
+    assert calls == [["Harry Potter", "Dune"]]
+    assert first[0] is first[1]
+    assert second[0] is first[2]
+    assert after.get("agent.embedding_cache_hit", 0) - before.get("agent.embedding_cache_hit", 0) == 2
+    assert after.get("agent.embedding_cache_miss", 0) - before.get("agent.embedding_cache_miss", 0) == 2
+    retrieval.clear_embedding_cache()
+
+
+def test_search_catalog_many_issues_one_vector_call(monkeypatch):
+    from agent import retrieval
+
+    calls: list[list[str]] = []
+
+    def fake_vector_many(queries, k):
+        calls.append(list(queries))
+        return [[{"id": f"libro:{i}", "distance": 0.1}] for i, _ in enumerate(queries)]
+
+    monkeypatch.setattr(retrieval, "_search_vector_many", fake_vector_many)
+
+    batch = retrieval.search_catalog_many(["batch uno", "  ", "batch dos"], k=2, use_cache=False)
+
+    assert calls == [["batch uno", "batch dos"]]
+    assert [res.source for res in batch] == ["vector", "vector", "vector"]
+    assert batch[1].warnings == ["Empty query"]
+    assert batch[2].results[0]["libro_id"] == 1
+
+
+def test_search_catalog_many_deleted_book_does_not_shift_rows(monkeypatch):
+    from agent import retrieval
+
+    fetches: list[list[int]] = []
+
+    def fake_vector_many(queries, k):
+        return [
+            [{"id": "libro:1", "distance": 0.1}, {"id": "libro:2", "distance": 0.2}, {"id": "libro:3", "distance": 0.3}],
+            [{"id": "libro:4", "distance": 0.1}],
+        ]
+
+    def fake_fetch(ids):
+        fetches.append(list(ids))
+        titles = {1: "A", 3: "C", 4: "D"}  # libro 2 was deleted
+        return {i: {"libro_id": i, "titulo": titles[i]} for i in ids if i in titles}
+
+    monkeypatch.setattr(retrieval, "_search_vector_many", fake_vector_many)
+    monkeypatch.setattr(retrieval, "_fetch_libros", fake_fetch)
+
+    first, second = retrieval.search_catalog_many(["a", "b"], k=3, use_cache=False)
+
+    assert len(fetches) == 1
+    assert [row["titulo"] for row in first.results] == ["A", "C"]
+    assert [row["titulo"] for row in second.results] == ["D"]
+
+
+def test_search_catalog_many_falls_back_to_orm_per_query(monkeypatch):
+    from agent import retrieval
+
+    def failing_vector_many(queries, k):
+        raise VectorStoreUnavailable("no chroma")
+
+    monkeypatch.setattr(retrieval, "_search_vector_many", failing_vector_many)
+    monkeypatch.setattr(retrieval, "_search_orm", lambda q, k: [{"libro_id": len(q), "titulo": q}])
+
+    batch = retrieval.search_catalog_many(["a", "bbb"], k=2, use_cache=False)
+
+    assert [res.source for res in batch] == ["orm", "orm"]
+    assert [res.results[0]["libro_id"] for res in batch] == [1, 3]
+    assert all(res.degraded and "no chroma" in res.warnings for res in batch)
+
+
+def test_build_where_translates_filters_to_metadata_clauses():
+    from agent.retrieval import build_where
+
+    where = build_where({"categoria": "Fantasía", "editorial": "Minotauro", "precio_max": "50", "disponible": True})
+
+    # Price/stock are checked on live rows, never against index metadata.
+    assert where == {"$and": [{"categoria_key": "fantasia"}, {"editorial_key": "minotauro"}]}
+    assert build_where({"precio_max": "50", "disponible": True}) is None
+    assert build_where({"categoria": "7"}) == {"categoria_id": 7}
+    assert build_where({}) is None
+    with pytest.raises(ValueError):
+        build_where({"autor": "Borges"})
+
+
+def test_vector_hits_are_hydrated_with_live_rows_in_one_query(monkeypatch):
+    from agent import retrieval
+
+    fetches: list[list[int]] = []
+
+    def fake_fetch(ids):
+        fetches.append(list(ids))
+        return {2: {"libro_id": 2, "titulo": "Vivo", "precio": "12.00", "stock": 0}}
+
+    def fake_vector(q: str, k: int):
+        return [
+            {"id": "libro:2", "distance": 0.1, "metadata": {"libro_id": 2, "stock": 9, "precio": "10.00"}},
+            {"id": "libro:3", "distance": 0.2, "metadata": {"libro_id": 3}},
+        ]
+
+    monkeypatch.setattr(retrieval, "_fetch_libros", fake_fetch)
+
+    res = search_catalog("hidratar", k=2, vector_search_fn=fake_vector)
+
+    assert fetches == [[2, 3]]
+    # libro 3 no longer exists in the DB, so it is dropped.
+    assert res.results == [{"libro_id": 2, "titulo": "Vivo", "precio": "12.00", "stock": 0, "distance": 0.1}]
+
+
+
+def test_filtered_vector_search_checks_price_and_stock_on_live_rows(monkeypatch):
+    from agent import retrieval
+
+    calls = {}
+
+    def fake_vector(query, k, *, where=None):
+        calls.update(k=k, where=where)
+        # Index metadata says in stock / cheap; the DB disagrees for libro 1 and 3.
+        return [
+            {"id": f"libro:{i}", "distance": 0.1 * i, "metadata": {"libro_id": i, "in_stock": True, "precio_num": 5.0}}
+            for i in (1, 2, 3, 4)
+        ]
+
+    live = {
+        1: {"libro_id": 1, "precio": "8.00", "stock": 0},
+        2: {"libro_id": 2, "precio": "9.00", "stock": 4},
+        3: {"libro_id": 3, "precio": "80.00", "stock": 2},
+        4: {"libro_id": 4, "precio": "15.00", "stock": 1},
+    }
+    monkeypatch.setattr(retrieval, "_search_vector", fake_vector)
+    monkeypatch.setattr(retrieval, "_fetch_libros", lambda ids: {i: live[i] for i in ids})
+
+    results = retrieval.search_vector_filtered(
+        "novela", {"categoria": "Novela", "precio_max": "20", "disponible": True}, 2
+    )
+
+    assert [row["libro_id"] for row in results] == [2, 4]
+    assert calls == {"k": 20, "where": {"categoria_key": "novela"}}
+
+def test_hydration_falls_back_to_index_snapshot_when_db_unavailable():
+    from agent.hydration import SNAPSHOT_WARNING, hydrate_results
+
+    def broken_fetch(ids):
+        raise RuntimeError("db down")
+
+    rows, warnings = hydrate_results(
+        [{"id": "libro:5", "distance": 0.3, "metadata": {"libro_id": 5, "titulo": "Snap", "stock": 2}}],
+        fetch_fn=broken_fetch,
+    )
+
+    assert warnings == [SNAPSHOT_WARNING]
+    assert rows[0]["libro_id"] == 5
+    assert rows[0]["titulo"] == "Snap"
+    assert rows[0]["stock"] == 2
+    assert rows[0]["distance"] == 0.3
+
+
+def test_search_catalog_async_returns_orm_when_vector_exceeds_budget():
+    release = threading.Event()
+
+    def slow_vector(q: str, k: int):
+        release.wait(0.5)
+        return [{"id": "late", "distance": 0.1}]
+
+    def fake_orm(q: str, k: int):
+        return [{"libro_id": 7, "titulo": "rápido"}]
+
+    try:
+        res = asyncio.run(
+            search_catalog_async("dune", budget_ms=50, vector_search_fn=slow_vector, orm_search_fn=fake_orm)
+        )
+    finally:
+        release.set()
+    assert res.source == "orm"
+    assert res.degraded is True
+    assert res.results == [{"libro_id": 7, "titulo": "rápido"}]
+    assert res.race["winner"] == "orm"
+    assert res.race["legs_ms"]["vector"] is None
+    assert any("budget" in w for w in res.warnings)
+
+
+def test_search_catalog_async_prefers_vector_within_budget():
+    def fake_vector(q: str, k: int):
+        return [{"id": "v", "distance": 0.2}]
+
+    def fake_orm(q: str, k: int):
+        return [{"libro_id": 1}]
+
+    res = asyncio.run(
+        search_catalog_async("dune", budget_ms=1000, vector_search_fn=fake_vector, orm_search_fn=fake_orm)
+    )
+    assert res.source == "vector"
+    assert res.degraded is False
+    assert res.results == [{"id": "v", "distance": 0.2}]
+    assert res.race["winner"] == "vector"
+    # Answered within budget: the keyword leg never ran.
+    assert res.race["legs_ms"]["orm"] is None
+
+
+def test_search_catalog_async_falls_back_to_orm_when_hydration_fails(monkeypatch):
+    from agent import retrieval
+
+    def broken_hydrate(hits):
+        raise RuntimeError("db gone")
+
+    monkeypatch.setattr(retrieval, "_hydrate", broken_hydrate)
+
+    res = asyncio.run(
+        search_catalog_async(
+            "dune",
+            budget_ms=1000,
+            vector_search_fn=lambda q, k: [{"id": "v", "distance": 0.2}],
+            orm_search_fn=lambda q, k: [{"libro_id": 4}],
+        )
+    )
+    assert res.source == "orm"
+    assert res.degraded is True
+    assert res.results == [{"libro_id": 4}]
+    assert res.race["winner"] == "orm"
+    assert any("hydration failed" in w for w in res.warnings)
+
+
+def test_search_catalog_async_reuses_pending_orm_leg_when_hydration_fails(monkeypatch):
+    from agent import retrieval
+
+    def broken_hydrate(hits):
+        raise RuntimeError("db gone")
+
+    monkeypatch.setattr(retrieval, "_hydrate", broken_hydrate)
+    orm_calls = []
+
+    def slow_vector(q: str, k: int):
+        time.sleep(0.1)
+        return [{"id": "v", "distance": 0.2}]
+
+    def slow_orm(q: str, k: int):
+        orm_calls.append(q)
+        time.sleep(0.5)
+        return [{"libro_id": 6}]
+
+    # Vector misses the budget, so the ORM leg starts, but vector still finishes first.
+    res = asyncio.run(
+        search_catalog_async("dune", budget_ms=50, vector_search_fn=slow_vector, orm_search_fn=slow_orm)
+    )
+    assert res.source == "orm"
+    assert res.results == [{"libro_id": 6}]
+    assert res.race["winner"] == "orm"
+    assert orm_calls == ["dune"]
+    assert any("hydration failed" in w for w in res.warnings)
+
+
+def test_search_catalog_raced_does_not_wait_for_budget_after_vector_failure():
+    def failing_vector(q: str, k: int):
+        raise VectorStoreUnavailable("no index")
+
+    def fake_orm(q: str, k: int):
+        return [{"libro_id": 3}]
+
+    res = search_catalog_raced("dune", budget_ms=5000, vector_search_fn=failing_vector, orm_search_fn=fake_orm)
+    assert res.source == "orm"
+    assert res.race["winner"] == "orm"
+    assert res.race["total_ms"] < 5000
+    assert "no index" in res.warnings
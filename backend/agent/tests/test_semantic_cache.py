@@ -0,0 +1,83 @@
+import numpy as np
+
+from agent import retrieval
+from agent.circuit_breaker import CircuitBreaker
+from agent.observability import METRICS
+from agent.semantic_cache import SemanticCache, shadow_hit_rates
+
+
+def _hits(*libro_ids):
+    return [{"id": f"libro:{i}", "document": "texto largo", "metadata": {"libro_id": i}, "distance": 0.1} for i in libro_ids]
+
+
+def test_lookup_reuses_hits_above_threshold_only():
+    cache = SemanticCache(4, threshold=0.95)
+    cache.add([1.0, 0.0, 0.0], 2, _hits(1, 2))
+
+    hit = cache.lookup([0.99, 0.05, 0.0], 2)
+    assert [h["metadata"]["libro_id"] for h in hit] == [1, 2]
+    assert "document" not in hit[0]
+    assert cache.lookup([0.7, 0.7, 0.0], 2) is None
+    # Entries cached with fewer results cannot serve a larger k.
+    assert cache.lookup([1.0, 0.0, 0.0], 3) is None
+
+
+def test_lru_eviction_keeps_memory_bounded():
+    cache = SemanticCache(2, threshold=0.99)
+    cache.add([1.0, 0.0, 0.0], 1, _hits(1))
+    cache.add([0.0, 1.0, 0.0], 1, _hits(2))
+    assert cache.lookup([1.0, 0.0, 0.0], 1) is not None  # 1 is now most recent
+    cache.add([0.0, 0.0, 1.0], 1, _hits(3))
+
+    assert len(cache) == 2
+    assert cache.lookup([0.0, 1.0, 0.0], 1) is None
+    assert cache.lookup([1.0, 0.0, 0.0], 1) is not None
+
+
+def test_namespace_change_drops_entries():
+    cache = SemanticCache(4, threshold=0.9)
+    cache.add([1.0, 0.0], 1, _hits(1), namespace=("model", 1))
+
+    assert cache.lookup([1.0, 0.0], 1, namespace=("model", 2)) is None
+    assert len(cache) == 0
+
+
+def test_shadow_thresholds_record_would_be_hits():
+    cache = SemanticCache(4, threshold=2.0, shadow_thresholds=(0.8, 0.99))
+    before = METRICS.snapshot()["counters"]
+    cache.add([1.0, 0.0], 1, _hits(1))
+
+    assert cache.lookup([0.9, 0.3], 1) is None  # shadow only: threshold > 1 never hits
+    counters = METRICS.snapshot()["counters"]
+
+    def delta(name):
+        return counters.get(name, 0) - before.get(name, 0)
+
+    assert delta("agent.semantic_cache.lookup") == 1
+    assert delta("agent.semantic_cache.hit@0.80") == 1
+    assert delta("agent.semantic_cache.hit@0.99") == 0
+    rates = shadow_hit_rates({"agent.semantic_cache.lookup": 4, "agent.semantic_cache.hit@0.80": 1}, (0.8,))
+    assert rates == {"0.80": 0.25}
+
+
+def test_paraphrase_skips_collection_query_and_is_hydrated(monkeypatch):
+    queried = []
+
+    class FakeCollection:
+        def query(self, **kwargs):
+            queried.append(kwargs)
+            return {"ids": [["libro:7"]], "metadatas": [[{"libro_id": 7}]], "distances": [[0.1]]}
+
+    vectors = {"libros de garcía márquez": [1.0, 0.0], "novelas de gabriel garcía márquez": [0.98, 0.1]}
+    monkeypatch.setattr(retrieval, "get_vector_collection", lambda: FakeCollection())
+    monkeypatch.setattr(retrieval, "embed_queries", lambda qs: [np.asarray(vectors[q.lower()], dtype=np.float32) for q in qs])
+    monkeypatch.setattr(retrieval, "get_catalog_version", lambda: 1)
+    monkeypatch.setattr(retrieval, "VECTOR_BREAKER", CircuitBreaker("test_semantic"))
+    monkeypatch.setattr(retrieval, "_semantic_cache", SemanticCache(8, threshold=0.95))
+    monkeypatch.setattr(retrieval, "_fetch_libros", lambda ids: {7: {"libro_id": 7, "titulo": "Cien años", "stock": 4}})
+
+    first = retrieval.search_catalog("libros de García Márquez", k=1, use_cache=False)
+    second = retrieval.search_catalog("novelas de Gabriel García Márquez", k=1, use_cache=False)
+
+    assert len(queried) == 1
+    assert first.results == second.results == [{"libro_id": 7, "titulo": "Cien años", "stock": 4, "distance": 0.1}]
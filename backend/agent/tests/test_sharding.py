@@ -0,0 +1,91 @@
+import numpy as np
+
+from agent.numpy_store import NumpyCollection, normalize_rows
+from agent.sharding import ShardedCollection, routed_shard, shard_collection_name
+
+
+def _collection(name, ids, vectors, categoria_key):
+    metas = [{"libro_id": int(i.split(":")[1]), "categoria_key": categoria_key} for i in ids]
+    return NumpyCollection(name, normalize_rows(np.asarray(vectors, dtype=np.float32)), ids, [None] * len(ids), metas)
+
+
+class Spy:
+    def __init__(self, inner):
+        self.inner = inner
+        self.calls = []
+
+    def __getattr__(self, name):
+        def call(*args, **kwargs):
+            self.calls.append(name)
+            return getattr(self.inner, name)(*args, **kwargs)
+
+        return call
+
+
+def _sharded():
+    rng = np.random.default_rng(0)
+    fantasia = _collection("c__fantasia", [f"libro:{i}" for i in range(0, 20)], rng.standard_normal((20, 8)), "fantasia")
+    historia = _collection("c__historia", [f"libro:{i}" for i in range(20, 50)], rng.standard_normal((30, 8)), "historia")
+    return ShardedCollection("c", {"fantasia": Spy(fantasia), "historia": Spy(historia)}), fantasia, historia
+
+
+def test_fan_out_merges_top_k_like_a_single_collection():
+    sharded, fantasia, historia = _sharded()
+    single = NumpyCollection(
+        "all",
+        np.vstack([fantasia._state[0], historia._state[0]]),
+        fantasia._state[1] + historia._state[1],
+        [None] * 50,
+        fantasia._state[3] + historia._state[3],
+    )
+    queries = normalize_rows(np.random.default_rng(1).standard_normal((3, 8)).astype(np.float32))
+
+    got = sharded.query(query_embeddings=queries, n_results=5, include=["metadatas"])
+    expected = single.query(query_embeddings=queries, n_results=5, include=["metadatas"])
+
+    assert got["ids"] == expected["ids"]
+    assert got["metadatas"] == expected["metadatas"]
+    assert "distances" not in got
+
+
+def test_category_scoped_query_hits_only_its_shard():
+    sharded, _, _ = _sharded()
+    where = {"$and": [{"categoria_key": "historia"}, {"in_stock": True}]}
+
+    assert routed_shard(where) == "historia"
+    sharded.query(query_embeddings=[np.ones(8, dtype=np.float32)], n_results=3, where={"categoria_key": "historia"})
+
+    assert sharded.shards["historia"].calls == ["query"]
+    assert sharded.shards["fantasia"].calls == []
+    empty = sharded.query(query_embeddings=[np.ones(8)], n_results=3, include=["distances"], where={"categoria_key": "x"})
+    assert empty == {"ids": [[]], "distances": [[]]}
+
+
+def test_upsert_routes_by_category_and_moves_books_between_shards():
+    sharded, fantasia, historia = _sharded()
+    created = {}
+
+    def open_shard(key):
+        created[key] = NumpyCollection(key, np.empty((0, 0), dtype=np.float32), [], [], [])
+        return created[key]
+
+    sharded._open_shard = open_shard
+    vector = np.ones(8, dtype=np.float32)
+    sharded.upsert(
+        ids=["libro:3", "libro:99"],
+        embeddings=[vector, vector],
+        metadatas=[{"libro_id": 3, "categoria_key": "historia"}, {"libro_id": 99, "categoria_key": "poesia"}],
+    )
+
+    assert "libro:3" not in fantasia._state[1]
+    assert "libro:3" in historia._state[1]
+    assert created["poesia"].get()["ids"] == ["libro:99"]
+    assert sharded.count() == 51
+    assert sorted(sharded.get(ids=["libro:3", "libro:99"])["ids"]) == ["libro:3", "libro:99"]
+
+
+def test_shard_collection_names_are_unique_and_chroma_safe():
+    first = shard_collection_name("book_catalog", "ciencia ficcion")
+    assert first == "book_catalog__ciencia_ficcion"
+    assert shard_collection_name("book_catalog", "ciencia-ficcion", taken=[first]) == first + "_2"
+    assert len(shard_collection_name("x" * 80, "y" * 80)) <= 63
@@ -0,0 +1,38 @@
+from agent.synthetic_catalog import (
+    SYNTHETIC_ISBN_PREFIX,
+    build_workload,
+    generate_libro_rows,
+    relevance_recall,
+)
+
+
+def test_generate_libro_rows_is_deterministic_and_unique():
+    first = list(generate_libro_rows(200, seed=3))
+    second = list(generate_libro_rows(200, seed=3))
+
+    assert first == second
+    isbns = [row["isbn"] for row in first]
+    assert len(set(isbns)) == 200
+    assert all(len(isbn) == 13 and isbn.startswith(SYNTHETIC_ISBN_PREFIX) for isbn in isbns)
+
+
+def test_build_workload_judgements_match_catalog():
+    rows = list(generate_libro_rows(100, seed=1))
+    by_isbn = {row["isbn"]: row for row in rows}
+
+    workload = build_workload(rows, size=40, seed=1)
+
+    assert {case["kind"] for case in workload} == {"title", "author", "isbn", "topic"}
+    for case in workload:
+        assert case["relevant_isbns"]
+        if case["kind"] == "author":
+            assert all(by_isbn[isbn]["autor"] == case["query"] for isbn in case["relevant_isbns"])
+        if case["kind"] == "title":
+            assert by_isbn[case["relevant_isbns"][0]]["titulo"] == case["query"]
+
+
+def test_relevance_recall_caps_denominator_at_k():
+    assert relevance_recall(["a"], ["x", "a"], 2) == 1.0
+    assert relevance_recall(["a", "b", "c", "d"], ["a", "b"], 2) == 1.0
+    assert relevance_recall(["a", "b"], ["a", "x"], 2) == 0.5
+    assert relevance_recall([], ["a"], 2) == 0.0
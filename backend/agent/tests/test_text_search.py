@@ -0,0 +1,81 @@
+from apps.libros import search
+from apps.libros.models import Libro
+
+
+def test_full_text_search_disabled_outside_postgres(monkeypatch):
+    monkeypatch.delenv("LIBROS_FULL_TEXT_SEARCH", raising=False)
+    assert search.full_text_enabled() is (search.connections["default"].vendor == "postgresql")
+
+    monkeypatch.setenv("LIBROS_FULL_TEXT_SEARCH", "false")
+    assert search.full_text_enabled() is False
+
+
+def test_search_libros_falls_back_to_icontains(monkeypatch):
+    monkeypatch.setattr(search, "full_text_enabled", lambda using="default": False)
+
+    qs, ranked = search.search_libros(Libro.objects.all(), "borges")
+
+    assert ranked is False
+    sql = str(qs.query).lower()
+    for field in ("titulo", "autor", "isbn", "descripcion", "editorial"):
+        assert f'"libros_libro"."{field}" like' in sql
+    assert "rank" not in qs.query.annotations
+
+
+def test_search_libros_retries_with_icontains_when_full_text_matches_nothing(monkeypatch):
+    from django.db.models import QuerySet
+
+    monkeypatch.setattr(search, "full_text_enabled", lambda using="default": True)
+    monkeypatch.setattr(QuerySet, "exists", lambda self: False)
+
+    qs, ranked = search.search_libros(Libro.objects.all(), "Cien añ")
+
+    assert ranked is False
+    assert '"libros_libro"."titulo" like' in str(qs.query).lower()
+    assert "rank" not in qs.query.annotations
+
+
+def test_icontains_filter_matches_isbn_prefix_typed_with_hyphens(monkeypatch):
+    monkeypatch.setattr(search, "full_text_enabled", lambda using="default": False)
+
+    sql = str(search.search_libros(Libro.objects.all(), "978-84")[0].query)
+    assert '"libros_libro"."isbn" LIKE 97884%' in sql
+
+    sql = str(search.search_libros(Libro.objects.all(), "borges")[0].query)
+    assert sql.count(" LIKE ") == 5
+
+
+def test_strip_accents_for_trigram_queries():
+    assert search.strip_accents("García Márquez, años") == "Garcia Marquez, anos"
+
+
+def test_fuzzy_search_is_empty_outside_postgres(monkeypatch):
+    monkeypatch.setattr(search, "fuzzy_enabled", lambda using="default": False)
+
+    qs, ranked = search.fuzzy_search_libros(Libro.objects.all(), "Garcia Marques")
+
+    assert ranked is False
+    assert qs.query.is_empty()
+
+
+def test_search_orm_retries_with_fuzzy_lookup_when_nothing_matches(monkeypatch):
+    from django.db.models import Value
+
+    from agent import retrieval
+
+    calls = []
+
+    def ranked(qs, text):
+        return qs.annotate(rank=Value(1.0)), True
+
+    monkeypatch.setattr(search, "search_libros", ranked)
+    monkeypatch.setattr(search, "fuzzy_search_libros", ranked)
+
+    def fake_rows(qs, limit):
+        calls.append(qs.query.order_by)
+        return [] if len(calls) == 1 else [{"libro_id": 7, "titulo": "Cien años de soledad"}]
+
+    monkeypatch.setattr(retrieval, "rows_from_queryset", fake_rows)
+
+    assert retrieval._search_orm("Garcia Marques", 5) == [{"libro_id": 7, "titulo": "Cien años de soledad"}]
+    assert calls == [("-rank", "titulo"), ("-rank", "titulo")]
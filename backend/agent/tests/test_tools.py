@@ -128,3 +128,20 @@ def test_tool_recommend_similar_filters_same_book(monkeypatch):
     assert res.ok is True
     assert len(res.data["results"]) == 1
     assert res.data["results"][0]["metadata"]["libro_id"] == 11
+
+
+def test_tool_filter_catalog_prefers_filtered_vector_search(monkeypatch):
+    calls = {}
+
+    def fake_filtered(query, filters, k):
+        calls["args"] = (query, filters, k)
+        return [{"libro_id": 7, "titulo": "Libro Vector", "distance": 0.2}]
+
+    monkeypatch.setattr("agent.tools.search_vector_filtered", fake_filtered)
+
+    res = tool_filter_catalog({"categoria": "Fantasia", "disponible": True}, k=3, query="dragones")
+
+    assert res.ok is True
+    assert res.data["source"] == "vector"
+    assert res.data["results"][0]["libro_id"] == 7
+    assert calls["args"] == ("dragones", {"categoria": "Fantasia", "disponible": True}, 3)
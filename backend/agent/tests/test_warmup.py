@@ -0,0 +1,70 @@
+import numpy as np
+
+from agent import retrieval, vector_store, warmup
+
+
+class _FakeCollection:
+    def __init__(self):
+        self.queries = 0
+
+    def query(self, **kwargs):
+        self.queries += 1
+        return {"ids": [[]], "distances": [[]]}
+
+
+def test_warmup_loads_collection_and_runs_dummy_query(monkeypatch):
+    collection = _FakeCollection()
+    monkeypatch.setattr(vector_store, "get_vector_collection", lambda: collection)
+    monkeypatch.setattr(retrieval, "embed_queries", lambda queries: [np.zeros(3, dtype=np.float32) for _ in queries])
+    monkeypatch.setattr(retrieval, "LEXICAL_INDEX_ENABLED", False)
+    warmup.reset_warmup()
+
+    try:
+        assert warmup.start_warmup(force=True) is True
+        assert warmup.start_warmup(force=True) is False
+        warmup._thread.join(timeout=5)
+        status = warmup.warmup_status()
+    finally:
+        warmup.reset_warmup()
+
+    assert collection.queries == 1
+    assert status["status"] == "ready"
+    assert status["duration_ms"] is not None
+
+
+def test_search_catalog_routes_to_keyword_search_while_warming_up(monkeypatch):
+    def vector_should_not_run(q, k):
+        raise AssertionError("vector search called during warm-up")
+
+    monkeypatch.setattr(retrieval, "_search_vector", vector_should_not_run)
+    monkeypatch.setattr(retrieval, "_search_keyword", lambda q, k: [{"libro_id": 1}])
+    monkeypatch.setattr(retrieval, "vector_warming_up", lambda: True)
+
+    res = retrieval.search_catalog("warmup routing", k=2)
+
+    assert res.source == "orm"
+    assert res.degraded is True
+    assert any("warming up" in w for w in res.warnings)
+
+
+def test_state_inherited_through_fork_is_ignored(monkeypatch):
+    collection = _FakeCollection()
+    monkeypatch.setattr(vector_store, "get_vector_collection", lambda: collection)
+    monkeypatch.setattr(retrieval, "embed_queries", lambda queries: [np.zeros(3, dtype=np.float32) for _ in queries])
+    monkeypatch.setattr(retrieval, "LEXICAL_INDEX_ENABLED", False)
+    warmup.reset_warmup()
+    # What a gunicorn --preload worker sees: the master's "running" state and thread.
+    monkeypatch.setattr(warmup, "_thread", object())
+    warmup._state.update(status="running", pid=-1)
+
+    try:
+        assert warmup.vector_warming_up() is False
+        assert warmup.warmup_status()["status"] == "disabled"
+        assert warmup.start_warmup(force=True) is True
+        warmup._thread.join(timeout=5)
+        status = warmup.warmup_status()
+    finally:
+        warmup.reset_warmup()
+
+    assert status["status"] == "ready"
+    assert collection.queries == 1
@@ -4,7 +4,9 @@ import re
 from dataclasses import dataclass
 from typing import Any, Callable, Optional
 
-from .retrieval import RetrievalResult, search_catalog
+from .hydration import rows_from_queryset, serialize_libro
+from .retrieval import RetrievalResult, search_catalog, search_vector_filtered
+from .vector_store import VectorStoreUnavailable
 
 MAX_ACTION_QTY = 10
 
@@ -17,21 +19,6 @@ class ToolResult:
     warnings: list[str]
 
 
-def _serialize_libro(libro: Any) -> dict[str, Any]:
-    return {
-        "libro_id": libro.id,
-        "titulo": libro.titulo,
-        "autor": libro.autor,
-        "isbn": libro.isbn,
-        "precio": str(libro.precio) if getattr(libro, "precio", None) is not None else None,
-        "categoria": libro.categoria.nombre if getattr(libro, "categoria", None) else None,
-        "stock": libro.stock,
-        "editorial": getattr(libro, "editorial", None),
-        "año_publicacion": getattr(libro, "año_publicacion", None),
-        "descripcion": getattr(libro, "descripcion", None),
-    }
-
-
 def _serialize_reserva(reserva: Any) -> dict[str, Any]:
     return {
         "reserva_id": reserva.id,
@@ -114,7 +101,7 @@ def tool_lookup_book(*, book_id: Optional[int] = None, isbn: Optional[str] = Non
     except Exception as e:
         return ToolResult(ok=False, data=None, error="django_unavailable", warnings=[str(e)])
 
-    qs = Libro.objects.all()
+    qs = Libro.objects.select_related("categoria")
     if book_id is not None:
         qs = qs.filter(id=book_id)
     if isbn is not None and str(isbn).strip() != "":
@@ -128,10 +115,26 @@ def tool_lookup_book(*, book_id: Optional[int] = None, isbn: Optional[str] = Non
     if not libro:
         return ToolResult(ok=False, data={"results": []}, error="not_found", warnings=warnings)
 
-    return ToolResult(ok=True, data={"results": [_serialize_libro(libro)]}, error=None, warnings=warnings)
+    return ToolResult(ok=True, data={"results": [serialize_libro(libro)]}, error=None, warnings=warnings)
+
 
+def _filter_query_text(filters: dict[str, Any], query: Optional[str]) -> str:
+    text = (query or filters.get("q") or "").strip()
+    if text:
+        return text
+    # No free text: rank by the filter values themselves (e.g. the category name).
+    return " ".join(str(filters[key]) for key in ("categoria", "editorial") if filters.get(key)).strip()
+
+
+def tool_filter_catalog(filters: dict[str, Any], *, k: int = 5, query: Optional[str] = None) -> ToolResult:
+    """Filtered catalog search.
+
+    Tries one metadata-filtered vector query first (ranked semantically by `query`,
+    or the filter values); falls back to ORM filters when the filters cannot be
+    expressed as metadata, vector search is unavailable, or it returns nothing.
+    `data["source"]` tells which path answered.
+    """
 
-def tool_filter_catalog(filters: dict[str, Any], *, k: int = 5) -> ToolResult:
     warnings: list[str] = []
     try:
         k_int = int(k)
@@ -143,9 +146,29 @@ def tool_filter_catalog(filters: dict[str, Any], *, k: int = 5) -> ToolResult:
         k_int = 5
         warnings.append("Non-positive 'k' value; defaulted to 5")
 
+    text = _filter_query_text(filters, query)
+    if text:
+        try:
+            results = search_vector_filtered(text, filters, k_int)
+        except ValueError:
+            results = []
+        except VectorStoreUnavailable as e:
+            warnings.append(str(e))
+            results = []
+        except Exception as e:
+            warnings.append(f"Vector search failed: {e}")
+            results = []
+        if results:
+            return ToolResult(
+                ok=True,
+                data={"results": results, "warnings": warnings, "source": "vector"},
+                error=None,
+                warnings=warnings,
+            )
+
     try:
-        from django.db.models import Q
         from apps.libros.models import Libro
+        from apps.libros.search import search_libros
     except Exception as e:
         return ToolResult(ok=False, data=None, error="django_unavailable", warnings=[str(e)])
 
@@ -188,16 +211,14 @@ def tool_filter_catalog(filters: dict[str, Any], *, k: int = 5) -> ToolResult:
 
     query = filters.get("q")
     if query:
-        qs = qs.filter(
-            Q(titulo__icontains=query)
-            | Q(autor__icontains=query)
-            | Q(isbn__icontains=query)
-            | Q(descripcion__icontains=query)
-            | Q(editorial__icontains=query)
-        )
+        qs, ranked = search_libros(qs, str(query))
+        if ranked:
+            qs = qs.order_by("-rank")
 
-    results = [_serialize_libro(libro) for libro in qs[:k_int]]
-    return ToolResult(ok=True, data={"results": results, "warnings": warnings}, error=None, warnings=warnings)
+    results = rows_from_queryset(qs, limit=k_int)
+    return ToolResult(
+        ok=True, data={"results": results, "warnings": warnings, "source": "orm"}, error=None, warnings=warnings
+    )
 
 
 def tool_recommend_similar(
@@ -276,7 +297,7 @@ def tool_add_to_cart(*, user_id: int, book_id: int, cantidad: Any = 1) -> ToolRe
         "message": f"Libro '{libro.titulo}' agregado al carrito.",
         "result": {
             "carrito_id": carrito.id,
-            "libro": _serialize_libro(libro),
+            "libro": serialize_libro(libro),
             "cantidad": qty,
         },
     }
@@ -1,11 +1,17 @@
 from __future__ import annotations
 
 import json
+import logging
 import os
-from dataclasses import dataclass
+import threading
+import time
+from dataclasses import dataclass, replace
 from pathlib import Path
 from typing import Any, Optional
 
+from .index_versions import PointerWatcher, read_pointer, version_dir
+from .observability import elapsed_ms, log_event, record_counter, record_timing
+
 
 @dataclass(frozen=True)
 class VectorStoreConfig:
@@ -15,19 +21,53 @@ class VectorStoreConfig:
     embedding_model: Optional[str] = None
     embedding_device: str = "cpu"
     normalize_embeddings: bool = True
+    backend: str = "chroma"  # 'chroma' | 'numpy'
+    ann: str = "exact"  # numpy backend: 'exact' | 'ivf_flat'
+    ann_nprobe: int = 8
+    # Category shards (manifest `shards.collections`): categoria_key -> collection name.
+    shards: tuple[tuple[str, str], ...] = ()
+    # Versioned layout (`current.json`, see agent.index_versions): VECTOR_DB_DIR and the
+    # served version; `db_dir` is then `<root_dir>/versions/<version>`.
+    root_dir: Optional[Path] = None
+    version: Optional[str] = None
+    generation: int = 0
 
 
 class VectorStoreUnavailable(RuntimeError):
     pass
 
 
+_logger = logging.getLogger("agent")
+
+# How often workers stat `current.json` for a new index version, and how long a replaced
+# version stays open for in-flight queries before it is released.
+INDEX_CHECK_SEC = float(os.getenv("VECTOR_INDEX_CHECK_SEC", "5"))
+INDEX_RELEASE_GRACE_SEC = float(os.getenv("VECTOR_INDEX_RELEASE_GRACE_SEC", "30"))
+
+# VECTOR_DB_DIR -> pointer of the version this process serves ({} = unversioned layout).
+# Only `poll_index_version` moves it forward, so a publish never reopens in the request path.
+_served_versions: dict[str, dict[str, Any]] = {}
+
+
 def _load_manifest(manifest_path: Path) -> dict[str, Any]:
     with manifest_path.open("r", encoding="utf-8") as f:
         return json.load(f)
 
 
-def load_vector_store_config() -> VectorStoreConfig:
-    db_dir = Path(os.getenv("VECTOR_DB_DIR", "./backend/agent/vector_db")).resolve()
+def _root_dir() -> Path:
+    return Path(os.getenv("VECTOR_DB_DIR", "./backend/agent/vector_db")).resolve()
+
+
+def load_vector_store_config(*, pointer: Optional[dict[str, Any]] = None) -> VectorStoreConfig:
+    """Current config; `pointer` selects a specific published version (`current.json` payload)."""
+
+    root_dir = _root_dir()
+    if pointer is None:
+        pointer = _served_versions.get(str(root_dir))
+        if pointer is None:
+            pointer = _served_versions.setdefault(str(root_dir), read_pointer(root_dir) or {})
+    version = pointer.get("version") or None
+    db_dir = version_dir(root_dir, version) if version else root_dir
 
     # Manifest is the source of truth when present; env vars are optional overrides.
     manifest_env = os.getenv("VECTOR_DB_MANIFEST", "").strip()
@@ -64,6 +104,24 @@ def load_vector_store_config() -> VectorStoreConfig:
     else:
         normalize_embeddings = bool(((manifest or {}).get("embeddings", {}) or {}).get("normalize", True))
 
+    backend_env = os.getenv("VECTOR_BACKEND", "").strip().lower()
+    if backend_env:
+        backend = backend_env
+    else:
+        backend = str(
+            (manifest or {}).get("backend")
+            or ((manifest or {}).get("vector_db", {}) or {}).get("provider")
+            or "chroma"
+        ).lower()
+
+    ann_manifest = (manifest or {}).get("ann", {}) or {}
+    ann = (os.getenv("VECTOR_ANN", "").strip().lower() or str(ann_manifest.get("type") or "exact")).lower()
+    nprobe_env = os.getenv("VECTOR_ANN_NPROBE", "").strip()
+    ann_nprobe = int(nprobe_env or ann_manifest.get("nprobe") or 8)
+
+    shard_map = (((manifest or {}).get("shards") or {}).get("collections") or {}) if not collection_env else {}
+    shards = tuple(sorted((str(key), str(name)) for key, name in shard_map.items()))
+
     return VectorStoreConfig(
         db_dir=db_dir,
         collection=collection,
@@ -71,11 +129,132 @@ def load_vector_store_config() -> VectorStoreConfig:
         embedding_model=embedding_model,
         embedding_device=embedding_device,
         normalize_embeddings=normalize_embeddings,
+        backend=backend,
+        ann=ann,
+        ann_nprobe=ann_nprobe,
+        shards=shards,
+        root_dir=root_dir,
+        version=version,
+        generation=int(pointer.get("generation") or 0),
+    )
+
+
+class SentenceTransformerEmbedder:
+    """Lazy sentence-transformers wrapper, callable like a Chroma embedding function."""
+
+    def __init__(self, model_name: str, *, device: str = "cpu", normalize_embeddings: bool = True) -> None:
+        self.model_name = model_name
+        self.device = device
+        self.normalize_embeddings = normalize_embeddings
+        self._model = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    try:
+                        from sentence_transformers import SentenceTransformer
+                    except Exception as e:  # pragma: no cover
+                        raise VectorStoreUnavailable(
+                            "Vector search unavailable (missing dependencies). "
+                            "Install 'sentence-transformers' to enable it."
+                        ) from e
+                    self._model = SentenceTransformer(self.model_name, device=self.device)
+        return self._model
+
+    def __call__(self, input: list[str]) -> list[list[float]]:  # noqa: A002 - Chroma protocol name
+        model = self._load()
+        vectors = model.encode(
+            list(input),
+            convert_to_numpy=True,
+            normalize_embeddings=self.normalize_embeddings,
+        )
+        return vectors.tolist()
+
+
+_cached_embedding_fn: Any = None
+_cached_embedding_key: tuple[str, str, bool, str] | None = None
+_embedding_lock = threading.Lock()
+
+
+def get_embedding_function(cfg: VectorStoreConfig | None = None) -> Any:
+    """Return the process-wide embedder for the configured model.
+
+    With AGENT_EMBEDDING_SOCKET set, an `EmbeddingServiceClient` for the shared sidecar
+    (see `agent.embedding_service`), falling back to an in-process model; otherwise one
+    `SentenceTransformerEmbedder` per worker.
+    """
+
+    global _cached_embedding_fn, _cached_embedding_key
+
+    cfg = cfg or load_vector_store_config()
+    if not cfg.embedding_model:
+        raise VectorStoreUnavailable(
+            "VECTOR_EMBEDDING_MODEL not set and manifest missing/invalid. "
+            "Cannot determine embedding model for querying."  # noqa: E501
+        )
+
+    from .embedding_service import EMBEDDING_SOCKET, EmbeddingServiceClient
+
+    key = (cfg.embedding_model, cfg.embedding_device, cfg.normalize_embeddings, EMBEDDING_SOCKET)
+    with _embedding_lock:
+        if _cached_embedding_fn is None or _cached_embedding_key != key:
+            embedder = SentenceTransformerEmbedder(
+                cfg.embedding_model,
+                device=cfg.embedding_device,
+                normalize_embeddings=cfg.normalize_embeddings,
+            )
+            if EMBEDDING_SOCKET:
+                embedder = EmbeddingServiceClient(
+                    EMBEDDING_SOCKET,
+                    cfg.embedding_model,
+                    normalize_embeddings=cfg.normalize_embeddings,
+                    fallback=embedder,
+                )
+            _cached_embedding_fn = embedder
+            _cached_embedding_key = key
+        return _cached_embedding_fn
+
+
+# One cached collection per kind ("chroma" | "numpy" | "sharded"): (config key, collection).
+# Lookups and installs (including background swaps) happen under `_collections_lock`,
+# so a reader never pairs the new index version with the old collection or vice versa.
+_collections: dict[str, tuple[tuple[Any, ...], Any]] = {}
+_collections_lock = threading.Lock()
+
+
+def _collection_kind(cfg: VectorStoreConfig) -> str:
+    return "sharded" if cfg.shards else cfg.backend
+
+
+def _collection_key(cfg: VectorStoreConfig) -> tuple[Any, ...]:
+    return (
+        str(cfg.db_dir),
+        cfg.backend,
+        cfg.collection,
+        str(cfg.manifest_path or ""),
+        cfg.embedding_model or "",
+        cfg.normalize_embeddings,
+        cfg.ann,
+        cfg.ann_nprobe,
+        cfg.shards,
     )
 
 
-_cached_collection = None
-_cached_collection_key: tuple[str, str, str, str, bool] | None = None
+def _get_cached_collection(kind: str, opener: Any, *, force_reload: bool = False):
+    with _collections_lock:
+        cfg = load_vector_store_config()
+        key = _collection_key(cfg)
+        cached = _collections.get(kind)
+        if not force_reload and cached is not None and cached[0] == key:
+            return cached[1]
+
+    # Opened outside the lock: a slow first load must not block readers of other kinds.
+    collection = opener(cfg)
+    with _collections_lock:
+        _collections[kind] = (key, collection)
+    return collection
 
 
 def get_chroma_collection(*, force_reload: bool = False):
@@ -85,10 +264,10 @@ def get_chroma_collection(*, force_reload: bool = False):
     deps) are not installed, it raises VectorStoreUnavailable.
     """
 
-    global _cached_collection, _cached_collection_key
+    return _get_cached_collection("chroma", lambda cfg: _open_chroma_collection(cfg, cfg.collection), force_reload=force_reload)
 
-    cfg = load_vector_store_config()
 
+def _open_chroma_collection(cfg: VectorStoreConfig, name: str, *, create: bool = False):
     # Basic artifact presence check.
     if not cfg.db_dir.exists():
         raise VectorStoreUnavailable(
@@ -96,21 +275,14 @@ def get_chroma_collection(*, force_reload: bool = False):
             "Build or unzip the Chroma artifact under backend/agent/vector_db."  # noqa: E501
         )
 
-    model_name = cfg.embedding_model
-    if not model_name:
+    if not cfg.embedding_model:
         raise VectorStoreUnavailable(
             "VECTOR_EMBEDDING_MODEL not set and manifest missing/invalid. "
             "Cannot determine embedding model for querying."  # noqa: E501
         )
 
-    key = (str(cfg.db_dir), cfg.collection, str(cfg.manifest_path or ""), model_name, cfg.normalize_embeddings)
-
-    if not force_reload and _cached_collection is not None and _cached_collection_key == key:
-        return _cached_collection
-
     try:
         import chromadb
-        from chromadb.utils.embedding_functions import SentenceTransformerEmbeddingFunction
     except Exception as e:  # pragma: no cover
         raise VectorStoreUnavailable(
             "Vector search unavailable (missing dependencies). "
@@ -119,18 +291,255 @@ def get_chroma_collection(*, force_reload: bool = False):
 
     try:
         client = chromadb.PersistentClient(path=str(cfg.db_dir))
-        embedding_fn = SentenceTransformerEmbeddingFunction(
-            model_name=model_name,
-            device=cfg.embedding_device,
-            normalize_embeddings=cfg.normalize_embeddings,
-        )
-        collection = client.get_collection(name=cfg.collection, embedding_function=embedding_fn)
+        # Shared with agent.retrieval.embed_queries so each worker loads the model once.
+        embedding_fn = get_embedding_function(cfg)
+        if create:
+            return client.get_or_create_collection(
+                name=name, embedding_function=embedding_fn, metadata={"hnsw:space": "cosine"}
+            )
+        return client.get_collection(name=name, embedding_function=embedding_fn)
     except Exception as e:
         raise VectorStoreUnavailable(
             "Failed to open Chroma collection. Check VECTOR_DB_DIR/VECTOR_COLLECTION "
             "and that the artifact matches the expected embedding model."  # noqa: E501
         ) from e
 
-    _cached_collection = collection
-    _cached_collection_key = key
+
+def get_numpy_collection(*, force_reload: bool = False):
+    """Return the memory-mapped NumPy collection, else raise VectorStoreUnavailable."""
+
+    return _get_cached_collection("numpy", lambda cfg: _open_numpy_collection(cfg, cfg.collection), force_reload=force_reload)
+
+
+def _open_numpy_collection(cfg: VectorStoreConfig, name: str, *, create: bool = False):
+    try:
+        from .numpy_store import NumpyCollection, matrix_path, sidecar_path
+    except Exception as e:  # pragma: no cover
+        raise VectorStoreUnavailable("Vector search unavailable (missing dependency 'numpy').") from e
+
+    embedding_fn = get_embedding_function(cfg) if cfg.embedding_model else None
+    if not matrix_path(cfg.db_dir, name).exists() or not sidecar_path(cfg.db_dir, name).exists():
+        if create:
+            import numpy as np
+
+            collection = NumpyCollection(name, np.empty((0, 0), dtype=np.float32), [], [], [], embedding_function=embedding_fn)
+            collection.db_dir = cfg.db_dir
+            return collection
+        raise VectorStoreUnavailable(
+            f"Vector DB directory not found or incomplete: {cfg.db_dir} "
+            f"(expected {name}.npy and {name}.jsonl)."
+        )
+
+    try:
+        return NumpyCollection.load(cfg.db_dir, name, embedding_function=embedding_fn, ann=cfg.ann, nprobe=cfg.ann_nprobe)
+    except Exception as e:
+        if cfg.ann == "exact":
+            raise VectorStoreUnavailable("Failed to open NumPy vector index. Rebuild the artifact.") from e
+        # Missing/stale ANN structure: serve exact search rather than nothing.
+        _logger.warning({"event": "agent.ann_index_unavailable", "ann": cfg.ann, "collection": name, "error": str(e)})
+        try:
+            return NumpyCollection.load(cfg.db_dir, name, embedding_function=embedding_fn)
+        except Exception as exact_error:
+            raise VectorStoreUnavailable("Failed to open NumPy vector index. Rebuild the artifact.") from exact_error
+
+
+def _register_shard(cfg: VectorStoreConfig, key: str, name: str) -> None:
+    """Record a shard created at runtime (new category) in the manifest."""
+
+    path = cfg.manifest_path or (cfg.db_dir / "manifest.json")
+    manifest = _load_manifest(path) if path.exists() else {}
+    shards = manifest.setdefault("shards", {"by": "categoria", "collections": {}})
+    shards.setdefault("collections", {})[key] = name
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_text(json.dumps(manifest, ensure_ascii=False, indent=2), encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def _open_sharded_collection(cfg: VectorStoreConfig):
+    from .sharding import ShardedCollection, shard_collection_name
+
+    opener = _open_numpy_collection if cfg.backend == "numpy" else _open_chroma_collection
+    shards = {shard: opener(cfg, name) for shard, name in cfg.shards}
+    shard_names = dict(cfg.shards)
+
+    def open_shard(shard: str):
+        name = shard_collection_name(cfg.collection, shard, taken=list(shard_names.values()))
+        created = opener(cfg, name, create=True)
+        _register_shard(cfg, shard, name)
+        shard_names[shard] = name
+        # The manifest now lists the new shard: keep serving this instance under the new key.
+        key = _collection_key(replace(cfg, shards=tuple(sorted(shard_names.items()))))
+        with _collections_lock:
+            if _collections.get("sharded", (None, None))[1] is collection:
+                _collections["sharded"] = (key, collection)
+        return created
+
+    collection = ShardedCollection(cfg.collection, shards, open_shard=open_shard)
     return collection
+
+
+def get_sharded_collection(*, force_reload: bool = False):
+    """Return the category-sharded collection described by the manifest (`shards`)."""
+
+    return _get_cached_collection("sharded", _open_sharded_collection, force_reload=force_reload)
+
+
+def _open_vector_collection(cfg: VectorStoreConfig):
+    if cfg.shards:
+        return _open_sharded_collection(cfg)
+    if cfg.backend == "numpy":
+        return _open_numpy_collection(cfg, cfg.collection)
+    return _open_chroma_collection(cfg, cfg.collection)
+
+
+_watchers: dict[str, PointerWatcher] = {}
+_swap_thread: Optional[threading.Thread] = None
+_swap_state: dict[str, Any] = {"swaps": 0, "last_swap": None, "last_error": None}
+
+
+def _release_collection(cfg: VectorStoreConfig) -> None:
+    """Free a replaced version once in-flight queries are done with it (best effort).
+
+    NumPy memmaps are released by refcount when the last request drops them. Chroma
+    caches one system per persist path in `SharedSystemClient`; only the replaced
+    path's entry is dropped (the live version's system stays cached), so that system
+    is collected with its last client.
+    """
+
+    if cfg.backend != "chroma":
+        return
+    try:
+        from chromadb.api.client import SharedSystemClient
+
+        # chromadb spells the class attribute "_identifer_to_system".
+        for name in ("_identifer_to_system", "_identifier_to_system"):
+            systems = getattr(SharedSystemClient, name, None)
+            if isinstance(systems, dict):
+                systems.pop(str(cfg.db_dir), None)
+    except Exception as e:  # pragma: no cover - depends on the chromadb version
+        _logger.warning({"event": "agent.vector_index_release_failed", "db_dir": str(cfg.db_dir), "error": str(e)})
+
+
+def _swap_index_version(root: Path, pointer: dict[str, Any], watcher: PointerWatcher) -> None:
+    global _swap_thread
+
+    started = time.monotonic()
+    try:
+        cfg = load_vector_store_config(pointer=pointer)
+        collection = _open_vector_collection(cfg)
+        collection.count()  # touch the artifact before it takes traffic
+    except Exception as e:
+        # Keep serving the current version; the pointer is re-checked on the next interval.
+        watcher.reset()
+        _swap_state["last_error"] = str(e)
+        record_counter("agent.vector_index_swap_failed")
+        _logger.warning({"event": "agent.vector_index_swap_failed", "version": pointer.get("version"), "error": str(e)})
+        with _collections_lock:
+            _swap_thread = None
+        return
+
+    with _collections_lock:
+        previous = _served_versions.get(str(root))
+        old = _collections.get(_collection_kind(cfg))
+        _collections.clear()
+        _collections[_collection_kind(cfg)] = (_collection_key(cfg), collection)
+        _served_versions[str(root)] = pointer
+        _swap_thread = None
+
+    # Cached search results and semantic-cache hits came from the old version.
+    from .result_cache import bump_catalog_version
+
+    bump_catalog_version()
+
+    duration = elapsed_ms(started)
+    _swap_state.update(swaps=_swap_state["swaps"] + 1, last_swap=pointer.get("version"), last_error=None)
+    record_counter("agent.vector_index_swap")
+    record_timing("agent.vector_index_swap", duration)
+    log_event(
+        "agent.vector_index_swapped",
+        version=pointer.get("version"),
+        generation=pointer.get("generation"),
+        previous=(previous or {}).get("version"),
+        duration_ms=duration,
+    )
+    old_cfg = load_vector_store_config(pointer=previous) if old is not None and previous else None
+    if old_cfg is not None and old_cfg.db_dir != cfg.db_dir:
+        timer = threading.Timer(INDEX_RELEASE_GRACE_SEC, _release_collection, args=(old_cfg,))
+        timer.daemon = True
+        timer.start()
+
+
+def poll_index_version() -> bool:
+    """Start a background swap if `current.json` points at a new version. True if started."""
+
+    global _swap_thread
+
+    root = _root_dir()
+    watcher = _watchers.get(str(root))
+    if watcher is None:
+        watcher = _watchers.setdefault(str(root), PointerWatcher(root, interval_sec=INDEX_CHECK_SEC))
+    pointer = watcher.poll()
+    if pointer is None:
+        return False
+    with _collections_lock:
+        served = _served_versions.get(str(root)) or {}
+        if (pointer.get("version"), pointer.get("generation")) == (served.get("version"), served.get("generation")):
+            return False
+        if not _collections:
+            # Nothing opened yet: the next lookup opens the new version directly.
+            _served_versions[str(root)] = pointer
+            return False
+        if _swap_thread is not None:
+            watcher.reset()  # re-check once the running swap is done
+            return False
+        _swap_thread = threading.Thread(
+            target=_swap_index_version, args=(root, pointer, watcher), name="agent-index-swap", daemon=True
+        )
+        _swap_thread.start()
+    return True
+
+
+def index_version_status() -> dict[str, Any]:
+    root = _root_dir()
+    with _collections_lock:
+        served = dict(_served_versions.get(str(root)) or {})
+        swapping = _swap_thread is not None
+    return {
+        "version": served.get("version"),
+        "generation": served.get("generation"),
+        "swapping": swapping,
+        "check_interval_sec": INDEX_CHECK_SEC,
+        **_swap_state,
+    }
+
+
+def get_vector_collection(*, force_reload: bool = False):
+    """Return the collection for the configured backend (`VECTOR_BACKEND` / manifest).
+
+    With a versioned layout (`current.json`) this also checks, at most every
+    VECTOR_INDEX_CHECK_SEC, for a newly published version; it is opened in the
+    background and swapped in while the current one keeps serving.
+    """
+
+    poll_index_version()
+    cfg = load_vector_store_config()
+    if cfg.backend not in {"numpy", "chroma"}:
+        raise VectorStoreUnavailable(f"Unknown vector backend: {cfg.backend}")
+    if cfg.shards:
+        return get_sharded_collection(force_reload=force_reload)
+    if cfg.backend == "numpy":
+        return get_numpy_collection(force_reload=force_reload)
+    return get_chroma_collection(force_reload=force_reload)
+
+
+def clear_vector_store_cache() -> None:
+    """Drop cached collections/embedders (tests, or after rebuilding an artifact)."""
+
+    global _cached_embedding_fn, _cached_embedding_key
+
+    with _collections_lock:
+        _collections.clear()
+        _served_versions.clear()
+        _watchers.clear()
+    _cached_embedding_fn = None
+    _cached_embedding_key = None
@@ -0,0 +1,133 @@
+"""Background warm-up of the retrieval stack at worker boot (opt-in: AGENT_WARMUP=true).
+
+Imports the vector backend, loads the embedding model, opens the collection and runs
+one dummy query in a daemon thread, so the first real request does not pay for it.
+While the warm-up is running `search_catalog` routes to the keyword fallback instead
+of blocking on the model load (see `vector_warming_up`).
+
+Started from `config/wsgi.py` and `config/asgi.py`, which only server processes
+import: management commands never warm up, and `runserver` warms up in the process
+that serves (the reloader's child), not in the reloader parent. The state records the
+pid that started it, so a forked child does not inherit "running" from its parent.
+When gunicorn runs with `--preload` the master imports the app and the warm-up thread
+does not survive the fork; call `gunicorn_post_fork` from the gunicorn config to warm
+up each worker:
+
+    # gunicorn.conf.py
+    from agent.warmup import gunicorn_post_fork as post_fork
+"""
+from __future__ import annotations
+
+import logging
+import os
+import threading
+import time
+from typing import Any, Optional
+
+from .observability import elapsed_ms, log_event, record_timing
+
+WARMUP_ENABLED = (os.getenv("AGENT_WARMUP", "false") or "false").strip().lower() in {"1", "true", "yes"}
+WARMUP_QUERY = "libro"
+
+_logger = logging.getLogger("agent")
+_lock = threading.Lock()
+_state: dict[str, Any] = {"status": "disabled", "duration_ms": None, "error": None, "pid": None}
+_thread: Optional[threading.Thread] = None
+
+
+def _run() -> None:
+    # Imported here: retrieval imports this module.
+    from .lexical_index import get_lexical_index
+    from .retrieval import DEFAULT_RETRIEVAL_MODE, LEXICAL_INDEX_ENABLED, embed_queries
+    from .vector_store import get_vector_collection
+
+    def build_lexical() -> None:
+        if not (LEXICAL_INDEX_ENABLED or DEFAULT_RETRIEVAL_MODE == "hybrid"):
+            return
+        try:
+            get_lexical_index(wait=True)
+        except Exception as e:  # the lexical index is optional, vector is the point here
+            _logger.warning({"event": "agent.warmup_lexical_failed", "error": str(e)})
+
+    started = time.monotonic()
+    try:
+        collection = get_vector_collection()
+        embedding = embed_queries([WARMUP_QUERY])[0]
+        collection.query(query_embeddings=[embedding.tolist()], n_results=1, include=["distances"])
+        build_lexical()
+    except Exception as e:
+        with _lock:
+            _state.update(status="failed", duration_ms=elapsed_ms(started), error=str(e))
+        _logger.warning({"event": "agent.warmup_failed", "duration_ms": elapsed_ms(started), "error": str(e)})
+        # Keyword search is all this worker has now: have its index ready.
+        build_lexical()
+        return
+    finally:
+        try:
+            from django.db import connections
+
+            connections.close_all()
+        except Exception:  # pragma: no cover
+            pass
+
+    duration = elapsed_ms(started)
+    with _lock:
+        _state.update(status="ready", duration_ms=duration, error=None)
+    record_timing("agent.warmup", duration)
+    log_event("agent.warmup_ready", duration_ms=duration)
+
+
+def start_warmup(*, force: bool = False) -> bool:
+    """Start the warm-up thread once per process. Returns False when disabled or already started."""
+
+    global _thread
+
+    if not (WARMUP_ENABLED or force):
+        return False
+    with _lock:
+        # A thread started by another pid belongs to the parent we were forked from.
+        if _thread is not None and _state["pid"] == os.getpid():
+            return False
+        _state.update(status="running", duration_ms=None, error=None, pid=os.getpid())
+        _thread = threading.Thread(target=_run, name="agent-warmup", daemon=True)
+        _thread.start()
+    return True
+
+
+def gunicorn_post_fork(server: Any = None, worker: Any = None) -> None:
+    """gunicorn `post_fork` hook: warm up inside each worker process."""
+
+    start_warmup()
+
+
+def vector_warming_up() -> bool:
+    """True while this process's warm-up thread is still loading the vector stack."""
+
+    with _lock:
+        return _state["status"] == "running" and _state["pid"] == os.getpid()
+
+
+def warmup_status() -> dict[str, Any]:
+    with _lock:
+        if _state["pid"] not in (None, os.getpid()):
+            # Inherited through fork: this process never warmed up.
+            return {"status": "disabled", "duration_ms": None, "error": None}
+        return {key: value for key, value in _state.items() if key != "pid"}
+
+
+def reset_warmup() -> None:
+    """Forget warm-up state (tests)."""
+
+    global _thread
+    with _lock:
+        _thread = None
+        _state.update(status="disabled", duration_ms=None, error=None, pid=None)
+
+
+__all__ = [
+    "gunicorn_post_fork",
+    "reset_warmup",
+    "start_warmup",
+    "vector_warming_up",
+    "warmup_status",
+]
@@ -0,0 +1,179 @@
+"""Benchmark `search_catalog` against the configured database.
+
+Optionally seeds a synthetic catalog (`--generate N`, see `agent.synthetic_catalog`),
+builds a query workload with relevance judgements from the catalog rows (or loads
+one with `--workload`), replays it through each retrieval mode and prints a JSON
+report (latency percentiles, throughput, recall@k, source mix) to diff across
+releases.
+
+Modes:
+    vector   search_catalog(mode="vector")  (falls back to keyword if no vector DB)
+    hybrid   search_catalog(mode="hybrid")
+    keyword  search_catalog(prefer_vector=False)  (BM25 index when enabled, else ORM)
+    orm      ORM search (PostgreSQL full-text, `icontains` elsewhere)
+
+The vector modes need an index of the same catalog: after `--generate`, run
+`build_vector_index` before benchmarking them.
+"""
+from __future__ import annotations
+
+import json
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable
+
+from django.core.management.base import BaseCommand, CommandError
+
+from agent import retrieval
+from agent.benchmarking import summarize_latencies
+from agent.lexical_index import get_lexical_index, reset_lexical_index
+from agent.result_cache import bump_catalog_version
+from agent.synthetic_catalog import (
+    SYNTHETIC_ISBN_PREFIX,
+    build_workload,
+    create_synthetic_catalog,
+    delete_synthetic_catalog,
+    relevance_recall,
+)
+from agent.vector_store import load_vector_store_config
+
+MODES: dict[str, dict[str, Any]] = {
+    "vector": {"mode": "vector"},
+    "hybrid": {"mode": "hybrid"},
+    "keyword": {"prefer_vector": False},
+    "orm": {"prefer_vector": False, "orm_search_fn": retrieval._search_orm},
+}
+
+
+def run_mode(
+    search: Callable[..., Any], workload: list[dict[str, Any]], *, k: int, warmup: int, **kwargs: Any
+) -> dict[str, Any]:
+    """Replay `workload` through `search(query, k=..., **kwargs)` and summarize it."""
+
+    started = time.perf_counter()
+    for case in workload[:warmup]:
+        search(case["query"], k=k, **kwargs)
+    warmup_ms = (time.perf_counter() - started) * 1000.0
+
+    latencies: list[float] = []
+    sources: Counter[str] = Counter()
+    recall_by_kind: dict[str, list[float]] = {}
+    degraded = 0
+    for case in workload:
+        started = time.perf_counter()
+        result = search(case["query"], k=k, **kwargs)
+        latencies.append((time.perf_counter() - started) * 1000.0)
+        sources[result.source] += 1
+        degraded += int(result.degraded)
+        found = [row.get("isbn") for row in result.results]
+        recall = relevance_recall(case.get("relevant_isbns") or [], found, k)
+        recall_by_kind.setdefault(case.get("kind", "query"), []).append(recall)
+
+    recalls = [value for values in recall_by_kind.values() for value in values]
+    return {
+        **summarize_latencies(latencies),
+        "warmup_ms": round(warmup_ms, 3),
+        "recall_at_k": round(sum(recalls) / len(recalls), 4) if recalls else 0.0,
+        "recall_by_kind": {kind: round(sum(v) / len(v), 4) for kind, v in sorted(recall_by_kind.items())},
+        "sources": dict(sources),
+        "degraded": degraded,
+    }
+
+
+class Command(BaseCommand):
+    help = "Mide latencia, throughput y recall de search_catalog por modo de retrieval (reporte JSON)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--generate", type=int, default=0, help="Crea N libros sintéticos antes de medir.")
+        parser.add_argument("--purge", action="store_true", help="Borra los libros sintéticos (ISBN 999…).")
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument("--modes", default="vector,hybrid,keyword,orm")
+        parser.add_argument("--queries", type=int, default=200, help="Tamaño del workload generado.")
+        parser.add_argument("--k", type=int, default=5)
+        parser.add_argument("--warmup", type=int, default=5, help="Consultas no medidas antes de cada modo.")
+        parser.add_argument("--use-cache", action="store_true", help="Mide con el cache de resultados activo.")
+        parser.add_argument("--synthetic-only", action="store_true", help="Workload solo con libros sintéticos.")
+        parser.add_argument("--workload", default="", help="Workload JSON existente (ignora --queries).")
+        parser.add_argument("--save-workload", default="", help="Guarda el workload usado en este path.")
+        parser.add_argument("--output", default="", help="Escribe el reporte JSON en este path.")
+
+    def _catalog_rows(self, synthetic_only: bool):
+        from apps.libros.models import Libro
+
+        qs = Libro.objects.all()
+        if synthetic_only:
+            qs = qs.filter(isbn__startswith=SYNTHETIC_ISBN_PREFIX)
+        for row in qs.values("titulo", "autor", "isbn", "categoria__nombre", "descripcion").iterator(chunk_size=5000):
+            yield {**row, "categoria": row.pop("categoria__nombre")}
+
+    def handle(self, *args, **options):
+        from apps.libros.models import Libro
+
+        modes = [m.strip() for m in options["modes"].split(",") if m.strip()]
+        unknown = [m for m in modes if m not in MODES]
+        if unknown:
+            raise CommandError(f"Modos desconocidos: {', '.join(unknown)} (disponibles: {', '.join(MODES)})")
+
+        if options["purge"] or options["generate"]:
+            if options["purge"]:
+                self.stderr.write(f"Borrados {delete_synthetic_catalog()} libros sintéticos")
+            if options["generate"]:
+                started = time.monotonic()
+                created = create_synthetic_catalog(options["generate"], seed=options["seed"])
+                self.stderr.write(f"Creados {created} libros sintéticos ({time.monotonic() - started:.1f}s)")
+            # bulk_create/bulk delete skip signals: invalidate derived state by hand.
+            reset_lexical_index()
+            bump_catalog_version()
+            if options["purge"] and not options["generate"]:
+                return
+
+        if options["workload"]:
+            workload = json.loads(Path(options["workload"]).read_text(encoding="utf-8"))["queries"]
+        else:
+            rows = self._catalog_rows(options["synthetic_only"])
+            workload = build_workload(rows, size=options["queries"], seed=options["seed"])
+        if not workload:
+            raise CommandError("El catálogo está vacío: usa --generate N o --workload.")
+        if options["save_workload"]:
+            Path(options["save_workload"]).write_text(
+                json.dumps({"queries": workload}, ensure_ascii=False, indent=2), encoding="utf-8"
+            )
+
+        cfg = load_vector_store_config()
+        report: dict[str, Any] = {
+            "run_at_utc": datetime.now(timezone.utc).isoformat(),
+            "catalog": {
+                "libros": Libro.objects.count(),
+                "synthetic": Libro.objects.filter(isbn__startswith=SYNTHETIC_ISBN_PREFIX).count(),
+            },
+            "config": {
+                "k": options["k"],
+                "use_cache": options["use_cache"],
+                "lexical_index": retrieval.LEXICAL_INDEX_ENABLED,
+                "vector_backend": cfg.backend,
+                "vector_collection": cfg.collection,
+                "ann": cfg.ann,
+            },
+            "workload": {"queries": len(workload), "kinds": dict(Counter(c.get("kind", "query") for c in workload))},
+            "modes": {},
+        }
+        if retrieval.LEXICAL_INDEX_ENABLED or any(MODES[mode].get("mode") == "hybrid" for mode in modes):
+            # Built in the background on first use otherwise: measure it warm.
+            get_lexical_index(wait=True)
+        for mode in modes:
+            report["modes"][mode] = run_mode(
+                retrieval.search_catalog,
+                workload,
+                k=options["k"],
+                warmup=options["warmup"],
+                use_cache=options["use_cache"],
+                **MODES[mode],
+            )
+            self.stderr.write(json.dumps({"mode": mode, **report["modes"][mode]}, ensure_ascii=False))
+
+        payload = json.dumps(report, ensure_ascii=False, indent=2)
+        if options["output"]:
+            Path(options["output"]).write_text(payload, encoding="utf-8")
+        self.stdout.write(payload)
@@ -0,0 +1,388 @@
+"""Build the agent vector index straight from the database.
+
+Streams `Libro` rows in primary-key order (`iterator(chunk_size=...)`), embeds them in
+batches and writes each batch to the target backend, so memory stays bounded by the
+batch size. After every batch a checkpoint (`<collection>.build.json`) records the
+last indexed id; re-running the command resumes from there unless `--restart`.
+
+With `--shard-by categoria` every category gets its own collection
+(`<collection>__<slug>`, see `agent.sharding`) and the layout is recorded in the
+manifest under `shards`.
+
+With `--publish` the index is built into `<output-dir>/versions/<version>/` and
+`current.json` is pointed at it once complete (see `agent.index_versions`); running
+workers pick it up without a restart. An interrupted publish resumes the newest
+unpublished version that still has a checkpoint.
+"""
+from __future__ import annotations
+
+import json
+import os
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Iterator
+
+from django.core.management.base import BaseCommand, CommandError
+
+from agent.index_versions import (
+    list_versions,
+    new_version_name,
+    prune_versions,
+    publish_version,
+    read_pointer,
+    version_dir,
+)
+from agent.indexing import libro_to_document, write_json_atomic, write_manifest
+from agent.sharding import shard_collection_name, shard_key
+from agent.vector_store import SentenceTransformerEmbedder, clear_vector_store_cache, load_vector_store_config
+
+DEFAULT_EMBEDDINGS_MODEL = "mixedbread-ai/mxbai-embed-large-v1"
+
+
+def checkpoint_path(db_dir: Path, collection: str) -> Path:
+    return db_dir / f"{collection}.build.json"
+
+
+class ChromaWriter:
+    def __init__(self, db_dir: Path, collection: str, *, resume: bool, hnsw: dict[str, int]) -> None:
+        try:
+            import chromadb
+        except Exception as e:
+            raise CommandError("chromadb no está instalado (pip install chromadb).") from e
+
+        client = chromadb.PersistentClient(path=str(db_dir))
+        if not resume:
+            try:
+                client.delete_collection(collection)
+            except Exception:
+                pass
+        metadata = {"hnsw:space": "cosine", **{f"hnsw:{key}": value for key, value in hnsw.items()}}
+        self.collection = client.get_or_create_collection(name=collection, metadata=metadata)
+
+    def write(self, ids, embeddings, documents, metadatas) -> None:
+        self.collection.upsert(ids=ids, embeddings=embeddings, documents=documents, metadatas=metadatas)
+
+    def state(self) -> dict[str, Any]:
+        return {}
+
+    def finalize(self) -> int:
+        return self.collection.count()
+
+
+class NumpyWriter:
+    """Appends rows to `.partial` files; `finalize` converts them to `.npy` + `.jsonl`.
+
+    The checkpoint stores how many rows and sidecar bytes were committed, so a resumed
+    build truncates anything written after the last checkpoint.
+    """
+
+    def __init__(self, db_dir: Path, collection: str, *, resume: bool, state: dict[str, Any]) -> None:
+        from agent.numpy_store import matrix_path, sidecar_path
+
+        self.db_dir = db_dir
+        self.collection = collection
+        self.matrix_target = matrix_path(db_dir, collection)
+        self.sidecar_target = sidecar_path(db_dir, collection)
+        self.raw_path = db_dir / f"{collection}.f32.partial"
+        self.jsonl_path = db_dir / f"{collection}.jsonl.partial"
+        self.rows = int(state.get("rows", 0)) if resume else 0
+        self.dim = state.get("dim") if resume else None
+        sidecar_bytes = int(state.get("sidecar_bytes", 0)) if resume else 0
+
+        for path, size in ((self.raw_path, self.rows * 4 * (self.dim or 0)), (self.jsonl_path, sidecar_bytes)):
+            with path.open("ab") as f:
+                f.truncate(size)
+
+    def write(self, ids, embeddings, documents, metadatas) -> None:
+        import numpy as np
+
+        from agent.numpy_store import normalize_rows
+
+        matrix = normalize_rows(np.asarray(embeddings, dtype=np.float32))
+        if self.dim is None:
+            self.dim = int(matrix.shape[1])
+        with self.raw_path.open("ab") as f:
+            f.write(matrix.tobytes())
+        with self.jsonl_path.open("ab") as f:
+            for row_id, document, metadata in zip(ids, documents, metadatas):
+                row = {"id": row_id, "document": document, "metadata": metadata}
+                f.write((json.dumps(row, ensure_ascii=False) + "\n").encode("utf-8"))
+        self.rows += len(ids)
+
+    def state(self) -> dict[str, Any]:
+        return {"rows": self.rows, "dim": self.dim, "sidecar_bytes": self.jsonl_path.stat().st_size}
+
+    def finalize(self) -> int:
+        import numpy as np
+
+        dim = self.dim or 0
+        npy_tmp = self.matrix_target.with_name(self.matrix_target.name + ".tmp")
+        if self.rows:
+            raw = np.memmap(self.raw_path, dtype=np.float32, mode="r", shape=(self.rows, dim))
+            out = np.lib.format.open_memmap(npy_tmp, mode="w+", dtype=np.float32, shape=(self.rows, dim))
+            # Copy in slices so the whole matrix is never resident at once.
+            step = 65536
+            for start in range(0, self.rows, step):
+                out[start : start + step] = raw[start : start + step]
+            out.flush()
+            del out, raw
+        else:
+            with npy_tmp.open("wb") as f:
+                np.save(f, np.empty((0, dim), dtype=np.float32))
+
+        from agent.locks import file_lock
+        from agent.numpy_store import lock_path, reset_delta
+
+        with file_lock(lock_path(self.db_dir, self.collection)):
+            os.replace(self.jsonl_path, self.sidecar_target)
+            os.replace(npy_tmp, self.matrix_target)
+            # Incremental writes made against the previous base no longer apply.
+            reset_delta(self.db_dir, self.collection)
+        self.raw_path.unlink(missing_ok=True)
+        return self.rows
+
+
+class Command(BaseCommand):
+    help = "Construye (o reanuda) el índice vectorial del agente leyendo los libros desde la base de datos."
+
+    def add_arguments(self, parser):
+        cfg = load_vector_store_config()
+        parser.add_argument("--backend", choices=["chroma", "numpy"], default=cfg.backend)
+        parser.add_argument("--output-dir", default=str(cfg.root_dir or cfg.db_dir))
+        parser.add_argument("--collection", default=cfg.collection)
+        parser.add_argument(
+            "--model",
+            default=cfg.embedding_model or os.getenv("VECTOR_EMBEDDINGS_MODEL", DEFAULT_EMBEDDINGS_MODEL),
+        )
+        parser.add_argument("--device", default=cfg.embedding_device)
+        parser.add_argument(
+            "--batch-size", type=int, default=int(os.getenv("VECTOR_EMBEDDINGS_BATCH_SIZE", "64"))
+        )
+        parser.add_argument("--chunk-size", type=int, default=2000, help="Filas por lectura del cursor.")
+        parser.add_argument("--restart", action="store_true", help="Ignora el checkpoint y reconstruye desde cero.")
+        parser.add_argument(
+            "--ann",
+            choices=["exact", "ivf_flat"],
+            default="exact",
+            help="Backend numpy: índice aproximado IVF-flat (default: búsqueda exacta).",
+        )
+        parser.add_argument("--nlist", type=int, default=0, help="Clusters IVF (default: ~sqrt(N)).")
+        parser.add_argument("--nprobe", type=int, default=8, help="Clusters IVF revisados por consulta.")
+        parser.add_argument("--hnsw-m", type=int, default=16, help="Backend chroma: vecinos por nodo HNSW.")
+        parser.add_argument("--hnsw-ef-construction", type=int, default=100)
+        parser.add_argument("--hnsw-ef-search", type=int, default=10)
+        parser.add_argument(
+            "--shard-by",
+            choices=["none", "categoria"],
+            default="none",
+            help="Una colección por categoría (consultas por categoría solo leen su shard).",
+        )
+        parser.add_argument(
+            "--publish",
+            action="store_true",
+            help="Construye en versions/<versión>/ y al terminar apunta current.json a ella (swap sin reinicio).",
+        )
+        parser.add_argument("--index-version", default="", help="Nombre de la versión (default: timestamp UTC).")
+        parser.add_argument("--keep-versions", type=int, default=3, help="Versiones publicadas a conservar.")
+
+    def _iter_libros(self, after_id: int, chunk_size: int) -> Iterator[Any]:
+        from apps.libros.models import Libro
+
+        qs = Libro.objects.filter(id__gt=after_id).select_related("categoria").order_by("id")
+        return qs.iterator(chunk_size=chunk_size)
+
+    def _make_embedder(self, model: str, device: str):
+        return SentenceTransformerEmbedder(model, device=device, normalize_embeddings=True)
+
+    def _build_ann(self, db_dir: Path, collection: str, total: int, options: dict[str, Any]) -> dict[str, Any]:
+        if options["ann"] != "ivf_flat" or total == 0:
+            return {"type": "exact"}
+
+        import numpy as np
+
+        from agent.ivf import default_nlist, ivf_path, train_ivf
+        from agent.numpy_store import matrix_path
+
+        nlist = options["nlist"] or default_nlist(total)
+        started = time.monotonic()
+        matrix = np.load(matrix_path(db_dir, collection), mmap_mode="r")
+        index = train_ivf(matrix, nlist)
+        index.save(ivf_path(db_dir, collection))
+        self.stdout.write(f"  IVF-flat: nlist={index.nlist} ({time.monotonic() - started:.1f}s)")
+        return {"type": "ivf_flat", "nlist": index.nlist, "nprobe": options["nprobe"]}
+
+    def _resumable_version(self, root_dir: Path, collection: str) -> str:
+        current = (read_pointer(root_dir) or {}).get("version")
+        for version in reversed(list_versions(root_dir)):
+            if version != current and checkpoint_path(version_dir(root_dir, version), collection).exists():
+                return version
+        return ""
+
+    def handle(self, *args, **options):
+        root_dir = Path(options["output_dir"]).resolve()
+        collection = options["collection"]
+        backend = options["backend"]
+        model = options["model"]
+        batch_size = max(1, options["batch_size"])
+
+        version = ""
+        if options["publish"]:
+            version = options["index_version"]
+            if not version and not options["restart"]:
+                version = self._resumable_version(root_dir, collection)
+            version = version or new_version_name()
+            if version == (read_pointer(root_dir) or {}).get("version"):
+                raise CommandError(f"La versión {version} es la publicada actualmente; usa otro --index-version.")
+            db_dir = version_dir(root_dir, version)
+            self.stdout.write(f"Construyendo la versión {version} en {db_dir}")
+        elif read_pointer(root_dir) is not None:
+            raise CommandError(
+                f"{root_dir} usa índices versionados (current.json): usa --publish para construir una versión nueva."
+            )
+        else:
+            db_dir = root_dir
+        db_dir.mkdir(parents=True, exist_ok=True)
+
+        ckpt_path = checkpoint_path(db_dir, collection)
+        checkpoint: dict[str, Any] = {}
+        if ckpt_path.exists() and not options["restart"]:
+            checkpoint = json.loads(ckpt_path.read_text(encoding="utf-8"))
+            if checkpoint.get("backend") != backend or checkpoint.get("model") != model:
+                raise CommandError(
+                    f"El checkpoint {ckpt_path} es de otro backend/modelo "
+                    f"({checkpoint.get('backend')}/{checkpoint.get('model')}). Usa --restart."
+                )
+        resume = bool(checkpoint)
+        last_id = int(checkpoint.get("last_id", 0))
+        indexed = int(checkpoint.get("documents", 0))
+        if resume:
+            self.stdout.write(f"Reanudando desde libro_id>{last_id} ({indexed} documentos ya indexados)")
+
+        sharded = options["shard_by"] != "none"
+        if resume and bool(checkpoint.get("sharded")) != sharded:
+            raise CommandError(f"El checkpoint {ckpt_path} usa otro --shard-by. Usa --restart.")
+        hnsw = {
+            "M": options["hnsw_m"],
+            "construction_ef": options["hnsw_ef_construction"],
+            "search_ef": options["hnsw_ef_search"],
+        }
+
+        def make_writer(name: str, state: dict[str, Any], *, resume: bool = False):
+            if backend == "numpy":
+                return NumpyWriter(db_dir, name, resume=resume, state=state)
+            return ChromaWriter(db_dir, name, resume=resume, hnsw=hnsw)
+
+        # shard key ("" when unsharded) -> (collection name, writer)
+        writers: dict[str, tuple[str, Any]] = {}
+        saved = checkpoint.get("writers") or {"": {"collection": collection, "state": checkpoint.get("writer", {})}}
+        for key, entry in saved.items() if resume else ():
+            writers[key] = (entry["collection"], make_writer(entry["collection"], entry.get("state") or {}, resume=True))
+        if not sharded and "" not in writers:
+            writers[""] = (collection, make_writer(collection, {}))
+
+        def writer_for(metadata: dict[str, Any]) -> Any:
+            key = shard_key(metadata) if sharded else ""
+            if key not in writers:
+                name = shard_collection_name(collection, key, taken=[n for n, _ in writers.values()])
+                writers[key] = (name, make_writer(name, {}))
+            return writers[key][1]
+
+        embedder = self._make_embedder(model, options["device"])
+
+        started = time.monotonic()
+        batch: list[tuple[str, str, dict[str, Any]]] = []
+        batch_last_id = last_id
+
+        def flush() -> None:
+            nonlocal indexed, last_id
+            if not batch:
+                return
+            texts = [text for _, text, _ in batch]
+            vectors = embedder(texts)
+            groups: dict[int, tuple[Any, list[int]]] = {}
+            for i, (_, _, metadata) in enumerate(batch):
+                writer = writer_for(metadata)
+                groups.setdefault(id(writer), (writer, []))[1].append(i)
+            for writer, rows in groups.values():
+                writer.write(
+                    [batch[i][0] for i in rows],
+                    [list(map(float, vectors[i])) for i in rows],
+                    [texts[i] for i in rows],
+                    [batch[i][2] for i in rows],
+                )
+            indexed += len(batch)
+            last_id = batch_last_id
+            write_json_atomic(
+                ckpt_path,
+                {
+                    "backend": backend,
+                    "model": model,
+                    "sharded": sharded,
+                    "last_id": last_id,
+                    "documents": indexed,
+                    "writers": {
+                        key: {"collection": name, "state": writer.state()} for key, (name, writer) in writers.items()
+                    },
+                },
+            )
+            batch.clear()
+            rate = indexed / max(time.monotonic() - started, 1e-6)
+            self.stdout.write(f"  {indexed} documentos (libro_id<={last_id}, {rate:.1f} docs/s)")
+
+        for libro in self._iter_libros(last_id, options["chunk_size"]):
+            batch.append(libro_to_document(libro))
+            batch_last_id = libro.id
+            if len(batch) >= batch_size:
+                flush()
+        flush()
+
+        total = 0
+        nlists: dict[str, int] = {}
+        for name, writer in writers.values():
+            rows = writer.finalize()
+            total += rows
+            if backend == "numpy":
+                built = self._build_ann(db_dir, name, rows, options)
+                if "nlist" in built:
+                    nlists[name] = built["nlist"]
+        if backend == "chroma":
+            ann: dict[str, Any] = {"type": "hnsw", **hnsw}
+        elif nlists:
+            # One IVF index per shard, each with its own ~sqrt(N) nlist.
+            ann = {"type": "ivf_flat", "nlist": nlists if sharded else nlists[collection], "nprobe": options["nprobe"]}
+        else:
+            ann = {"type": "exact"}
+        manifest = {
+            "built_at_utc": datetime.now(timezone.utc).isoformat(),
+            "collection": collection,
+            "backend": backend,
+            "dataset": {"source": "database", "format": "libros.Libro"},
+            "vector_db": {"provider": backend, "persist_directory": str(db_dir), "collection": collection},
+            "embeddings": {
+                "model": model,
+                "normalize": True,
+                "device": options["device"],
+                "batch_size": batch_size,
+            },
+            "ann": ann,
+            "counts": {"documents_indexed": total},
+        }
+        if version:
+            manifest["version"] = version
+        if sharded:
+            manifest["shards"] = {
+                "by": options["shard_by"],
+                "collections": {key: name for key, (name, _) in sorted(writers.items())},
+            }
+        write_manifest(db_dir / "manifest.json", manifest)
+        ckpt_path.unlink(missing_ok=True)
+        if version:
+            pointer = publish_version(root_dir, version, collection=collection, documents=total)
+            self.stdout.write(f"  current.json -> {version} (generación {pointer['generation']})")
+            pruned = prune_versions(root_dir, max(1, options["keep_versions"]))
+            if pruned:
+                self.stdout.write(f"  Versiones eliminadas: {', '.join(pruned)}")
+        clear_vector_store_cache()
+
+        self.stdout.write(self.style.SUCCESS(f"Índice '{collection}' ({backend}) listo: {total} documentos en {db_dir}"))
@@ -1,10 +1,14 @@
 from __future__ import annotations
 
+import asyncio
+import json
+import threading
 from types import SimpleNamespace
 
+from django.test import AsyncRequestFactory
 from rest_framework.test import APIRequestFactory, force_authenticate
 
-from apps.agent_api.views import AgentChatView
+from apps.agent_api.views import AgentChatAsyncView, AgentChatStreamView, AgentChatView
 
 
 def test_agent_chat_endpoint_returns_stable_contract(monkeypatch):
@@ -224,3 +228,98 @@ def test_agent_chat_parses_prefer_vector_boolish(monkeypatch):
 
     assert response.status_code == 200
     assert captured["prefer_vector"] is False
+
+
+def test_agent_chat_stream_endpoint_emits_sse_events(monkeypatch):
+    def fake_stream_agent_message(message, **kwargs):
+        yield "results", {"results": [{"libro_id": 1}], "actions": [], "source": "orm", "degraded": True}
+        yield "token", {"text": "- ok\n"}
+        yield "done", {"message": "- ok\n- ok", "results": [{"libro_id": 1}], "actions": [], "replaced": True}
+
+    monkeypatch.setattr("apps.agent_api.views.stream_agent_message", fake_stream_agent_message)
+
+    factory = APIRequestFactory()
+    request = factory.post("/api/agent/stream/", {"message": "hola"}, format="json")
+    response = AgentChatStreamView.as_view()(request)
+
+    assert response.status_code == 200
+    assert response["Content-Type"].startswith("text/event-stream")
+    body = b"".join(response.streaming_content).decode("utf-8")
+    events = [block.split("\n")[0] for block in body.strip().split("\n\n")]
+    assert events == ["event: results", "event: token", "event: done"]
+    assert '"replaced": true' in body
+
+
+def test_agent_chat_stream_endpoint_sends_first_event_before_llm_finishes_under_asgi(monkeypatch):
+    llm_done = threading.Event()
+
+    def fake_stream_agent_message(message, **kwargs):
+        yield "results", {"results": [{"libro_id": 1}], "actions": [], "source": "orm", "degraded": True}
+        assert llm_done.wait(5)
+        yield "done", {"message": "ok", "results": [{"libro_id": 1}], "actions": []}
+
+    monkeypatch.setattr("apps.agent_api.views.stream_agent_message", fake_stream_agent_message)
+
+    request = AsyncRequestFactory().post("/api/agent/stream/", {"message": "hola"}, content_type="application/json")
+    response = AgentChatStreamView.as_view()(request)
+    assert response.is_async
+
+    async def read():
+        chunks = response.streaming_content
+        first = await chunks.__anext__()
+        first_sent_before_llm = not llm_done.is_set()
+        llm_done.set()
+        rest = [chunk async for chunk in chunks]
+        return first, first_sent_before_llm, rest
+
+    first, first_sent_before_llm, rest = asyncio.run(read())
+    assert first.startswith(b"event: results")
+    assert first_sent_before_llm
+    assert [chunk.split(b"\n")[0] for chunk in rest] == [b"event: done"]
+
+
+def test_agent_chat_stream_endpoint_returns_400_on_invalid_request():
+    factory = APIRequestFactory()
+    request = factory.post("/api/agent/stream/", {"message": "   "}, format="json")
+    response = AgentChatStreamView.as_view()(request)
+
+    assert response.status_code == 400
+    assert response.data["error"] == "invalid_request"
+
+
+def test_agent_chat_async_endpoint_returns_stable_contract(monkeypatch):
+    seen = {}
+
+    async def fake_handle_agent_message_async(message, **kwargs):
+        seen.update(kwargs, message=message)
+
+        class Resp:
+            error = None
+
+            def to_dict(self):
+                return {"message": "ok", "results": [{"libro_id": 1}], "actions": []}
+
+        return Resp()
+
+    monkeypatch.setattr("apps.agent_api.views.handle_agent_message_async", fake_handle_agent_message_async)
+
+    request = AsyncRequestFactory().post(
+        "/api/agent/async/", {"message": "hola", "k": 3}, content_type="application/json"
+    )
+    response = asyncio.run(AgentChatAsyncView.as_view()(request))
+
+    assert response.status_code == 200
+    assert json.loads(response.content)["results"] == [{"libro_id": 1}]
+    assert response["X-Request-Id"]
+    assert seen["message"] == "hola"
+    assert seen["k"] == 3
+
+
+def test_agent_chat_async_endpoint_rejects_byo_key_without_auth():
+    request = AsyncRequestFactory().post(
+        "/api/agent/async/", {"message": "hola"}, content_type="application/json", headers={"X-LLM-API-Key": "sk-user"}
+    )
+    response = asyncio.run(AgentChatAsyncView.as_view()(request))
+
+    assert response.status_code == 401
+    assert json.loads(response.content)["error"] == "auth_required"
@@ -0,0 +1,28 @@
+from types import SimpleNamespace
+
+from apps.agent_api.management.commands.bench_retrieval import run_mode
+
+
+def test_run_mode_reports_latency_recall_and_sources():
+    calls = []
+
+    def fake_search(query, *, k, **kwargs):
+        calls.append((query, kwargs))
+        isbn = "111" if query == "uno" else "999"
+        return SimpleNamespace(source="orm", degraded=True, results=[{"isbn": isbn}])
+
+    workload = [
+        {"query": "uno", "kind": "title", "relevant_isbns": ["111"]},
+        {"query": "dos", "kind": "isbn", "relevant_isbns": ["222"]},
+    ]
+
+    report = run_mode(fake_search, workload, k=5, warmup=1, prefer_vector=False)
+
+    assert len(calls) == 3  # 1 warm-up + 2 measured
+    assert all(kwargs == {"prefer_vector": False} for _, kwargs in calls)
+    assert report["count"] == 2
+    assert report["recall_at_k"] == 0.5
+    assert report["recall_by_kind"] == {"isbn": 0.0, "title": 1.0}
+    assert report["sources"] == {"orm": 2}
+    assert report["degraded"] == 2
+    assert {"p50_ms", "p99_ms", "qps"} <= set(report)
@@ -0,0 +1,156 @@
+import json
+from decimal import Decimal
+from types import SimpleNamespace
+
+import pytest
+from django.core.management import call_command
+from django.core.management.base import CommandError
+
+from agent.numpy_store import NumpyCollection
+from apps.agent_api.management.commands import build_vector_index
+
+
+def _libros(n):
+    return [
+        SimpleNamespace(
+            id=i,
+            titulo=f"Libro {i}",
+            autor="Autor",
+            isbn=f"{i:013d}",
+            categoria=None,
+            categoria_id=None,
+            editorial="",
+            año_publicacion=2000,
+            descripcion="",
+            precio=Decimal("9.90"),
+            stock=1,
+        )
+        for i in range(1, n + 1)
+    ]
+
+
+class _Killed(Exception):
+    pass
+
+
+def test_build_vector_index_resumes_from_checkpoint(tmp_path, monkeypatch):
+    rows = _libros(5)
+    embedded = []
+    state = {"fail_after": 2}
+
+    def fake_iter(self, after_id, chunk_size):
+        return iter([libro for libro in rows if libro.id > after_id])
+
+    def fake_embedder(self, model, device):
+        def embed(texts):
+            if state["fail_after"] is not None and len(embedded) >= state["fail_after"]:
+                raise _Killed()
+            embedded.extend(texts)
+            return [[1.0, float(len(t))] for t in texts]
+
+        return embed
+
+    monkeypatch.setattr(build_vector_index.Command, "_iter_libros", fake_iter)
+    monkeypatch.setattr(build_vector_index.Command, "_make_embedder", fake_embedder)
+    args = ["--backend", "numpy", "--output-dir", str(tmp_path), "--collection", "book_catalog", "--model", "fake"]
+
+    with pytest.raises(_Killed):
+        call_command("build_vector_index", *args, "--batch-size", "2")
+    checkpoint = json.loads((tmp_path / "book_catalog.build.json").read_text(encoding="utf-8"))
+    assert checkpoint["last_id"] == 2
+
+    state["fail_after"] = None
+    call_command("build_vector_index", *args, "--batch-size", "2")
+
+    assert len(embedded) == 5
+    assert not (tmp_path / "book_catalog.build.json").exists()
+    collection = NumpyCollection.load(tmp_path, "book_catalog")
+    assert collection.get()["ids"] == [f"libro:{i}" for i in range(1, 6)]
+    manifest = json.loads((tmp_path / "manifest.json").read_text(encoding="utf-8"))
+    assert manifest["collection"] == "book_catalog"
+    assert manifest["backend"] == "numpy"
+    assert manifest["embeddings"]["model"] == "fake"
+    assert manifest["counts"]["documents_indexed"] == 5
+
+
+def test_build_vector_index_trains_ivf_and_records_it_in_manifest(tmp_path, monkeypatch):
+    rows = _libros(40)
+
+    def fake_iter(self, after_id, chunk_size):
+        return iter(rows)
+
+    def fake_embedder(self, model, device):
+        return lambda texts: [[float(i % 7) + 1.0, float(i % 3), 1.0] for i in range(len(texts))]
+
+    monkeypatch.setattr(build_vector_index.Command, "_iter_libros", fake_iter)
+    monkeypatch.setattr(build_vector_index.Command, "_make_embedder", fake_embedder)
+    call_command(
+        "build_vector_index",
+        "--backend", "numpy", "--output-dir", str(tmp_path), "--collection", "book_catalog", "--model", "fake",
+        "--ann", "ivf_flat", "--nlist", "4", "--nprobe", "2",
+    )
+
+    manifest = json.loads((tmp_path / "manifest.json").read_text(encoding="utf-8"))
+    assert manifest["ann"] == {"type": "ivf_flat", "nlist": 4, "nprobe": 2}
+    collection = NumpyCollection.load(tmp_path, "book_catalog", ann="ivf_flat", nprobe=2)
+    assert collection.count() == 40
+
+
+def test_build_vector_index_writes_one_shard_per_category(tmp_path, monkeypatch):
+    from agent.sharding import ShardedCollection
+    from agent.vector_store import clear_vector_store_cache, get_vector_collection
+
+    rows = _libros(6)
+    for libro in rows:
+        nombre = "Fantasía" if libro.id % 2 else "Historia"
+        libro.categoria = SimpleNamespace(nombre=nombre)
+        libro.categoria_id = 1 if libro.id % 2 else 2
+
+    monkeypatch.setattr(build_vector_index.Command, "_iter_libros", lambda self, after_id, chunk_size: iter(rows))
+    monkeypatch.setattr(
+        build_vector_index.Command, "_make_embedder", lambda self, model, device: lambda texts: [[1.0, 0.5]] * len(texts)
+    )
+    call_command(
+        "build_vector_index",
+        "--backend", "numpy", "--output-dir", str(tmp_path), "--collection", "book_catalog", "--model", "fake",
+        "--shard-by", "categoria", "--batch-size", "4",
+    )
+
+    manifest = json.loads((tmp_path / "manifest.json").read_text(encoding="utf-8"))
+    assert manifest["shards"]["collections"] == {
+        "fantasia": "book_catalog__fantasia",
+        "historia": "book_catalog__historia",
+    }
+    assert NumpyCollection.load(tmp_path, "book_catalog__historia").get()["ids"] == ["libro:2", "libro:4", "libro:6"]
+
+    monkeypatch.setenv("VECTOR_DB_DIR", str(tmp_path))
+    clear_vector_store_cache()
+    try:
+        collection = get_vector_collection()
+        assert isinstance(collection, ShardedCollection)
+        assert collection.count() == 6
+    finally:
+        clear_vector_store_cache()
+
+
+def test_build_vector_index_publishes_versions_behind_pointer(tmp_path, monkeypatch):
+    from agent.index_versions import read_pointer, version_dir
+
+    monkeypatch.setattr(build_vector_index.Command, "_iter_libros", lambda self, after_id, chunk_size: iter(_libros(3)))
+    monkeypatch.setattr(
+        build_vector_index.Command, "_make_embedder", lambda self, model, device: lambda texts: [[1.0, 0.5]] * len(texts)
+    )
+    args = ["--backend", "numpy", "--output-dir", str(tmp_path), "--collection", "book_catalog", "--model", "fake"]
+
+    call_command("build_vector_index", *args, "--publish", "--index-version", "v1")
+    call_command("build_vector_index", *args, "--publish", "--index-version", "v2")
+
+    pointer = read_pointer(tmp_path)
+    assert (pointer["version"], pointer["generation"], pointer["previous"]) == ("v2", 2, "v1")
+    manifest = json.loads((version_dir(tmp_path, "v2") / "manifest.json").read_text(encoding="utf-8"))
+    assert manifest["version"] == "v2"
+    assert NumpyCollection.load(version_dir(tmp_path, "v2"), "book_catalog").count() == 3
+    assert not (tmp_path / "book_catalog.npy").exists()
+
+    with pytest.raises(CommandError, match="--publish"):
+        call_command("build_vector_index", *args)
@@ -33,3 +33,34 @@ def test_phase2_agent_search_endpoint_contract(monkeypatch):
     assert "degraded" in data
     assert isinstance(data["warnings"], list)
     assert isinstance(data["results"], list)
+
+
+def test_agent_search_batch_endpoint_returns_one_payload_per_query(monkeypatch):
+    from apps.agent_api import views
+
+    def fake_search_catalog_many(queries, *, k=5, prefer_vector=True, **kwargs):
+        return [
+            RetrievalResult(query=q, k=int(k), source="vector", degraded=False, results=[], warnings=[])
+            for q in queries
+        ]
+
+    monkeypatch.setattr(views, "search_catalog_many", fake_search_catalog_many)
+
+    factory = APIRequestFactory()
+    request = factory.post("/api/agent/search/batch/", {"queries": ["uno", "dos"], "k": 2}, format="json")
+    response = views.AgentSearchBatchView.as_view()(request)
+
+    assert response.status_code == 200
+    assert [item["query"] for item in response.data["results"]] == ["uno", "dos"]
+    assert response["X-Request-Id"]
+
+
+def test_agent_search_batch_endpoint_rejects_invalid_queries():
+    from apps.agent_api import views
+
+    factory = APIRequestFactory()
+    request = factory.post("/api/agent/search/batch/", {"queries": "uno"}, format="json")
+    response = views.AgentSearchBatchView.as_view()(request)
+
+    assert response.status_code == 400
+    assert response.data["error"] == "invalid_request"
@@ -1,10 +1,21 @@
 from django.urls import path
 
-from .views import AgentActionView, AgentChatView, AgentSearchView, AgentStatusView
+from .views import (
+    AgentActionView,
+    AgentChatAsyncView,
+    AgentChatStreamView,
+    AgentChatView,
+    AgentSearchBatchView,
+    AgentSearchView,
+    AgentStatusView,
+)
 
 urlpatterns = [
     path("", AgentChatView.as_view(), name="agent-chat"),
+    path("async/", AgentChatAsyncView.as_view(), name="agent-chat-async"),
+    path("stream/", AgentChatStreamView.as_view(), name="agent-chat-stream"),
     path("search/", AgentSearchView.as_view(), name="agent-search"),
+    path("search/batch/", AgentSearchBatchView.as_view(), name="agent-search-batch"),
     path("actions/", AgentActionView.as_view(), name="agent-actions"),
     path("status/", AgentStatusView.as_view(), name="agent-status"),
 ]
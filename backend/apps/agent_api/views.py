@@ -1,27 +1,64 @@
+import json
 import time
+from typing import Optional
 
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views import View
+from rest_framework.exceptions import AuthenticationFailed
 from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.request import Request
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
 from rest_framework.views import APIView
 
 from drf_spectacular.types import OpenApiTypes
 from drf_spectacular.utils import OpenApiExample, OpenApiParameter, OpenApiResponse, extend_schema
 
-from agent.agent_handler import handle_agent_action, handle_agent_message
-from agent.llm_factory import load_llm_config
+from agent.agent_handler import (
+    handle_agent_action,
+    handle_agent_message,
+    handle_agent_message_async,
+    stream_agent_message,
+)
+from agent.embedding_service import EMBEDDING_SOCKET
+from agent.llm_cache import LLM_CACHE_ALLOW_BYO, LLM_CACHE_TTL_SEC, llm_cache_enabled
+from agent.llm_factory import llm_client_stats, load_llm_config
 from agent.observability import (
+    METRICS,
     elapsed_ms,
     log_event,
     new_request_id,
+    record_timing,
     should_sample_trace,
     truncate_text,
 )
-from agent.retrieval import search_catalog
+from agent.result_cache import RESULT_CACHE_TTL_SEC, result_cache_enabled
+from agent.retrieval import EMBEDDING_CACHE_SIZE, VECTOR_BREAKER, search_catalog, search_catalog_many
+from agent.semantic_cache import (
+    SEMANTIC_CACHE_SHADOW_THRESHOLDS,
+    SEMANTIC_CACHE_SIZE,
+    SEMANTIC_CACHE_THRESHOLD,
+    shadow_hit_rates,
+)
 from apps.agent_history.services import get_or_create_active_conversation, record_message
-from agent.vector_store import load_vector_store_config
+from agent.vector_store import index_version_status, load_vector_store_config
+from agent.warmup import warmup_status
 from django.conf import settings
 
 
+async def _iterate_in_thread(iterator):
+    """Async view of a sync iterator: one `next()` per chunk in the request's sync thread."""
+
+    done = object()
+    while True:
+        chunk = await sync_to_async(next, thread_sensitive=True)(iterator, done)
+        if chunk is done:
+            return
+        yield chunk
+
+
 def _parse_bool(value: object, *, default: bool) -> bool:
     if isinstance(value, bool):
         return value
@@ -46,6 +83,31 @@ def _parse_int(value: object, *, default: int, min_value: int = 1, max_value: in
     return parsed
 
 
+MAX_BATCH_QUERIES = 50
+
+
+def _retrieval_payload(res) -> dict:
+    return {
+        "query": res.query,
+        "k": res.k,
+        "source": res.source,
+        "degraded": res.degraded,
+        "warnings": res.warnings,
+        "results": res.results,
+    }
+
+
+def _cache_stats(counters: dict, name: str) -> dict:
+    hits = int(counters.get(f"{name}_hit", 0))
+    misses = int(counters.get(f"{name}_miss", 0))
+    total = hits + misses
+    return {
+        "hits": hits,
+        "misses": misses,
+        "hit_rate": round(hits / total, 4) if total else None,
+    }
+
+
 class AgentSearchView(APIView):
     permission_classes = [AllowAny]
     throttle_scope = "agent_search"
@@ -74,6 +136,12 @@ class AgentSearchView(APIView):
                 description="Si false, fuerza fallback ORM.",
                 required=False,
             ),
+            OpenApiParameter(
+                name="mode",
+                type=OpenApiTypes.STR,
+                description="'vector' o 'hybrid' (BM25 + vector fusionados por RRF). Default: AGENT_RETRIEVAL_MODE.",
+                required=False,
+            ),
         ],
         responses={
             200: OpenApiResponse(
@@ -89,9 +157,16 @@ class AgentSearchView(APIView):
                             "warnings": [],
                             "results": [
                                 {
-                                    "id": "libro_123",
-                                    "document": "Cien años de soledad...",
-                                    "metadata": {"libro_id": 123, "titulo": "Cien años de soledad"},
+                                    "libro_id": 123,
+                                    "titulo": "Cien años de soledad",
+                                    "autor": "Gabriel García Márquez",
+                                    "isbn": "9780307474728",
+                                    "precio": "19.99",
+                                    "categoria": "Novela",
+                                    "stock": 4,
+                                    "editorial": "Sudamericana",
+                                    "año_publicacion": 1967,
+                                    "descripcion": "...",
                                     "distance": 0.12,
                                 }
                             ],
@@ -136,18 +211,10 @@ class AgentSearchView(APIView):
         k = request.query_params.get("k", 5)
         prefer_vector_raw = request.query_params.get("prefer_vector", "true")
         prefer_vector = str(prefer_vector_raw).strip().lower() not in {"0", "false", "no"}
+        extra = {"mode": request.query_params["mode"]} if request.query_params.get("mode") else {}
 
-        res = search_catalog(q, k=k, prefer_vector=prefer_vector)
-        response = Response(
-            {
-                "query": res.query,
-                "k": res.k,
-                "source": res.source,
-                "degraded": res.degraded,
-                "warnings": res.warnings,
-                "results": res.results,
-            }
-        )
+        res = search_catalog(q, k=k, prefer_vector=prefer_vector, **extra)
+        response = Response(_retrieval_payload(res))
         response["X-Request-Id"] = request_id
         log_event(
             "agent.search",
@@ -163,6 +230,115 @@ class AgentSearchView(APIView):
         return response
 
 
+class AgentSearchBatchView(APIView):
+    permission_classes = [AllowAny]
+    throttle_scope = "agent_search"
+
+    @extend_schema(
+        description=(
+            "Búsqueda en lote: embebe todas las consultas en una sola pasada del encoder "
+            "y hace una única consulta multi-query al vector DB. Si el vector DB no está "
+            "disponible, cada consulta cae a ORM por separado. Devuelve un payload por consulta, "
+            f"en el mismo orden (máximo {MAX_BATCH_QUERIES} consultas)."
+        ),
+        request=OpenApiTypes.OBJECT,
+        examples=[
+            OpenApiExample(
+                "Request ejemplo",
+                value={"queries": ["Cien años de soledad", "Rayuela"], "k": 3, "prefer_vector": True},
+                request_only=True,
+            )
+        ],
+        responses={
+            200: OpenApiResponse(
+                response=OpenApiTypes.OBJECT,
+                examples=[
+                    OpenApiExample(
+                        "Respuesta 200",
+                        value={
+                            "results": [
+                                {
+                                    "query": "Cien años de soledad",
+                                    "k": 3,
+                                    "source": "vector",
+                                    "degraded": False,
+                                    "warnings": [],
+                                    "results": [],
+                                }
+                            ]
+                        },
+                        response_only=True,
+                        status_codes=["200"],
+                    )
+                ],
+            ),
+            400: OpenApiResponse(response=OpenApiTypes.OBJECT),
+        },
+    )
+    def post(self, request):
+        request_id = new_request_id()
+        started = time.monotonic()
+        data = request.data or {}
+        queries = data.get("queries")
+
+        if (
+            not isinstance(queries, list)
+            or not queries
+            or len(queries) > MAX_BATCH_QUERIES
+            or not all(isinstance(q, str) for q in queries)
+        ):
+            response = Response(
+                {
+                    "error": "invalid_request",
+                    "message": f"'queries' debe ser una lista de 1 a {MAX_BATCH_QUERIES} textos.",
+                    "results": [],
+                },
+                status=400,
+            )
+            response["X-Request-Id"] = request_id
+            return response
+
+        k_int = _parse_int(data.get("k", 5), default=5)
+        prefer_vector = _parse_bool(data.get("prefer_vector", True), default=True)
+
+        batch = search_catalog_many(queries, k=k_int, prefer_vector=bool(prefer_vector))
+        response = Response({"results": [_retrieval_payload(res) for res in batch]})
+        response["X-Request-Id"] = request_id
+        log_event(
+            "agent.search_batch",
+            request_id=request_id,
+            duration_ms=elapsed_ms(started),
+            queries_count=len(queries),
+            k=k_int,
+            sources=sorted({res.source for res in batch}),
+            degraded_count=sum(1 for res in batch if res.degraded),
+        )
+        return response
+
+
+def _save_chat_history(user, message: str, payload: dict, *, k: int, prefer_vector: bool) -> None:
+    conversation = get_or_create_active_conversation(user)
+    record_message(
+        conversation,
+        "user",
+        message,
+        meta={"k": k, "prefer_vector": prefer_vector},
+    )
+    record_message(
+        conversation,
+        "assistant",
+        payload.get("message", ""),
+        meta={
+            "results": payload.get("results", []),
+            "actions": payload.get("actions", []),
+        },
+    )
+
+
+def _sse_event(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n"
+
+
 class AgentChatView(APIView):
     permission_classes = [AllowAny]
     throttle_scope = "agent_chat"
@@ -302,22 +478,7 @@ class AgentChatView(APIView):
         response["X-Request-Id"] = request_id
 
         if request.user.is_authenticated and message and not resp.error and save_history:
-            conversation = get_or_create_active_conversation(request.user)
-            record_message(
-                conversation,
-                "user",
-                message,
-                meta={"k": k_int, "prefer_vector": bool(prefer_vector)},
-            )
-            record_message(
-                conversation,
-                "assistant",
-                payload.get("message", ""),
-                meta={
-                    "results": payload.get("results", []),
-                    "actions": payload.get("actions", []),
-                },
-            )
+            _save_chat_history(request.user, message, payload, k=k_int, prefer_vector=bool(prefer_vector))
 
         trace_payload = payload.get("trace") if isinstance(payload, dict) else None
         log_event(
@@ -338,6 +499,233 @@ class AgentChatView(APIView):
         return response
 
 
+class AgentChatStreamView(APIView):
+    permission_classes = [AllowAny]
+    throttle_scope = "agent_chat"
+
+    @extend_schema(
+        description=(
+            "Variante streaming de /api/agent/chat/ (text/event-stream). Mismo request. "
+            "Eventos: 'results' (resultados del retrieval, antes del LLM), 'token' ({text}) "
+            "por cada fragmento del LLM y 'done' con el JSON final de /chat/ más 'replaced': "
+            "si es true, 'message' (coercionado por guardrails o fallback) reemplaza el texto recibido."
+        ),
+        request=OpenApiTypes.OBJECT,
+        responses={
+            200: OpenApiResponse(description="Stream SSE: results, token*, done"),
+            400: OpenApiResponse(response=OpenApiTypes.OBJECT, description="Request inválido (JSON)"),
+        },
+    )
+    def post(self, request):
+        request_id = new_request_id()
+        started = time.monotonic()
+        data = request.data or {}
+        message_raw = data.get("message")
+        message = message_raw if isinstance(message_raw, str) else None
+
+        k_int = _parse_int(data.get("k", 5), default=5)
+        prefer_vector = _parse_bool(data.get("prefer_vector", True), default=True)
+        trace = _parse_bool(data.get("trace", False), default=False)
+        use_llm = _parse_bool(data.get("use_llm", True), default=True)
+        save_history = _parse_bool(data.get("save_history", True), default=True)
+
+        byo_api_key = request.headers.get("X-LLM-API-Key")
+        if byo_api_key and not request.user.is_authenticated:
+            return Response(
+                {
+                    "error": "auth_required",
+                    "message": "Necesitas iniciar sesión para usar tu API key.",
+                    "results": [],
+                    "actions": [],
+                },
+                status=401,
+            )
+
+        events = stream_agent_message(
+            message,
+            k=k_int,
+            prefer_vector=bool(prefer_vector),
+            use_llm=bool(use_llm),
+            include_trace=bool(trace),
+            byo_api_key=byo_api_key,
+            request_id=request_id,
+        )
+        # Retrieval runs here, before the response starts, so a bad request still gets a 400.
+        first_event, first_data = next(events)
+        if first_event == "done" and first_data.get("error"):
+            first_data.pop("replaced", None)
+            response = Response(first_data, status=400)
+            response["X-Request-Id"] = request_id
+            log_event(
+                "agent.chat_stream",
+                request_id=request_id,
+                duration_ms=elapsed_ms(started),
+                message=truncate_text(message_raw),
+                status=400,
+                error=first_data.get("error"),
+            )
+            return response
+
+        user = request.user
+
+        def body():
+            final: dict = {}
+            tokens = 0
+            yield _sse_event(first_event, first_data)
+            ttfb_ms = elapsed_ms(started)
+            record_timing("agent.stream_ttfb_ms", ttfb_ms)
+            for event, event_data in events:
+                if event == "token":
+                    tokens += 1
+                elif event == "done":
+                    final = event_data
+                    sampled = should_sample_trace()
+                    if trace and sampled and final.get("trace") is None:
+                        final["trace"] = {"request_id": request_id}
+                yield _sse_event(event, event_data)
+
+            # Persist only once the client has the full answer.
+            if user.is_authenticated and message and final and save_history:
+                _save_chat_history(user, message, final, k=k_int, prefer_vector=bool(prefer_vector))
+
+            log_event(
+                "agent.chat_stream",
+                request_id=request_id,
+                duration_ms=elapsed_ms(started),
+                ttfb_ms=ttfb_ms,
+                message=truncate_text(message_raw),
+                k=k_int,
+                prefer_vector=bool(prefer_vector),
+                status=200,
+                source=first_data.get("source"),
+                degraded=first_data.get("degraded"),
+                results_count=len(first_data.get("results", [])),
+                tokens=tokens,
+                replaced=final.get("replaced"),
+            )
+
+        content = body()
+        if isinstance(request._request, ASGIRequest):
+            # Under ASGI Django drains a sync iterator before sending the first byte.
+            content = _iterate_in_thread(content)
+        response = StreamingHttpResponse(content, content_type="text/event-stream; charset=utf-8")
+        response["Cache-Control"] = "no-cache"
+        response["X-Accel-Buffering"] = "no"  # nginx: no bufferizar el stream
+        response["X-Request-Id"] = request_id
+        return response
+
+
+class AgentChatAsyncView(View):
+    """`AgentChatView` as a native async view (same contract), for ASGI deployments.
+
+    DRF's APIView is sync-only, so authentication and throttling reuse the DRF
+    classes from settings in a worker thread; the handler itself awaits the LLM.
+    Under `config.asgi` (uvicorn) one worker holds many chats waiting on the LLM.
+    """
+
+    http_method_names = ["post"]
+    throttle_scope = "agent_chat"
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        view = super().as_view(**initkwargs)
+        view.csrf_exempt = True  # JWT, like the DRF views
+        return view
+
+    def _authenticate(self, request) -> tuple[object, Optional[JsonResponse]]:
+        drf_request = Request(
+            request, authenticators=[auth() for auth in api_settings.DEFAULT_AUTHENTICATION_CLASSES]
+        )
+        try:
+            user = drf_request.user
+        except AuthenticationFailed as e:
+            return None, JsonResponse({"error": "auth_failed", "message": str(e.detail)}, status=401)
+        for throttle_class in api_settings.DEFAULT_THROTTLE_CLASSES:
+            throttle = throttle_class()
+            if not throttle.allow_request(drf_request, self):
+                response = JsonResponse({"error": "throttled", "message": "Demasiadas solicitudes."}, status=429)
+                wait = throttle.wait()
+                if wait is not None:
+                    response["Retry-After"] = str(int(wait) + 1)
+                return user, response
+        return user, None
+
+    async def post(self, request):
+        request_id = new_request_id()
+        started = time.monotonic()
+        try:
+            data = json.loads(request.body or b"{}")
+        except ValueError:
+            data = None
+        if not isinstance(data, dict):
+            return JsonResponse(
+                {"error": "invalid_request", "message": "JSON inválido.", "results": [], "actions": []},
+                status=400,
+            )
+
+        user, rejected = await sync_to_async(self._authenticate)(request)
+        if rejected is not None:
+            return rejected
+
+        message_raw = data.get("message")
+        message = message_raw if isinstance(message_raw, str) else None
+        k_int = _parse_int(data.get("k", 5), default=5)
+        prefer_vector = _parse_bool(data.get("prefer_vector", True), default=True)
+        trace = _parse_bool(data.get("trace", False), default=False)
+        use_llm = _parse_bool(data.get("use_llm", True), default=True)
+        save_history = _parse_bool(data.get("save_history", True), default=True)
+
+        byo_api_key = request.headers.get("X-LLM-API-Key")
+        if byo_api_key and not user.is_authenticated:
+            return JsonResponse(
+                {
+                    "error": "auth_required",
+                    "message": "Necesitas iniciar sesión para usar tu API key.",
+                    "results": [],
+                    "actions": [],
+                },
+                status=401,
+            )
+
+        resp = await handle_agent_message_async(
+            message,
+            k=k_int,
+            prefer_vector=bool(prefer_vector),
+            use_llm=bool(use_llm),
+            include_trace=bool(trace),
+            byo_api_key=byo_api_key,
+            request_id=request_id,
+        )
+
+        status_code = 400 if resp.error else 200
+        payload = resp.to_dict()
+        sampled = should_sample_trace()
+        if trace and sampled and payload.get("trace") is None:
+            payload["trace"] = {"request_id": request_id}
+
+        if user.is_authenticated and message and not resp.error and save_history:
+            await sync_to_async(_save_chat_history)(user, message, payload, k=k_int, prefer_vector=bool(prefer_vector))
+
+        response = JsonResponse(payload, status=status_code, json_dumps_params={"ensure_ascii": False})
+        response["X-Request-Id"] = request_id
+        trace_payload = payload.get("trace")
+        log_event(
+            "agent.chat_async",
+            request_id=request_id,
+            duration_ms=elapsed_ms(started),
+            message=truncate_text(message_raw),
+            k=k_int,
+            prefer_vector=bool(prefer_vector),
+            status=status_code,
+            error=payload.get("error"),
+            degraded=(trace_payload or {}).get("degraded") if trace_payload else None,
+            source=(trace_payload or {}).get("source") if trace_payload else None,
+            results_count=len(payload.get("results", [])),
+            sampled_trace=sampled,
+        )
+        return response
+
+
 class AgentStatusView(APIView):
     permission_classes = [IsAuthenticated]
     throttle_scope = "agent_chat"
@@ -376,6 +764,12 @@ class AgentStatusView(APIView):
         vector_manifest = str(vector_cfg.manifest_path) if vector_cfg.manifest_path else None
         vector_ready = vector_cfg.db_dir.exists() and bool(vector_cfg.embedding_model)
 
+        counters = METRICS.snapshot()["counters"]
+        prompts = counters.get("agent.llm_prompts", 0)
+        reported = counters.get("agent.llm_usage_reported", 0)
+        warmup = warmup_status()
+        warmup["ready"] = warmup["status"] in {"ready", "disabled"}
+
         throttle_rates = (getattr(settings, "REST_FRAMEWORK", {}) or {}).get(
             "DEFAULT_THROTTLE_RATES", {}
         )
@@ -393,15 +787,70 @@ class AgentStatusView(APIView):
                 "timeout_sec": llm_cfg.timeout_sec,
                 "max_tokens": llm_cfg.max_tokens,
                 "cost_mode": llm_cfg.cost_mode,
+                "prompt_tokens": {
+                    "prompts": prompts,
+                    "avg_estimated": round(counters.get("agent.llm_prompt_tokens_est", 0) / prompts, 1)
+                    if prompts
+                    else None,
+                    "avg_reported": round(counters.get("agent.llm_prompt_tokens", 0) / reported, 1)
+                    if reported
+                    else None,
+                },
+                "clients": {
+                    **llm_client_stats(),
+                    "created": counters.get("agent.llm_client_created", 0),
+                    "reused": counters.get("agent.llm_client_reused", 0),
+                },
             },
             "retrieval": {
                 "prefer_vector_default": True,
                 "vector_ready": vector_ready,
+                "vector_backend": vector_cfg.backend,
+                "ann": {"type": vector_cfg.ann, "nprobe": vector_cfg.ann_nprobe},
+                "shards": [name for _, name in vector_cfg.shards],
+                "index_version": index_version_status(),
                 "vector_db_dir": vector_db_dir,
                 "vector_manifest": vector_manifest,
                 "collection": vector_cfg.collection,
                 "embedding_model": vector_cfg.embedding_model,
                 "normalize_embeddings": vector_cfg.normalize_embeddings,
+                "embedding_service": {
+                    "socket": EMBEDDING_SOCKET or None,
+                    "requests": counters.get("agent.embedding_service.request", 0),
+                    "fallbacks": counters.get("agent.embedding_service.fallback", 0),
+                },
+                "warmup": warmup,
+                "circuit_breaker": {
+                    **VECTOR_BREAKER.snapshot(),
+                    "rejected": counters.get("agent.circuit.vector_store.rejected", 0),
+                    "opened": counters.get("agent.circuit.vector_store.open", 0),
+                },
+            },
+            "caches": {
+                "result_cache": {
+                    "enabled": result_cache_enabled(),
+                    "ttl_sec": RESULT_CACHE_TTL_SEC,
+                    **_cache_stats(counters, "agent.result_cache"),
+                },
+                "llm_cache": {
+                    "enabled": llm_cache_enabled(),
+                    "ttl_sec": LLM_CACHE_TTL_SEC,
+                    "allow_byo": LLM_CACHE_ALLOW_BYO,
+                    "bypassed": counters.get("agent.llm_cache_bypass", 0),
+                    **_cache_stats(counters, "agent.llm_cache"),
+                },
+                "embedding_cache": {
+                    "max_size": EMBEDDING_CACHE_SIZE,
+                    **_cache_stats(counters, "agent.embedding_cache"),
+                },
+                "semantic_cache": {
+                    "enabled": SEMANTIC_CACHE_SIZE > 0,
+                    "max_entries": SEMANTIC_CACHE_SIZE,
+                    "threshold": SEMANTIC_CACHE_THRESHOLD,
+                    **_cache_stats(counters, "agent.semantic_cache"),
+                    "evictions": counters.get("agent.semantic_cache_evict", 0),
+                    "shadow_hit_rates": shadow_hit_rates(counters, SEMANTIC_CACHE_SHADOW_THRESHOLDS),
+                },
             },
             "tools": {
                 "read_only": [
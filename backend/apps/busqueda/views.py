@@ -3,12 +3,12 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.permissions import AllowAny
-from django.db.models import Q
 from .models import SearchQuery
 from .serializers import SearchQuerySerializer
 from drf_spectacular.utils import extend_schema, OpenApiParameter
 from drf_spectacular.types import OpenApiTypes
 from apps.libros.models import Libro
+from apps.libros.search import fuzzy_search_libros, search_libros
 
 class SearchView(APIView):
     permission_classes = [AllowAny]  # Permitir búsqueda sin autenticación
@@ -57,6 +57,12 @@ class SearchView(APIView):
                 type=OpenApiTypes.STR,
                 description="Dirección del ordenamiento (asc o desc)",
                 required=False
+            ),
+            OpenApiParameter(
+                name='modo',
+                type=OpenApiTypes.STR,
+                description="auto (por defecto: si no hay resultados, reintenta tolerando errores de tipeo), exacto o fuzzy",
+                required=False
             )
         ],
         responses={200: SearchQuerySerializer}
@@ -65,17 +71,6 @@ class SearchView(APIView):
         # Iniciar la consulta base
         libros = Libro.objects.all()
 
-        # Aplicar búsqueda por texto si se proporciona
-        query = request.query_params.get('q', None)
-        if query:
-            libros = libros.filter(
-                Q(titulo__icontains=query) |
-                Q(autor__icontains=query) |
-                Q(isbn__icontains=query) |
-                Q(descripcion__icontains=query) |
-                Q(editorial__icontains=query)
-            )
-
         # Aplicar filtros adicionales
         categoria = request.query_params.get('categoria', None)
         if categoria:
@@ -92,6 +87,22 @@ class SearchView(APIView):
         stock_min = request.query_params.get('stock_min', None)
         if stock_min:
             libros = libros.filter(stock__gte=int(stock_min))
+
+        # Aplicar búsqueda por texto si se proporciona
+        query = request.query_params.get('q', None)
+        modo = request.query_params.get('modo', 'auto')
+        ranked = False
+        if query:
+            filtrados = libros
+            if modo == 'fuzzy':
+                libros, ranked = fuzzy_search_libros(filtrados, query)
+            else:
+                libros, ranked = search_libros(filtrados, query)
+                # Sin resultados tal como se escribió: reintentar tolerando errores de tipeo
+                if modo == 'auto' and not libros.exists():
+                    fuzzy, fuzzy_ranked = fuzzy_search_libros(filtrados, query)
+                    if fuzzy_ranked:
+                        libros, ranked = fuzzy, True
             
         # Ordenamiento
         ordenar_por = request.query_params.get('ordenar_por', 'titulo')
@@ -100,7 +111,11 @@ class SearchView(APIView):
         if orden == 'desc':
             ordenar_por = f'-{ordenar_por}'
         
-        libros = libros.order_by(ordenar_por)
+        # Con búsqueda full-text/fuzzy y sin orden explícito, primero los más relevantes
+        if ranked and 'ordenar_por' not in request.query_params:
+            libros = libros.order_by('-rank', 'titulo')
+        else:
+            libros = libros.order_by(ordenar_por)
 
         # No requerir criterios de búsqueda - mostrar todos si no hay filtros
         # Remover esta validación para permitir ver todos los libros
@@ -4,3 +4,11 @@ class LibrosConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.libros'
     verbose_name = 'Gestión de Libros'
+
+    def ready(self):
+        import apps.libros.signals  # Invalidación de cachés del agente al escribir en el catálogo
+        from django.db.backends.signals import connection_created
+
+        from apps.libros.search import configure_trigram_threshold
+
+        connection_created.connect(configure_trigram_threshold, dispatch_uid="libros_trigram_threshold")
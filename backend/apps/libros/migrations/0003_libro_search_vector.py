@@ -0,0 +1,75 @@
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations
+
+# El vector se mantiene en la base de datos (también para bulk_create / update(),
+# que no disparan señales de Django). Solo PostgreSQL; en otros motores la columna
+# queda NULL y la búsqueda usa icontains (apps.libros.search).
+SEARCH_VECTOR_SQL = """
+    setweight(to_tsvector('spanish', coalesce({t}.titulo, '')), 'A') ||
+    setweight(to_tsvector('spanish', coalesce({t}.autor, '')), 'B') ||
+    setweight(to_tsvector('spanish', coalesce({t}.descripcion, '')), 'C') ||
+    setweight(to_tsvector('spanish', coalesce({t}.editorial, '')), 'D')
+"""
+
+CREATE_SQL = f"""
+CREATE OR REPLACE FUNCTION libros_libro_search_vector_update() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector := {SEARCH_VECTOR_SQL.format(t="NEW")};
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS libros_libro_search_vector_trigger ON libros_libro;
+CREATE TRIGGER libros_libro_search_vector_trigger
+    BEFORE INSERT OR UPDATE OF titulo, autor, descripcion, editorial ON libros_libro
+    FOR EACH ROW EXECUTE FUNCTION libros_libro_search_vector_update();
+
+UPDATE libros_libro SET search_vector = {SEARCH_VECTOR_SQL.format(t="libros_libro")};
+
+CREATE INDEX IF NOT EXISTS libro_search_vector_gin ON libros_libro USING gin (search_vector);
+"""
+
+DROP_SQL = """
+DROP INDEX IF EXISTS libro_search_vector_gin;
+DROP TRIGGER IF EXISTS libros_libro_search_vector_trigger ON libros_libro;
+DROP FUNCTION IF EXISTS libros_libro_search_vector_update();
+"""
+
+
+def create_search_vector_trigger(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(CREATE_SQL)
+
+
+def drop_search_vector_trigger(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(DROP_SQL)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('libros', '0002_alter_categoria_options_alter_categoria_descripcion_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='libro',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AddIndex(
+                    model_name='libro',
+                    index=django.contrib.postgres.indexes.GinIndex(
+                        fields=['search_vector'], name='libro_search_vector_gin'
+                    ),
+                ),
+            ],
+            database_operations=[
+                migrations.RunPython(create_search_vector_trigger, drop_search_vector_trigger),
+            ],
+        ),
+    ]
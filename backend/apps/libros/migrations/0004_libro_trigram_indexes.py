@@ -0,0 +1,43 @@
+from django.contrib.postgres.operations import TrigramExtension, UnaccentExtension
+from django.db import migrations
+
+# Índices trigram sobre titulo/autor sin acentos ("Garcia Marques" ~ "García Márquez").
+# unaccent() no es IMMUTABLE, así que se envuelve para poder indexar la expresión;
+# apps.libros.search.Unaccent consulta exactamente la misma expresión. Solo PostgreSQL.
+CREATE_SQL = """
+CREATE OR REPLACE FUNCTION libros_unaccent(text) RETURNS text AS $$
+    SELECT public.unaccent('public.unaccent'::regdictionary, $1)
+$$ LANGUAGE sql IMMUTABLE PARALLEL SAFE STRICT;
+
+CREATE INDEX IF NOT EXISTS libro_titulo_trgm ON libros_libro USING gin (libros_unaccent(titulo) gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS libro_autor_trgm ON libros_libro USING gin (libros_unaccent(autor) gin_trgm_ops);
+"""
+
+DROP_SQL = """
+DROP INDEX IF EXISTS libro_autor_trgm;
+DROP INDEX IF EXISTS libro_titulo_trgm;
+DROP FUNCTION IF EXISTS libros_unaccent(text);
+"""
+
+
+def create_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(CREATE_SQL)
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(DROP_SQL)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('libros', '0003_libro_search_vector'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        UnaccentExtension(),
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
@@ -1,5 +1,7 @@
 import os
 import re
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
 from django.core.validators import MinValueValidator, MaxValueValidator
 from cloudinary.models import CloudinaryField
@@ -27,6 +29,8 @@ class Libro(models.Model):
                               transformation={'quality': 'auto', 'fetch_format': 'auto'})
     fecha_creacion = models.DateTimeField(auto_now_add=True)
     fecha_actualizacion = models.DateTimeField(auto_now=True)
+    # Mantenido por un trigger de PostgreSQL (ver migración 0003); NULL en SQLite.
+    search_vector = SearchVectorField(null=True, editable=False)
 
     def normalize_title_for_filename(self):
         """Normaliza el título para usar como nombre de archivo"""
@@ -66,3 +70,4 @@ class Libro(models.Model):
         ordering = ['-fecha_creacion']
         verbose_name = 'Libro'
         verbose_name_plural = 'Libros'
+        indexes = [GinIndex(fields=['search_vector'], name='libro_search_vector_gin')]
@@ -0,0 +1,140 @@
+"""Búsqueda de texto libre sobre `Libro`.
+
+En PostgreSQL usa el `search_vector` mantenido por trigger (migración 0003):
+titulo (peso A), autor (B), descripcion (C) y editorial (D) con la configuración
+`spanish`, indexado con GIN y ordenado por `SearchRank`. Un ISBN exacto también
+coincide, aunque no forme parte del vector. Si el full-text no encuentra nada
+(fragmentos de palabra como "Cien añ" o de ISBN como "978-84") se reintenta con el
+filtro `icontains`.
+
+En otros motores (SQLite en desarrollo/tests) o con `LIBROS_FULL_TEXT_SEARCH=false`
+se mantiene el OR de `icontains` sobre los cinco campos de siempre.
+
+`fuzzy_search_libros` tolera errores de tipeo en titulo/autor con `pg_trgm`
+(`word_similarity` sin acentos, índices GIN de la migración 0004). Se usa cuando la
+búsqueda normal no encuentra nada; el umbral es `LIBROS_TRIGRAM_THRESHOLD`.
+"""
+from __future__ import annotations
+
+import os
+import re
+import unicodedata
+
+from django.db import connections
+from django.db.models import Func, Q, QuerySet, TextField
+from django.db.models.functions import Greatest
+
+FTS_CONFIG = "spanish"
+TRIGRAM_THRESHOLD = float(os.getenv("LIBROS_TRIGRAM_THRESHOLD", "0.5"))
+
+
+class Unaccent(Func):
+    """`libros_unaccent(expr)`: wrapper IMMUTABLE de unaccent creado por la migración 0004."""
+
+    function = "libros_unaccent"
+    output_field = TextField()
+
+
+def full_text_enabled(using: str = "default") -> bool:
+    if os.getenv("LIBROS_FULL_TEXT_SEARCH", "true").lower() in {"0", "false", "no", "off"}:
+        return False
+    return connections[using].vendor == "postgresql"
+
+
+def _icontains_filter(text: str) -> Q:
+    condition = (
+        Q(titulo__icontains=text)
+        | Q(autor__icontains=text)
+        | Q(isbn__icontains=text)
+        | Q(descripcion__icontains=text)
+        | Q(editorial__icontains=text)
+    )
+    # Prefijo de ISBN escrito con guiones o espacios ("978-84"): el ISBN se guarda sin ellos.
+    isbn = re.sub(r"[^0-9Xx]", "", text)
+    if isbn and isbn != text and re.fullmatch(r"[0-9Xx\s-]+", text):
+        condition |= Q(isbn__startswith=isbn.upper())
+    return condition
+
+
+def search_libros(qs: QuerySet, text: str) -> tuple[QuerySet, bool]:
+    """Filtra `qs` por `text`. Devuelve `(qs, ranked)`.
+
+    Con `ranked=True` el queryset trae la anotación `rank` (mayor = más relevante) y
+    el llamador decide si ordenar por ella; con `ranked=False` es el filtro `icontains`,
+    también cuando el full-text no encuentra nada (fragmentos de palabra o de ISBN).
+    """
+
+    text = (text or "").strip()
+    if not text or not full_text_enabled(qs.db):
+        return qs.filter(_icontains_filter(text)), False
+
+    from django.contrib.postgres.search import SearchQuery, SearchRank
+
+    query = SearchQuery(text, config=FTS_CONFIG, search_type="websearch")
+    condition = Q(search_vector=query)
+    isbn = re.sub(r"[^0-9Xx]", "", text)
+    if len(isbn) >= 10:
+        condition |= Q(isbn=isbn.upper())
+    matched = qs.filter(condition)
+    if not matched.exists():
+        return qs.filter(_icontains_filter(text)), False
+    return matched.annotate(rank=SearchRank("search_vector", query)), True
+
+
+def fuzzy_enabled(using: str = "default") -> bool:
+    return TRIGRAM_THRESHOLD <= 1 and connections[using].vendor == "postgresql"
+
+
+def strip_accents(text: str) -> str:
+    decomposed = unicodedata.normalize("NFKD", text)
+    return "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+
+
+def fuzzy_search_libros(qs: QuerySet, text: str, *, threshold: float | None = None) -> tuple[QuerySet, bool]:
+    """Filtra `qs` por similitud trigram de `text` con titulo o autor. Devuelve `(qs, ranked)`.
+
+    El queryset anota `rank` (la mejor `word_similarity`, 0..1). Fuera de PostgreSQL
+    no hay búsqueda difusa: devuelve `(qs.none(), False)`.
+    """
+
+    text = strip_accents((text or "").strip())
+    if not text or not fuzzy_enabled(qs.db):
+        return qs.none(), False
+
+    from django.contrib.postgres.search import TrigramWordSimilarity
+
+    threshold = TRIGRAM_THRESHOLD if threshold is None else threshold
+    # `%>` usa los índices GIN con pg_trgm.word_similarity_threshold (fijado al conectar);
+    # el filtro por `rank` aplica `threshold` aunque la sesión tenga otro valor.
+    qs = qs.alias(titulo_unaccent=Unaccent("titulo"), autor_unaccent=Unaccent("autor")).filter(
+        Q(titulo_unaccent__trigram_word_similar=text) | Q(autor_unaccent__trigram_word_similar=text)
+    )
+    rank = Greatest(
+        TrigramWordSimilarity(text, Unaccent("titulo")),
+        TrigramWordSimilarity(text, Unaccent("autor")),
+    )
+    return qs.annotate(rank=rank).filter(rank__gte=threshold), True
+
+
+def configure_trigram_threshold(sender, connection, **kwargs) -> None:
+    """Receptor de `connection_created`: alinea el umbral de `%>` con `TRIGRAM_THRESHOLD`."""
+
+    if connection.vendor != "postgresql" or TRIGRAM_THRESHOLD > 1:
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT set_config('pg_trgm.word_similarity_threshold', %s, false)", [str(TRIGRAM_THRESHOLD)]
+        )
+
+
+__all__ = [
+    "FTS_CONFIG",
+    "TRIGRAM_THRESHOLD",
+    "Unaccent",
+    "configure_trigram_threshold",
+    "full_text_enabled",
+    "fuzzy_enabled",
+    "fuzzy_search_libros",
+    "search_libros",
+    "strip_accents",
+]
@@ -0,0 +1,77 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from agent.indexing import VECTOR_SYNC_ENABLED, enqueue_libro_sync
+from agent.lexical_index import index_libro, publish_lexical_change, unindex_libro
+from agent.result_cache import bump_catalog_version
+
+from .models import Categoria, Libro
+
+
+def _bump_catalog_version_now_and_on_commit():
+    """
+    Sube la versión ya (nada cacheado antes de la escritura vuelve a servirse) y otra
+    vez tras el commit: una búsqueda que corra durante la transacción lee las filas
+    anteriores y las cachearía bajo la versión nueva.
+    """
+    bump_catalog_version()
+    transaction.on_commit(bump_catalog_version)
+
+
+@receiver(post_save, sender=Libro)
+@receiver(post_delete, sender=Libro)
+def invalidar_cache_busqueda_libro(sender, instance, **kwargs):
+    """
+    Invalida los resultados cacheados del agente cuando cambia un libro
+    (precio, stock, datos). Nota: QuerySet.update() no dispara señales.
+    """
+    _bump_catalog_version_now_and_on_commit()
+
+
+@receiver(post_save, sender=Libro)
+def indexar_libro(sender, instance, **kwargs):
+    """
+    Mantiene al día el índice léxico (BM25) en memoria sin reconstruirlo. Solo si cambió
+    el texto indexado (no stock/precio) avisa tras el commit a los demás workers.
+    """
+    if index_libro(instance):
+        transaction.on_commit(publish_lexical_change)
+
+
+@receiver(post_delete, sender=Libro)
+def desindexar_libro(sender, instance, **kwargs):
+    unindex_libro(instance.pk)
+    transaction.on_commit(publish_lexical_change)
+
+
+@receiver(post_save, sender=Libro)
+@receiver(post_delete, sender=Libro)
+def sincronizar_vector_libro(sender, instance, **kwargs):
+    """
+    Encola el libro para el sync incremental del índice vectorial (AGENT_VECTOR_SYNC).
+    Se encola tras el commit para que el worker lea el estado definitivo.
+    """
+    libro_id = instance.pk
+    transaction.on_commit(lambda: enqueue_libro_sync([libro_id]))
+
+
+@receiver(post_save, sender=Categoria)
+@receiver(post_delete, sender=Categoria)
+def invalidar_cache_busqueda_categoria(sender, instance, **kwargs):
+    """
+    Los resultados incluyen el nombre de la categoría: renombrarla también invalida.
+    """
+    _bump_catalog_version_now_and_on_commit()
+
+
+@receiver(post_save, sender=Categoria)
+def sincronizar_vector_categoria(sender, instance, created, **kwargs):
+    """
+    El nombre de la categoría forma parte del texto indexado: re-sincroniza sus libros
+    (solo los que cambien de texto se vuelven a embeber).
+    """
+    if created or not VECTOR_SYNC_ENABLED:
+        return
+    libro_ids = list(Libro.objects.filter(categoria=instance).values_list("id", flat=True))
+    transaction.on_commit(lambda: enqueue_libro_sync(libro_ids))
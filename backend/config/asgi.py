@@ -5,6 +5,11 @@ It exposes the ASGI callable as a module-level variable named ``application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/4.2/howto/deployment/asgi/
+
+Async views (e.g. /api/agent/async/) only run natively under an ASGI server:
+
+    uvicorn config.asgi:application --workers 2
+    gunicorn config.asgi:application -k uvicorn.workers.UvicornWorker --workers 2
 """
 
 import os
@@ -14,3 +19,9 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
 
 application = get_asgi_application()
+
+# Solo los servidores importan este módulo (runserver, en su proceso hijo), así que
+# los comandos de manage.py no lanzan el warm-up. Opt-in con AGENT_WARMUP.
+from agent.warmup import start_warmup  # noqa: E402
+
+start_warmup()
@@ -71,6 +71,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     
     # Third party apps
     'rest_framework',
@@ -309,6 +310,35 @@ CORS_ALLOWED_ORIGINS = [
     "https://innerkano.github.io",  # GitHub Pages
 ]
 
+# Cache
+# - default: caché local del proceso.
+# - agent: resultados de búsqueda del agente (versionados por catálogo, ver agent/result_cache.py).
+#   Con varios workers conviene un backend compartido (Redis/Memcached/DB) para que
+#   la invalidación por escrituras en Libro llegue a todos.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'agent': {
+        'BACKEND': env('AGENT_CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': env('AGENT_CACHE_LOCATION', default='agent'),
+        'TIMEOUT': env.int('AGENT_RESULT_CACHE_TTL_SEC', default=300),
+        'OPTIONS': {
+            'MAX_ENTRIES': env.int('AGENT_RESULT_CACHE_MAX_ENTRIES', default=5000),
+        },
+    },
+    # Respuestas del LLM ya validadas (agent.llm_cache); límite de tamaño propio.
+    'agent_llm': {
+        'BACKEND': env('AGENT_CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': env('AGENT_LLM_CACHE_LOCATION', default=env('AGENT_CACHE_LOCATION', default='agent_llm')),
+        'TIMEOUT': env.int('AGENT_LLM_CACHE_TTL_SEC', default=600),
+        'KEY_PREFIX': 'llm',
+        'OPTIONS': {
+            'MAX_ENTRIES': env.int('AGENT_LLM_CACHE_MAX_ENTRIES', default=1000),
+        },
+    },
+}
+
 # Channels settings
 ASGI_APPLICATION = 'config.asgi.application'
 CHANNEL_LAYERS = {
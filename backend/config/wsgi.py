@@ -17,3 +17,9 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
 
 application = get_wsgi_application()
+
+# Solo los servidores importan este módulo (runserver, en su proceso hijo), así que
+# los comandos de manage.py no lanzan el warm-up. Opt-in con AGENT_WARMUP.
+from agent.warmup import start_warmup  # noqa: E402
+
+start_warmup()